@@ -0,0 +1,221 @@
+import multiprocessing
+from threading import BrokenBarrierError
+
+import numpy as np
+
+from .driver import *
+from .sweep import shareArray, attachArray
+
+
+EXPLICIT_INTEGRATORS = {
+    'EULER': EULER,
+    'LSERK4': LSERK4,
+    'LSERK74': LSERK74,
+    'LSERK134': LSERK134,
+}
+
+
+class Subdomain(SpatialDiscretization):
+    '''
+    Elements of a Maxwell2D, sp, advanced by one worker process. On each
+    evaluation of computeRHS the face values needed by other subdomains
+    are written to the shared traces and, once all subdomains have done so,
+    the halo of this subdomain is read from them. Traces alternate between
+    two buffers, so that a single barrier per stage is needed.
+    '''
+
+    def __init__(self, sp, workspace, traces, exchange, barrier):
+        SpatialDiscretization.__init__(self, sp.mesh)
+        self.sp = sp
+        self.workspace = workspace
+        self.traces = traces
+        self.sendTraces, self.sendNodes, self.recvTraces = exchange
+        self.barrier = barrier
+        self.labels = list(sp.buildFields().keys())
+        self.halo = {l: np.zeros(len(self.recvTraces)) for l in self.labels}
+        self.evaluations = 0
+
+    def buildFields(self):
+        shape = self.workspace['nodes'].shape
+        return Fields({l: shape for l in self.labels})
+
+    def computeRHS(self, fields, out=None):
+        if out is None:
+            out = zerosLikeFields(fields)
+        traces = self.traces[self.evaluations % 2]
+        self.evaluations += 1
+
+        for i, l in enumerate(self.labels):
+            traces[i, self.sendTraces] = flatView(fields[l])[self.sendNodes]
+        self.barrier.wait()
+        for i, l in enumerate(self.labels):
+            np.take(traces[i], self.recvTraces, out=self.halo[l])
+
+        return self.sp.computeRHSOnWorkspace(
+            fields, out, self.workspace, self.halo)
+
+
+def runSubdomainWorker(sp, workspace, exchange, specs, timeIntegratorType,
+                       barrier, conn):
+    '''
+    Loop of a worker process, serving the commands of DecomposedDriver on
+    the fields of its subdomain until it is closed.
+    '''
+    blocks = []
+    try:
+        traces = attachArray(specs['traces'], blocks)
+        subdomain = Subdomain(sp, workspace, traces, exchange, barrier)
+        shapes = subdomain.buildFields().shapes()
+        fields = Fields(shapes, attachArray(specs['fields'], blocks))
+        rhs = Fields(shapes, attachArray(specs['rhs'], blocks))
+        timeIntegrator = EXPLICIT_INTEGRATORS[timeIntegratorType](
+            subdomain, fields)
+
+        while True:
+            command, args = conn.recv()
+            if command == 'close':
+                break
+            elif command == 'step':
+                dt, nSteps = args
+                for _ in range(nSteps):
+                    timeIntegrator.step(fields, dt)
+            elif command == 'rhs':
+                subdomain.computeRHS(fields, out=rhs)
+            conn.send(None)
+    except Exception as e:
+        barrier.abort()
+        conn.send(e)
+
+
+class DecomposedDriver:
+    '''
+    Advances a Maxwell2D with its elements partitioned in nParts subdomains,
+    each stepped by a worker process with an explicit time integrator. The
+    fields of each subdomain live in shared memory and only the face traces
+    of the fields at subdomain interfaces are exchanged at every stage. The
+    arithmetic of each element is that of computeRHS, so results are
+    bitwise identical to a serial MaxwellDriver.
+
+    driver[label] returns a copy of a global field and driver[label] = value
+    sets it. close() stops the workers and frees the shared memory.
+    '''
+
+    def __init__(self, sp, nParts, timeIntegratorType='LSERK4', CFL=1.0):
+        if timeIntegratorType not in EXPLICIT_INTEGRATORS:
+            raise ValueError('Invalid time integrator')
+
+        self.sp = sp
+        self.dt = timeStepSize(sp, CFL)
+        self.sp.dt = self.dt
+        self.time = 0.0
+
+        Np = sp.number_of_nodes_per_element()
+        K = sp.mesh.number_of_elements()
+        parts = sp.partitionElements(nParts)
+        self.elements = [np.where(parts == p)[0] for p in range(nParts)]
+        workspaces = [sp.buildSubdomainWorkspace(e) for e in self.elements]
+
+        local = np.zeros(K, dtype=int)
+        for e in self.elements:
+            local[e] = np.arange(len(e))
+        traceNodes = np.unique(
+            np.concatenate([w['haloNodes'] for w in workspaces]))
+        traceOwners = parts[traceNodes // Np]
+
+        self.labels = list(sp.buildFields().keys())
+        self.blocks = []
+        self.attached = []
+        traces = shareArray(
+            np.zeros((2, len(self.labels), len(traceNodes))), self.blocks)
+
+        context = multiprocessing.get_context()
+        barrier = context.Barrier(nParts)
+        self.fields = []
+        self.rhs = []
+        self.connections = []
+        self.workers = []
+        for p, (e, w) in enumerate(zip(self.elements, workspaces)):
+            send = np.where(traceOwners == p)[0]
+            nodes = traceNodes[send]
+            exchange = (send, Np*local[nodes // Np] + nodes % Np,
+                        np.searchsorted(traceNodes, w['haloNodes']))
+
+            shapes = {l: (Np, len(e)) for l in self.labels}
+            specs = {'traces': traces}
+            for l, fields in (('fields', self.fields), ('rhs', self.rhs)):
+                specs[l] = shareArray(np.zeros(Fields.sizeOf(shapes)), self.blocks)
+                fields.append(Fields(shapes, attachArray(specs[l], self.attached)))
+
+            conn, workerConn = context.Pipe()
+            worker = context.Process(
+                target=runSubdomainWorker, daemon=True,
+                args=(sp, w, exchange, specs, timeIntegratorType,
+                      barrier, workerConn))
+            worker.start()
+            self.connections.append(conn)
+            self.workers.append(worker)
+
+    def command(self, name, args=None):
+        for conn in self.connections:
+            conn.send((name, args))
+        errors = [conn.recv() for conn in self.connections]
+        errors = [e for e in errors if e is not None]
+        if errors:
+            # Other workers only see the barrier broken by the failing one.
+            errors.sort(key=lambda e: isinstance(e, BrokenBarrierError))
+            raise errors[0]
+
+    def step(self, dt=0.0, nSteps=1):
+        if dt == 0.0:
+            dt = self.dt
+        self.command('step', (dt, nSteps))
+        self.time += nSteps*dt
+
+    def run_until(self, final_time):
+        nSteps, remainder = stepCount(self.time, final_time, self.dt)
+        self.step(nSteps=nSteps + (remainder > 0.0))
+
+    def computeRHS(self):
+        '''
+        Right hand side of the current fields as global Fields.
+        '''
+        self.command('rhs')
+        return self.gather(self.rhs)
+
+    def gather(self, subdomainFields):
+        fields = self.sp.buildFields()
+        for e, f in zip(self.elements, subdomainFields):
+            for l in self.labels:
+                fields[l][:, e] = f[l]
+        return fields
+
+    def __getitem__(self, key):
+        return self.gather(self.fields)[key]
+
+    def __setitem__(self, key, value):
+        value = np.broadcast_to(value, self.sp.buildFields()[key].shape)
+        for e, f in zip(self.elements, self.fields):
+            f[key] = value[:, e]
+
+    def close(self):
+        for conn, worker in zip(self.connections, self.workers):
+            if worker.is_alive():
+                conn.send(('close', None))
+            worker.join()
+        self.connections = []
+        self.workers = []
+        self.fields = []
+        self.rhs = []
+        for block in self.attached:
+            block.close()
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.attached = []
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
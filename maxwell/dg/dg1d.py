@@ -1,5 +1,6 @@
 import numpy as np
 import math
+from scipy import sparse
 from .dg1d_tools import *
 from ..spatialDiscretization import *
 from .mesh1d import Mesh1D
@@ -58,6 +59,8 @@ class DG1D(SpatialDiscretization):
         self.Z_imp_sum = self.Z_imp_m + self.Z_imp_p
         self.Y_imp_sum = self.Y_imp_m + self.Y_imp_p
 
+        self.rhsWorkspace = None
+
     def number_of_nodes_per_element(self):
         return self.n_order + 1
 
@@ -68,16 +71,38 @@ class DG1D(SpatialDiscretization):
         return min(np.abs(self.x[0, :] - self.x[1, :]))
 
     def buildFields(self):
-        E = np.zeros([self.number_of_nodes_per_element(),
-                      self.mesh.number_of_elements()])
-        H = np.zeros(E.shape)
+        shape = (self.number_of_nodes_per_element(),
+                 self.mesh.number_of_elements())
+
+        return Fields({"E": shape, "H": shape})
 
-        return {"E": E, "H": H}
+    def buildInterpolationRows(self, label, points):
+        '''
+        Rows of the nodal basis of the elements containing points, located
+        by the left vertices of the elements in increasing order.
+        '''
+        points = np.asarray(points, dtype=float).ravel()
+        Np = self.number_of_nodes_per_element()
+        K = self.mesh.number_of_elements()
+        left = self.mesh.vx[self.mesh.EToV[:, 0]]
+        right = self.mesh.vx[self.mesh.EToV[:, 1]]
+        order = np.argsort(left)
+        k = order[np.clip(
+            np.searchsorted(left[order], points, side='right') - 1, 0, K - 1)]
+        if np.any(points < left[k]) or np.any(points > right[k]):
+            raise ValueError("Probe points outside the mesh.")
+
+        r = 2.0 * (points - left[k]) / (right[k] - left[k]) - 1.0
+        V = vandermonde(self.n_order, jacobiGL(0, 0, self.n_order))
+        rows = np.linalg.solve(V.T, vandermonde(self.n_order, r).T).T
+        cols = Np*k[:, np.newaxis] + np.arange(Np)
+        return sparse.csr_matrix(
+            (rows.ravel(), cols.ravel(), Np*np.arange(len(points) + 1)),
+            shape=(len(points), Np*K))
 
     def get_impedance(self):
         Z_imp = np.zeros(self.x.shape)
-        for i in range(Z_imp.shape[1]):
-            Z_imp[:, i] = np.sqrt(self.mu[i] / self.epsilon[i])
+        Z_imp[:] = np.sqrt(self.mu / self.epsilon)
 
         return Z_imp
 
@@ -149,45 +174,108 @@ class DG1D(SpatialDiscretization):
                         self.mesh.number_of_elements(), order='F')
         return dE, dH
 
-    def computeRHSE(self, fields):
-        E = fields['E']
-        H = fields['H']
-
-        flux_E = self.computeFluxE(E, H)
-        rhs_drH = np.matmul(self.diff_matrix, H)
-        rhsE = 1/self.epsilon * \
-            (np.multiply(-1*self.rx, rhs_drH) +
-             np.matmul(self.lift, self.f_scale * flux_E))
-
-        return rhsE
+    def computeRHSE(self, fields, out=None):
+        if out is None:
+            out = np.zeros_like(fields['E'])
+        self.computeRHSOnChunks(fields, {'E': out, 'H': None})
+        return out
 
-    def computeRHSH(self, fields):
-        E = fields['E']
-        H = fields['H']
+    def computeRHSH(self, fields, out=None):
+        if out is None:
+            out = np.zeros_like(fields['H'])
+        self.computeRHSOnChunks(fields, {'E': None, 'H': out})
+        return out
 
-        flux_H = self.computeFluxH(E, H)
-        rhs_drE = np.matmul(self.diff_matrix, E)
-        rhsH = 1/self.mu * (np.multiply(-1*self.rx, rhs_drE) +
-                            np.matmul(self.lift, self.f_scale * flux_H))
-        return rhsH
+    def rhsWorkspaceArrays(self):
+        '''
+        Face node maps, with boundary nodes mapped to the nodes their
+        conditions are taken from, flux coefficients and buffer shapes of
+        the workspace of computeRHSOnWorkspace.
+        '''
+        Np = self.number_of_nodes_per_element()
+        K = self.mesh.number_of_elements()
+        shape = (self.n_fp*self.n_faces, K)
 
-    def computeRHS(self, fields):
-        rhsE = self.computeRHSE(fields)
-        rhsH = self.computeRHSH(fields)
+        cE, cH, cols = self.boundaryCoefficients()
+        vmap_p = self.vmap_p.copy()
+        vmap_p[self.map_b] = cols
+        coeff_E = np.ones(self.n_fp*self.n_faces*K)
+        coeff_H = np.ones(self.n_fp*self.n_faces*K)
+        coeff_E[self.map_b] = cE
+        coeff_H[self.map_b] = cH
 
-        return {'E': rhsE, 'H': rhsH}
+        if self.fluxType == "Upwind":
+            upwind = 1.0
+        elif self.fluxType == "Centered":
+            upwind = 0.0
+        else:
+            raise ValueError("Invalid fluxType label")
 
-    def convertToVector(self, fields):
-        return np.concatenate((
-            fields['E'].ravel(order='F'),
-            fields['H'].ravel(order='F')
-        ))
+        maps = {'vmap_m': self.vmap_m, 'vmap_p': vmap_p}
+        coefficients = {
+            'coeff_E': coeff_E.reshape(shape, order='F'),
+            'coeff_H': coeff_H.reshape(shape, order='F'),
+            'flux_EH': self.f_scale*self.nx*self.Z_imp_p/self.Z_imp_sum,
+            'flux_EE': -upwind*self.f_scale/self.Z_imp_sum,
+            'flux_HE': self.f_scale*self.nx*self.Y_imp_p/self.Y_imp_sum,
+            'flux_HH': -upwind*self.f_scale/self.Y_imp_sum,
+            'rx': self.rx,
+        }
+        buffers = {'dE': shape, 'dH': shape, 'flux': shape, 'faces': shape,
+                   'nodes': (Np, K)}
+        return maps, coefficients, buffers
+
+    def computeRHS(self, fields, out=None):
+        '''
+        Evaluates the right hand side, writing it in the arrays of out when
+        given. Fields stored in 'F' order are read without copies. Fields
+        with trailing batch axes, as in buildBatchedFields, are evaluated
+        for all members at once, with one matrix product over the nodes of
+        all elements and members for each operator.
+        '''
+        if out is None:
+            out = zerosLikeFields(fields)
+        self.computeRHSOnChunks(fields, out)
+        return out
 
-    def copyVectorToFields(self, vec, fields):
-        Np = self.number_of_nodes_per_element()
-        K = self.mesh.number_of_elements()
-        fields['E'][:, :] = vec[:(vec.size//2)].reshape(Np, K, order='F')
-        fields['H'][:, :] = vec[(vec.size//2):].reshape(Np, K, order='F')
+    def computeRHSOnWorkspace(self, fields, out, w):
+        '''
+        Evaluates the right hand sides into out['E'] and out['H'], skipping
+        those that are None, with the maps, coefficients and buffers of the
+        workspace w, for the element columns of fields in w['columns'].
+        '''
+        rhsE, rhsH = out['E'], out['H']
+        columns = w['columns']
+        batch = fields['E'].shape[2:]
+        material = (1, -1) + (1,)*len(batch)
+
+        for f, d, coeff in ((fields['E'], w['dE'], w['coeff_E']),
+                            (fields['H'], w['dH'], w['coeff_H'])):
+            np.take(f.T, w['vmap_m'], out=d.T.ravel(), mode='clip')
+            np.take(f.T, w['vmap_p'], out=w['faces'].T.ravel(), mode='clip')
+            w['faces'] *= coeff
+            d -= w['faces']
+
+        for rhs, f, material, flux_same, flux_cross, d_same, d_cross in (
+            (rhsE, fields['H'], self.epsilon[columns].reshape(material),
+             w['flux_EE'], w['flux_EH'], w['dE'], w['dH']),
+            (rhsH, fields['E'], self.mu[columns].reshape(material),
+             w['flux_HH'], w['flux_HE'], w['dH'], w['dE'])):
+            if rhs is None:
+                continue
+            np.multiply(flux_cross, d_cross, out=w['flux'])
+            np.multiply(flux_same, d_same, out=w['faces'])
+            w['flux'] += w['faces']
+            # Products are taken transposed so that BLAS writes 'F' arrays.
+            np.matmul(matrixView(w['flux']).T, self.lift.T,
+                      out=matrixView(rhs).T)
+            np.matmul(matrixView(f[:, columns]).T, self.diff_matrix.T,
+                      out=matrixView(w['nodes']).T)
+            w['nodes'] *= w['rx']
+            rhs -= w['nodes']
+            # Broadcasting material in the division would allocate a buffer.
+            np.copyto(w['nodes'], material)
+            rhs /= w['nodes']
 
     def setFieldWithIndex(self, fields, i, val):
         Np = self.number_of_nodes_per_element()
@@ -214,7 +302,127 @@ class DG1D(SpatialDiscretization):
             ])
             A[:, i] = q0[:, 0]
         return A
-    
+
+    def buildSparsityPattern(self):
+        Np = self.number_of_nodes_per_element()
+        K = self.mesh.number_of_elements()
+
+        elem_m = self.vmap_m // Np
+        elem_p = self.vmap_p // Np
+        if "Periodic" in self.mesh.boundary_label.values():
+            elem_m = np.concatenate((elem_m, self.vmap_b // Np))
+            elem_p = np.concatenate((elem_p, self.vmap_b[::-1] // Np))
+        EToE = sparse.csr_matrix(
+            (np.ones(elem_m.size), (elem_m, elem_p)), shape=(K, K))
+        EToE += sparse.identity(K)
+
+        n_fields = len(self.buildFields())
+        return sparse.kron(
+            np.ones((n_fields, n_fields)),
+            sparse.kron(EToE, np.ones((Np, Np)))
+        ).astype(bool).tocsr()
+
+    def boundaryCoefficients(self):
+        '''
+        Returns cE, cH and the nodes cols such that the boundary values of
+        fieldsOnBoundaryConditions are Ebc = cE*E[cols], Hbc = cH*H[cols].
+        '''
+        for bdr, label in self.mesh.boundary_label.items():
+            if bdr == "LEFT" or bdr == "RIGHT":
+                if label == "PEC":
+                    return -1.0, 1.0, self.vmap_b
+                elif label == "PMC":
+                    return 1.0, -1.0, self.vmap_b
+                elif label == "SMA":
+                    return 0.0, 0.0, self.vmap_b
+                elif label == "Periodic":
+                    return 1.0, 1.0, self.vmap_b[::-1]
+                else:
+                    raise ValueError("Invalid boundary label.")
+
+    def buildBoundaryOperators(self):
+        '''
+        Returns sparse operators mapping E and H to the boundary values
+        Ebc and Hbc given by fieldsOnBoundaryConditions, placed at the
+        face rows in map_b.
+        '''
+        K = self.mesh.number_of_elements()
+        n_nodes = self.number_of_nodes_per_element() * K
+        n_face_nodes = self.n_fp * self.n_faces * K
+
+        cE, cH, cols = self.boundaryCoefficients()
+
+        ones = np.ones(len(self.map_b))
+        shape = (n_face_nodes, n_nodes)
+        Ebc = sparse.csr_matrix((cE*ones, (self.map_b, cols)), shape=shape)
+        Hbc = sparse.csr_matrix((cH*ones, (self.map_b, cols)), shape=shape)
+        return Ebc, Hbc
+
+    def buildJumpOperators(self):
+        '''
+        Returns sparse operators mapping E and H to the jumps dE and dH
+        computed by computeJumps, flattened in 'F' order.
+        '''
+        K = self.mesh.number_of_elements()
+        n_nodes = self.number_of_nodes_per_element() * K
+        n_face_nodes = self.n_fp * self.n_faces * K
+        shape = (n_face_nodes, n_nodes)
+        rows = np.arange(n_face_nodes)
+
+        interior = np.ones(n_face_nodes)
+        interior[self.map_b] = 0.0
+        jump = sparse.diags(interior) @ (
+            sparse.csr_matrix((np.ones(n_face_nodes), (rows, self.vmap_m)), shape=shape) -
+            sparse.csr_matrix((np.ones(n_face_nodes), (rows, self.vmap_p)), shape=shape)
+        )
+        trace_b = sparse.csr_matrix(
+            (np.ones(len(self.map_b)), (self.map_b, self.vmap_b)), shape=shape)
+
+        Ebc, Hbc = self.buildBoundaryOperators()
+        dE = jump + trace_b - Ebc
+        dH = jump + trace_b - Hbc
+        return dE.tocsr(), dH.tocsr()
+
+    def buildSparseEvolutionOperator(self):
+        '''
+        Assembles the same operator as buildEvolutionOperator directly from
+        the differentiation, lift and flux matrices as a scipy.sparse CSR
+        matrix, with cost linear in the number of elements.
+        '''
+        Np = self.number_of_nodes_per_element()
+        K = self.mesh.number_of_elements()
+
+        dE, dH = self.buildJumpOperators()
+
+        Z_sum = self.Z_imp_sum.ravel('F')
+        Y_sum = self.Y_imp_sum.ravel('F')
+        nx = self.nx.ravel('F')
+        flux_EH = sparse.diags(nx*self.Z_imp_p.ravel('F')/Z_sum) @ dH
+        flux_HE = sparse.diags(nx*self.Y_imp_p.ravel('F')/Y_sum) @ dE
+        if self.fluxType == "Upwind":
+            flux_EE = - sparse.diags(1/Z_sum) @ dE
+            flux_HH = - sparse.diags(1/Y_sum) @ dH
+        elif self.fluxType == "Centered":
+            flux_EE = sparse.csr_matrix(dE.shape)
+            flux_HH = sparse.csr_matrix(dH.shape)
+        else:
+            raise ValueError("Invalid fluxType label")
+
+        eye_K = sparse.identity(K, format='csr')
+        stiffness = - sparse.diags(self.rx.ravel('F')) @ \
+            sparse.kron(eye_K, self.diff_matrix)
+        lift = sparse.kron(eye_K, self.lift) @ \
+            sparse.diags(self.f_scale.ravel('F'))
+
+        inv_eps = sparse.diags(np.repeat(1/self.epsilon, Np))
+        inv_mu = sparse.diags(np.repeat(1/self.mu, Np))
+
+        A = sparse.bmat([
+            [inv_eps @ lift @ flux_EE, inv_eps @ (stiffness + lift @ flux_EH)],
+            [inv_mu @ (stiffness + lift @ flux_HE), inv_mu @ lift @ flux_HH]
+        ])
+        return A.tocsr()
+
     def reorder_array(self, A, ordering):
         # Assumes that the original array contains all DoF ordered as:
         # [ E_0, ..., E_{K-1}, H_0, ..., H_{K-1} ]
@@ -159,7 +159,7 @@ def vandermonde(n_order, r):
     """
 #    res = jacobi_polynomial(r, 0, 0, 0)
     res = np.zeros((len(r), n_order+1))
-    for j in range(len(r)):
+    for j in range(n_order+1):
         res[:, j] = np.transpose(jacobi_polynomial(r, 0, 0, j))
         # res = np.hstack((res, jacobi_polynomial(r, 0, 0, j)))
     return res
@@ -338,16 +338,11 @@ def nodes_coordinates(n_order, EToV, vx):
 
     jgl = jacobiGL(0, 0, n_order)
 
-    va = EToV[:, 0]
-    vb = EToV[:, 1]
-    vx_va = np.zeros([1, len(va)])
-    vx_vb = np.zeros([1, len(va)])
-    for i in range(len(va)):
-        vx_va[0, i] = vx[va[i]]
-        vx_vb[0, i] = vx[vb[i]]
+    vx_va = vx[EToV[:, 0]].reshape(1, -1)
+    vx_vb = vx[EToV[:, 1]].reshape(1, -1)
 
-    nodes_coord = np.matmul(np.ones(
-        [n_order+1, 1]), vx_va)+0.5*np.matmul((jgl.reshape(n_order+1, 1)+1), (vx_vb-vx_va))
+    nodes_coord = vx_va + 0.5*np.matmul(
+        (jgl.reshape(n_order+1, 1)+1), (vx_vb-vx_va))
     return nodes_coord
 
 
@@ -419,47 +414,21 @@ def connect(EToV):
     """
     n_faces = 2
     k_elem = np.shape(EToV)[0]
-    total_faces = n_faces*k_elem
-    nv = k_elem+1
-    vn = np.arange(0, 2)
 
-    sp_ftov = np.zeros([total_faces, nv])
+    # Faces are numbered as 2*element + face and identified by their vertex.
+    # Sorting them by vertex leaves the two faces sharing one contiguous.
+    face_vertex = np.asarray(EToV)[:, :n_faces].ravel()
+    order = np.argsort(face_vertex, kind='stable')
+    matches = np.where(face_vertex[order[:-1]] == face_vertex[order[1:]])[0]
 
-    sk = 0
+    faces_1 = np.concatenate((order[matches], order[matches+1]))
+    faces_2 = np.concatenate((order[matches+1], order[matches]))
 
-    for i in range(k_elem):
-        for face in range(n_faces):
-            sp_ftov[sk][EToV[i][vn[face]]-1] = 1
-            sk += 1
+    etoe = np.repeat(np.arange(1, k_elem+1), n_faces).reshape(k_elem, n_faces)
+    etof = np.tile(np.arange(1, n_faces+1), k_elem).reshape(k_elem, n_faces)
 
-    sp_ftof = np.matmul(sp_ftov, np.transpose(sp_ftov)) - \
-        np.identity(total_faces)
-    [faces_2, faces_1] = np.where(sp_ftof == 1)
-    # numpy floor returns floats
-
-    element_1 = np.int64(np.floor(faces_1/n_faces))
-    element_2 = np.int64(np.floor(faces_2/n_faces))
-
-    face_1 = np.mod(faces_1, n_faces)
-    face_2 = np.mod(faces_2, n_faces)
-
-    ind = np.arange(len(element_1))
-
-    for i in range(len(element_1)):
-        ind[i] = np.ravel_multi_index(
-            (element_1[i], face_1[i]), dims=(k_elem, n_faces))
-
-    etoe_1 = np.transpose(np.arange(1, k_elem+1).reshape(1, k_elem))
-    etoe_2 = np.full([1, n_faces], 1)
-    etoe = np.matmul(etoe_1, etoe_2)
-
-    etof_1 = np.full([k_elem, 1], 1)
-    etof_2 = np.arange(1, n_faces+1).reshape(1, n_faces)
-    etof = np.matmul(etof_1, etof_2)
-
-    for i in range(len(ind)):
-        etoe.ravel()[ind[i]] = element_2[i]+1
-        etof.ravel()[ind[i]] = face_2[i]+1
+    etoe.ravel()[faces_1] = faces_2 // n_faces + 1
+    etof.ravel()[faces_1] = faces_2 % n_faces + 1
 
     return [etoe, etof]
 
@@ -495,29 +464,14 @@ def build_maps(n_order, nodes_coord, etoe, etof):
     fmask_2 = np.where(np.abs(jgl-1) < 1e-10)[0][0]
     fmask = [fmask_1, fmask_2]
 
-    node_ids = np.reshape(np.arange(k_elem*n_p), [n_p, k_elem], 'F')
-    vmap_m = np.full([k_elem, n_fp, n_faces], 0)
-    vmap_p = np.full([k_elem, n_fp, n_faces], 0)
-
-    for k1 in range(k_elem):
-        for f1 in range(n_faces):
-            vmap_m[k1, :, f1] = node_ids[fmask[f1], k1]
-
-    for k1 in range(k_elem):
-
-        for f1 in range(n_faces):
-            k2 = etoe[k1, f1]-1
-            f2 = etof[k1, f1]-1
-
-            vid_m = vmap_m[k1, :, f1][0]
-            vid_p = vmap_m[k2, :, f2][0]
-
-            x1 = nodes_coord.ravel('F')[vid_m]
-            x2 = nodes_coord.ravel('F')[vid_p]
+    vmap_m = np.array(fmask).reshape(1, n_fp, n_faces) \
+        + n_p*np.arange(k_elem).reshape(k_elem, 1, 1)
 
-            distance = (x2-x1)**2
-            if (distance < 1e-10):
-                vmap_p[k1, :, f1] = vid_p
+    # Neighbor traces, kept only where they coincide with the own trace.
+    vid_p = vmap_m[etoe-1, :, etof-1].transpose(0, 2, 1)
+    x = nodes_coord.ravel('F')
+    distance = (x[vid_p]-x[vmap_m])**2
+    vmap_p = np.where(distance < 1e-10, vid_p, 0)
 
     vmap_m += 1
     vmap_p += 1
@@ -1,5 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
+from scipy import sparse
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+from scipy.spatial import cKDTree
 
 from .dg2d_tools import *
 from .mesh2d import Mesh2D
@@ -7,6 +10,15 @@ from ..integrators.LSERK4 import *
 from ..spatialDiscretization import *
 
 
+# Coefficients of Hx, Hy and Ez in the boundary values of each label.
+BOUNDARY_COEFFICIENTS = {
+    "PEC": (1.0, 1.0, -1.0),
+    "PMC": (-1.0, -1.0, 1.0),
+    "SMA": (0.0, 0.0, 0.0),
+    "Periodic": (1.0, 1.0, 1.0),
+}
+
+
 class Maxwell2D(SpatialDiscretization):
     def __init__(self, n_order: int, mesh: Mesh2D, fluxType="Upwind"):
         assert n_order > 0
@@ -45,11 +57,19 @@ class Maxwell2D(SpatialDiscretization):
         self.f_scale = sJ/self.jacobian[fmask.ravel('F')]
 
         self.buildMaps()
+        self.bcCoefficients = self.boundaryCoefficients()
+
+        self.rhsWorkspace = None
 
     def buildMaps(self):
         '''
         function [mapM, mapP, vmapM, vmapP, vmapB, mapB] = BuildMaps2D
         Purpose: Connectivity and boundary tables in the K # of Np elements        
+
+        Face nodes of neighbors are matched for all faces at once: shared
+        faces traverse their nodes in reversed order, faces of elements
+        with opposite orientation in the same order. Faces matching
+        neither are matched by node distances.
         '''
         N = self.n_order
         msh = self.mesh
@@ -61,47 +81,38 @@ class Maxwell2D(SpatialDiscretization):
         # mask defined in globals
         Fmask, _, _, _ = buildFMask(N)
 
-        # number volume nodes consecutively
-        node_ids = np.reshape(np.arange(k_elem*n_p), [n_p, k_elem], 'F')
-        vmapM = np.full([n_fp, n_faces, k_elem], 0)
-        vmapP = np.full([n_fp, n_faces, k_elem], 0)
-        mapM = np.arange(k_elem*n_fp*n_faces)
-        mapP = np.reshape(mapM, (n_fp, n_faces, k_elem))
-
         # find index of face nodes with respect to volume node ordering
-        for k1 in range(k_elem):
-            for f1 in range(n_faces):
-                vmapM[:, f1, k1] = node_ids[Fmask[:, f1], k1]
+        vmapM = Fmask.reshape(n_fp, n_faces, 1) + \
+            n_p*np.arange(k_elem).reshape(1, 1, k_elem)
 
-        one = np.ones(n_fp)
+        # face nodes of the neighbor, vidP[:, f1, k1] = vmapM[:, f2, k2]
         EToE, EToF = msh.connectivityMatrices()
-        for k1 in range(k_elem):
-            for f1 in range(n_faces):
-                # find neighbor
-                k2 = EToE[k1, f1]
-                f2 = EToF[k1, f1]
-
-                # reference length of edge
-                v1 = msh.EToV[k1, f1]
-                v2 = msh.EToV[k1, np.mod(f1+1, n_faces)]
-                refd = np.sqrt(
-                    (msh.vx[v1]-msh.vx[v2])**2 + (msh.vy[v1]-msh.vy[v2])**2
-                )
-
-                # find find volume node numbers of left and right nodes
-                vidM = vmapM[:, f1, k1]
-                vidP = vmapM[:, f2, k2]
-                x1 = np.outer(self.x.ravel('F')[vidM], one)
-                y1 = np.outer(self.y.ravel('F')[vidM], one)
-                x2 = np.outer(self.x.ravel('F')[vidP], one)
-                y2 = np.outer(self.y.ravel('F')[vidP], one)
-
-                # Compute distance matrix
-                distance = np.sqrt(
-                    np.abs((x1 - x2.transpose())**2 + (y1-y2.transpose())**2))
-                idM, idP = np.where(distance <= NODETOL*refd)
-                vmapP[idM, f1, k1] = vidP[idP]
-                mapP[idM, f1, k1] = idP + (f2-1)*n_fp+(k2-1)*n_faces*n_fp
+        vidP = vmapM[:, EToF.transpose(), EToE.transpose()]
+
+        # reference length of edges
+        v1 = msh.EToV.transpose()
+        v2 = np.roll(v1, -1, axis=0)
+        refd = np.sqrt(
+            (msh.vx[v1]-msh.vx[v2])**2 + (msh.vy[v1]-msh.vy[v2])**2
+        )
+
+        x = self.x.ravel('F')
+        y = self.y.ravel('F')
+        def matches(vid):
+            distance = np.sqrt((x[vmapM] - x[vid])**2 + (y[vmapM] - y[vid])**2)
+            return np.all(distance <= NODETOL*refd, axis=0)
+
+        isReversed = matches(vidP[::-1])
+        vmapP = np.where(isReversed, vidP[::-1], vidP)
+
+        for f1, k1 in zip(*np.where(~isReversed & ~matches(vidP))):
+            vidM = vmapM[:, f1, k1]
+            vmapP[:, f1, k1] = 0
+            distance = np.sqrt(
+                (x[vidM].reshape(n_fp, 1) - x[vidP[:, f1, k1]])**2 +
+                (y[vidM].reshape(n_fp, 1) - y[vidP[:, f1, k1]])**2)
+            idM, idP = np.where(distance <= NODETOL*refd[f1, k1])
+            vmapP[idM, f1, k1] = vidP[idP, f1, k1]
 
         vmapM = vmapM.ravel('F')
         vmapP = vmapP.ravel('F')
@@ -141,6 +152,38 @@ class Maxwell2D(SpatialDiscretization):
     def get_mesh(self):
         return self.mesh
 
+    def buildInterpolationRows(self, label, points):
+        '''
+        Rows of the nodal basis of the triangles containing points, an array
+        of (x, y) rows, located with the trifinder of the mesh.
+        '''
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        Np = self.number_of_nodes_per_element()
+        K = self.mesh.number_of_elements()
+        finder = self.mesh.getTriangulation().get_trifinder()
+        k = finder(points[:, 0], points[:, 1])
+        if np.any(k < 0):
+            raise ValueError("Probe points outside the mesh.")
+
+        # Affine map from (r, s) in the reference triangle to the element.
+        va, vb, vc = self.mesh.EToV[k].T
+        vx, vy = self.mesh.vx, self.mesh.vy
+        J = np.stack([
+            np.stack([vx[vb] - vx[va], vx[vc] - vx[va]], axis=-1),
+            np.stack([vy[vb] - vy[va], vy[vc] - vy[va]], axis=-1),
+        ], axis=1)
+        d = np.stack([points[:, 0] - vx[va], points[:, 1] - vy[va]], axis=-1)
+        rs = 2.0 * np.linalg.solve(J, d[..., np.newaxis])[..., 0] - 1.0
+
+        r, s = xy_to_rs(*set_nodes_in_equilateral_triangle(self.n_order))
+        V = vandermonde(self.n_order, r, s)
+        rows = np.linalg.solve(
+            V.T, vandermonde(self.n_order, rs[:, 0], rs[:, 1]).T).T
+        cols = Np*k[:, np.newaxis] + np.arange(Np)
+        return sparse.csr_matrix(
+            (rows.ravel(), cols.ravel(), Np*np.arange(len(points) + 1)),
+            shape=(len(points), Np*K))
+
     def number_of_nodes_per_element(self):
         return int((self.n_order + 1) * (self.n_order + 2) / 2)
     
@@ -269,13 +312,284 @@ class Maxwell2D(SpatialDiscretization):
 
         return A
 
+    def buildSparsityPattern(self):
+        Np = self.number_of_nodes_per_element()
+        K = self.mesh.number_of_elements()
+
+        _, _, _, cols = self.bcCoefficients
+        elem_m = np.concatenate((self.vmapM, self.vmapB)) // Np
+        elem_p = np.concatenate((self.vmapP, cols)) // Np
+        EToE = sparse.csr_matrix(
+            (np.ones(elem_m.size), (elem_m, elem_p)), shape=(K, K))
+        EToE += sparse.identity(K)
+
+        return sparse.kron(
+            np.ones((3, 3)),
+            sparse.kron(EToE, np.ones((Np, Np)))
+        ).astype(bool).tocsr()
+
+    def convertToVector(self, fields):
+        if isinstance(fields, Fields):
+            return SpatialDiscretization.convertToVector(self, fields)
+        return np.concatenate((
+            fields['Ez'].ravel(order='F'),
+            fields['Hx'].ravel(order='F'),
+            fields['Hy'].ravel(order='F')
+        ))
+
+    def copyVectorToFields(self, vec, fields):
+        if isinstance(fields, Fields):
+            SpatialDiscretization.copyVectorToFields(self, vec, fields)
+            return
+        Np = self.number_of_nodes_per_element()
+        K = self.mesh.number_of_elements()
+        fields['Ez'][:, :] = vec[:Np*K].reshape(Np, K, order='F')
+        fields['Hx'][:, :] = vec[Np*K:2*Np*K].reshape(Np, K, order='F')
+        fields['Hy'][:, :] = vec[2*Np*K:].reshape(Np, K, order='F')
+
+    def boundaryLabels(self):
+        '''
+        Label of each boundary face node in mapB. mesh.boundary_label is
+        either one label for the whole boundary or a dictionary assigning
+        labels to the named sets of faces in mesh.boundary_faces.
+        '''
+        labels = self.mesh.boundary_label
+        if isinstance(labels, str):
+            return np.full(len(self.mapB), labels, dtype=object)
+
+        K = self.mesh.number_of_elements()
+        faceLabels = np.full(self.n_fp*self.n_faces*K, None, dtype=object)
+        for name, label in labels.items():
+            faces = self.mesh.boundary_faces[name]
+            ids = (faces[:, 0]*self.n_faces + faces[:, 1])*self.n_fp
+            faceLabels[ids.reshape(-1, 1) + np.arange(self.n_fp)] = label
+        faceLabels = faceLabels[self.mapB]
+        if np.any(faceLabels == None):
+            raise ValueError("Boundary faces without a label.")
+        return faceLabels
+
+    def periodicPartners(self, periodic):
+        '''
+        Nodes facing the boundary face nodes mapB[periodic] across the
+        periodic boundary. Periodic faces must be aligned with the axes and
+        are paired with the face found translating them along their normal
+        by the extent of the periodic boundary.
+        '''
+        nodes = self.vmapB[periodic].reshape(-1, self.n_fp)
+        first = self.mapB[periodic][::self.n_fp]
+        x = self.x.ravel('F')[nodes]
+        y = self.y.ravel('F')[nodes]
+        nx = self.nx.ravel('F')[first]
+        ny = self.ny.ravel('F')[first]
+        if not np.allclose(np.abs(nx) + np.abs(ny), 1.0):
+            raise ValueError("Periodic faces must be aligned with the axes.")
+
+        Lx = x.max() - x.min()
+        Ly = y.max() - y.min()
+        tol = NODETOL * max(Lx, Ly)
+        normal = np.stack((np.round(nx), np.round(ny)), axis=1)
+        tx = x - normal[:, [0]]*Lx
+        ty = y - normal[:, [1]]*Ly
+
+        # Faces are paired by their centers, their nodes afterwards.
+        centers = np.stack((x.mean(axis=1), y.mean(axis=1)), axis=1)
+        targets = np.stack((tx.mean(axis=1), ty.mean(axis=1)), axis=1)
+        partner = np.full(len(nodes), -1)
+        for direction in np.unique(normal, axis=0):
+            own = np.where(np.all(normal == direction, axis=1))[0]
+            opposite = np.where(np.all(normal == -direction, axis=1))[0]
+            if len(opposite) == 0:
+                continue
+            distance, nearest = cKDTree(centers[opposite]).query(targets[own])
+            found = distance <= tol
+            partner[own[found]] = opposite[nearest[found]]
+        if np.any(partner < 0):
+            raise ValueError("Periodic faces without a partner.")
+
+        def matches(px, py):
+            return np.all((px-tx)**2 + (py-ty)**2 <= tol**2, axis=1)
+
+        px = x[partner]
+        py = y[partner]
+        isReversed = matches(px[:, ::-1], py[:, ::-1])
+        if not np.all(isReversed | matches(px, py)):
+            raise ValueError("Periodic faces with unmatched nodes.")
+        partnerNodes = np.where(
+            isReversed.reshape(-1, 1), nodes[partner][:, ::-1], nodes[partner])
+        return partnerNodes.ravel()
+
+    def boundaryCoefficients(self):
+        '''
+        Returns cHx, cHy, cEz and the nodes cols such that the boundary
+        values of fieldsOnBoundaryConditions are Hbcx = cHx*Hx[cols], etc.,
+        with one entry per boundary face node in mapB.
+        '''
+        labels = self.boundaryLabels()
+        coeffs = np.zeros((len(labels), 3))
+        for label in np.unique(labels):
+            if label not in BOUNDARY_COEFFICIENTS:
+                raise ValueError("Invalid boundary label.")
+            coeffs[labels == label] = BOUNDARY_COEFFICIENTS[label]
+
+        cols = self.vmapB.copy()
+        periodic = labels == "Periodic"
+        if np.any(periodic):
+            cols[periodic] = self.periodicPartners(periodic)
+
+        return coeffs[:, 0], coeffs[:, 1], coeffs[:, 2], cols
+
+    def buildBoundaryOperators(self):
+        '''
+        Returns sparse operators mapping Hx, Hy and Ez to the boundary values
+        given by fieldsOnBoundaryConditions, placed at the face rows in mapB.
+        '''
+        K = self.mesh.number_of_elements()
+        n_nodes = self.number_of_nodes_per_element() * K
+        n_face_nodes = self.n_fp * self.n_faces * K
+
+        cHx, cHy, cEz, cols = self.bcCoefficients
+
+        shape = (n_face_nodes, n_nodes)
+        Hbcx = sparse.csr_matrix((cHx, (self.mapB, cols)), shape=shape)
+        Hbcy = sparse.csr_matrix((cHy, (self.mapB, cols)), shape=shape)
+        Ebcz = sparse.csr_matrix((cEz, (self.mapB, cols)), shape=shape)
+        return Hbcx, Hbcy, Ebcz
+
+    def buildJumpOperators(self):
+        '''
+        Returns sparse operators mapping Hx, Hy and Ez to the jumps computed
+        by computeJumps, flattened in 'F' order.
+        '''
+        K = self.mesh.number_of_elements()
+        n_nodes = self.number_of_nodes_per_element() * K
+        n_face_nodes = self.n_fp * self.n_faces * K
+        shape = (n_face_nodes, n_nodes)
+        rows = np.arange(n_face_nodes)
+
+        interior = np.ones(n_face_nodes)
+        interior[self.mapB] = 0.0
+        jump = sparse.diags(interior) @ (
+            sparse.csr_matrix((np.ones(n_face_nodes), (rows, self.vmapM)), shape=shape) -
+            sparse.csr_matrix((np.ones(n_face_nodes), (rows, self.vmapP)), shape=shape)
+        )
+        trace_b = sparse.csr_matrix(
+            (np.ones(len(self.mapB)), (self.mapB, self.vmapB)), shape=shape)
+
+        Hbcx, Hbcy, Ebcz = self.buildBoundaryOperators()
+        dHx = jump + trace_b - Hbcx
+        dHy = jump + trace_b - Hbcy
+        dEz = jump + trace_b - Ebcz
+        return dHx.tocsr(), dHy.tocsr(), dEz.tocsr()
+
+    def buildSparseLiftOperator(self):
+        '''
+        Sparse operator applying lift*(f_scale*flux)/2 to a flux flattened
+        in 'F' order.
+        '''
+        eye_K = sparse.identity(self.mesh.number_of_elements(), format='csr')
+        return sparse.kron(eye_K, self.lift) @ \
+            sparse.diags(self.f_scale.ravel('F')/2.0)
+
+    def buildSparseStiffnessEvolutionOperator(self):
+        '''
+        Sparse CSR counterpart of buildStiffnessEvolutionOperator.
+        '''
+        eye_K = sparse.identity(self.mesh.number_of_elements(), format='csr')
+        Dr = sparse.kron(eye_K, self.Dr)
+        Ds = sparse.kron(eye_K, self.Ds)
+        Dx = sparse.diags(self.rx.ravel('F')) @ Dr + \
+            sparse.diags(self.sx.ravel('F')) @ Ds
+        Dy = sparse.diags(self.ry.ravel('F')) @ Dr + \
+            sparse.diags(self.sy.ravel('F')) @ Ds
+
+        Z = sparse.csr_matrix(Dx.shape)
+        return sparse.bmat([
+            [Z,   -Dy, Dx],
+            [-Dy, Z,   Z ],
+            [Dx,  Z,   Z ]
+        ], format='csr')
+
+    def buildSparseZeroNormalEvolutionOperator(self):
+        '''
+        Sparse CSR counterpart of buildZeroNormalEvolutionOperator.
+        '''
+        _, _, dEz = self.buildJumpOperators()
+        L = self.buildSparseLiftOperator()
+
+        Z = sparse.csr_matrix((L.shape[0], L.shape[0]))
+        if self.fluxType == "Upwind":
+            EzEz = - L @ dEz
+        elif self.fluxType == "Centered":
+            EzEz = Z
+        else:
+            raise ValueError("Invalid flux type.")
+
+        return sparse.bmat([
+            [EzEz, Z, Z],
+            [Z,    Z, Z],
+            [Z,    Z, Z]
+        ], format='csr')
+
+    def buildSparseOneNormalEvolutionOperator(self):
+        '''
+        Sparse CSR counterpart of buildOneNormalEvolutionOperator.
+        '''
+        dHx, dHy, dEz = self.buildJumpOperators()
+        L = self.buildSparseLiftOperator()
+        nx = sparse.diags(self.nx.ravel('F'))
+        ny = sparse.diags(self.ny.ravel('F'))
+
+        Z = sparse.csr_matrix((L.shape[0], L.shape[0]))
+        return sparse.bmat([
+            [Z,              L @ ny @ dHx, - L @ nx @ dHy],
+            [L @ ny @ dEz,   Z,            Z             ],
+            [- L @ nx @ dEz, Z,            Z             ]
+        ], format='csr')
+
+    def buildSparseTwoNormalEvolutionOperator(self):
+        '''
+        Sparse CSR counterpart of buildTwoNormalEvolutionOperator.
+        '''
+        dHx, dHy, _ = self.buildJumpOperators()
+        L = self.buildSparseLiftOperator()
+
+        Z = sparse.csr_matrix((L.shape[0], L.shape[0]))
+        if self.fluxType == "Upwind":
+            nx = self.nx.ravel('F')
+            ny = self.ny.ravel('F')
+            HxHx = L @ sparse.diags(nx*nx) @ dHx
+            HxHy = L @ sparse.diags(nx*ny) @ dHy
+            HyHx = L @ sparse.diags(ny*nx) @ dHx
+            HyHy = L @ sparse.diags(ny*ny) @ dHy
+        elif self.fluxType == "Centered":
+            HxHx = HxHy = HyHx = HyHy = Z
+        else:
+            raise ValueError("Invalid flux type.")
+
+        return sparse.bmat([
+            [Z, Z,    Z   ],
+            [Z, HxHx, HxHy],
+            [Z, HyHx, HyHy]
+        ], format='csr')
+
+    def buildSparseEvolutionOperator(self):
+        '''
+        Assembles the same operator as buildEvolutionOperator directly from
+        Dr, Ds, the geometric factors, lift and the face maps as a
+        scipy.sparse CSR matrix, with unknowns ordered as [Ez, Hx, Hy].
+        '''
+        A = self.buildSparseStiffnessEvolutionOperator() + \
+            self.buildSparseZeroNormalEvolutionOperator() + \
+            self.buildSparseOneNormalEvolutionOperator() + \
+            self.buildSparseTwoNormalEvolutionOperator()
+        return A.tocsr()
+
     def buildFields(self):
-        Hx = np.zeros([self.number_of_nodes_per_element(),
-                       self.mesh.number_of_elements()])
-        Hy = np.zeros(Hx.shape)
-        Ez = np.zeros(Hx.shape)
+        shape = (self.number_of_nodes_per_element(),
+                 self.mesh.number_of_elements())
 
-        return {'Hx': Hx, 'Hy': Hy, 'Ez': Ez}
+        # Laid out as the state vector, [Ez, Hx, Hy].
+        return Fields({'Ez': shape, 'Hx': shape, 'Hy': shape})
     
     def computeZeroNormalFlux(self, dEz):
 
@@ -330,26 +644,10 @@ class Maxwell2D(SpatialDiscretization):
         return flux_Hx, flux_Hy, flux_Ez
 
     def fieldsOnBoundaryConditions(self, Hx, Hy, Ez):
-
-        bcType = self.mesh.boundary_label
-        if bcType == "PEC":
-            Hbcx = Hx.transpose().take(self.vmapB)
-            Hbcy = Hy.transpose().take(self.vmapB)
-            Ebcz = - Ez.transpose().take(self.vmapB)
-        elif bcType == "PMC":
-            Hbcx = - Hx.transpose().take(self.vmapB)
-            Hbcy = - Hy.transpose().take(self.vmapB)
-            Ebcz = Ez.transpose().take(self.vmapB)
-        elif bcType == "SMA":
-            Hbcx = Hx.transpose().take(self.vmapB) * 0.0
-            Hbcy = Hx.transpose().take(self.vmapB) * 0.0
-            Ebcz = Ez.transpose().take(self.vmapB) * 0.0
-        elif bcType == "Periodic":
-            Hbcx = Hx.transpose().take(self.vmapB[::-1])
-            Hbcy = Hy.transpose().take(self.vmapB[::-1])
-            Ebcz = Ez.transpose().take(self.vmapB[::-1])
-        else:
-            raise ValueError("Invalid boundary label.")
+        cHx, cHy, cEz, cols = self.bcCoefficients
+        Hbcx = cHx * Hx.transpose().take(cols)
+        Hbcy = cHy * Hy.transpose().take(cols)
+        Ebcz = cEz * Ez.transpose().take(cols)
         return Hbcx, Hbcy, Ebcz
 
     def computeJumps(self, Hx, Hy, Ez):
@@ -371,27 +669,179 @@ class Maxwell2D(SpatialDiscretization):
 
         return dHx, dHy, dEz
 
-    def computeRHS(self, fields):
-        Hx = fields['Hx']
-        Hy = fields['Hy']
-        Ez = fields['Ez']
+    def rhsWorkspaceArrays(self):
+        '''
+        Face node maps, with boundary nodes mapped to the nodes their
+        conditions are taken from, and the coefficients and buffer shapes
+        of the workspace of computeRHSOnWorkspace. Flux and derivative
+        coefficients carry the signs of their terms.
+        '''
+        Np = self.number_of_nodes_per_element()
+        K = self.mesh.number_of_elements()
+        shape = (self.n_fp*self.n_faces, K)
 
-        flux_Hx, flux_Hy, flux_Ez = self.computeFlux(Hx, Hy, Ez)
+        cHx, cHy, cEz, cols = self.bcCoefficients
+        vmapP = self.vmapP.copy()
+        vmapP[self.mapB] = cols
+        coeffs = []
+        for c in (cHx, cHy, cEz):
+            coeff = np.ones(self.n_fp*self.n_faces*K)
+            coeff[self.mapB] = c
+            coeffs.append(coeff.reshape(shape, order='F'))
 
-        rhs_Ezx, rhs_Ezy = grad(
-            self.Dr, self.Ds, Ez, self.rx, self.sx, self.ry, self.sy
-        )
-        rhs_CuHz = curl(
-            self.Dr, self.Ds, Hx, Hy, self.rx, self.sx, self.ry, self.sy
-        )
+        if self.fluxType == "Upwind":
+            upwind = 1.0
+        elif self.fluxType == "Centered":
+            upwind = 0.0
+        else:
+            raise ValueError("Invalid flux type.")
 
+        fs = self.f_scale/2.0
+        maps = {'vmapM': self.vmapM, 'vmapP': vmapP}
+        coefficients = {
+            'coeff_Hx': coeffs[0],
+            'coeff_Hy': coeffs[1],
+            'coeff_Ez': coeffs[2],
+            'fs_mnx': -fs*self.nx,
+            'fs_ny': fs*self.ny,
+            'fs_nxnx': upwind*fs*self.nx*self.nx,
+            'fs_nxny': upwind*fs*self.nx*self.ny,
+            'fs_nyny': upwind*fs*self.ny*self.ny,
+            'fs_mupwind': -upwind*fs,
+            'rx': self.rx,
+            'sx': self.sx,
+            'mry': -self.ry,
+            'msy': -self.sy,
+        }
+        buffers = {l: shape for l in ('dHx', 'dHy', 'dEz', 'flux', 'faces')}
+        buffers.update({l: (Np, K) for l in ('dr', 'ds', 'nodes')})
+        return maps, coefficients, buffers
+
+    def partitionElements(self, nParts):
+        '''
+        Splits the elements in nParts subdomains of consecutive elements in
+        the reverse Cuthill-McKee ordering of the element connectivity, so
+        that subdomains are compact and have short interfaces. Returns the
+        subdomain of each element.
+        '''
+        K = self.mesh.number_of_elements()
+        EToE, _ = self.mesh.connectivityMatrices()
+        adjacency = sparse.csr_matrix(
+            (np.ones(EToE.size), (np.repeat(np.arange(K), EToE.shape[1]),
+                                  EToE.ravel())), shape=(K, K))
+        order = reverse_cuthill_mckee(adjacency, symmetric_mode=True)
+
+        parts = np.empty(K, dtype=int)
+        parts[order] = np.arange(K) * nParts // K
+        return parts
+
+    def buildSubdomainWorkspace(self, elements):
+        '''
+        Workspace of computeRHSOnWorkspace restricted to the given elements,
+        for fields holding only those elements in that order. Face nodes
+        whose neighbours are in other elements are listed in haloFaces,
+        as positions in the face arrays, and haloNodes, as global nodes.
+        '''
+        Np = self.number_of_nodes_per_element()
+        K = self.mesh.number_of_elements()
+        if self.rhsWorkspace is None or self.rhsWorkspace['batch'] != ():
+            self.buildRHSWorkspace()
+        W = self.rhsWorkspace
+
+        local = np.full(K, -1)
+        local[elements] = np.arange(len(elements))
+        def localNodes(vmap):
+            vmap = vmap.reshape(self.n_fp*self.n_faces, K, order='F')
+            vmap = vmap[:, elements].ravel(order='F')
+            return vmap, Np*local[vmap // Np] + vmap % Np
+
+        _, vmapM = localNodes(W['vmapM'])
+        vmapP, localP = localNodes(W['vmapP'])
+        halo = np.where(local[vmapP // Np] < 0)[0]
+        localP[halo] = 0
+
+        w = {
+            'batch': (),
+            'columns': slice(None),
+            'vmapM': vmapM,
+            'vmapP': localP,
+            'haloFaces': halo,
+            'haloNodes': vmapP[halo],
+        }
+        for l, a in W.items():
+            if isinstance(a, np.ndarray) and a.ndim == 2:
+                w[l] = np.asfortranarray(a[:, elements])
+        return w
+
+    def computeRHS(self, fields, out=None):
+        '''
+        Evaluates the right hand side, writing it in the arrays of out when
+        given. Fields stored in 'F' order are read without copies. Fields
+        with trailing batch axes, as in buildBatchedFields, are evaluated
+        for all members at once, with one matrix product over the nodes of
+        all elements and members for each operator.
+        '''
+        if out is None:
+            out = zerosLikeFields(fields)
+        self.computeRHSOnChunks(fields, out)
+        return out
+
+    def computeRHSOnWorkspace(self, fields, out, w, halo=None):
+        '''
+        Evaluates the right hand side into out with the maps, coefficients
+        and buffers of the workspace w, for the element columns of fields
+        given by w['columns']. For subdomain workspaces, halo holds for each
+        field the neighbour face values at w['haloFaces'].
+        '''
+        faces, nodes = w['faces'], w['nodes']
+
+        for l, d, coeff in (('Hx', w['dHx'], w['coeff_Hx']),
+                            ('Hy', w['dHy'], w['coeff_Hy']),
+                            ('Ez', w['dEz'], w['coeff_Ez'])):
+            f = fields[l]
+            np.take(f.T, w['vmapM'], out=d.T.ravel(), mode='clip')
+            np.take(f.T, w['vmapP'], out=faces.T.ravel(), mode='clip')
+            if halo is not None:
+                faces.T.ravel()[w['haloFaces']] = halo[l]
+            faces *= coeff
+            d -= faces
+
+        # Fluxes and derivatives are sums of precomputed coefficients times
+        # jumps or reference derivatives, with the signs in the coefficients.
         # missing material epsilon/mu
-        rhs_Hx = -rhs_Ezy  + np.matmul(self.lift, self.f_scale * flux_Hx)/2.0
-        rhs_Hy =  rhs_Ezx  + np.matmul(self.lift, self.f_scale * flux_Hy)/2.0
-        rhs_Ez =  rhs_CuHz + np.matmul(self.lift, self.f_scale * flux_Ez)/2.0
+        for rhs, terms in (
+            (out['Hx'], ((w['fs_ny'], w['dEz']),
+                         (w['fs_nxnx'], w['dHx']),
+                         (w['fs_nxny'], w['dHy']))),
+            (out['Hy'], ((w['fs_mnx'], w['dEz']),
+                         (w['fs_nxny'], w['dHx']),
+                         (w['fs_nyny'], w['dHy']))),
+            (out['Ez'], ((w['fs_ny'], w['dHx']),
+                         (w['fs_mnx'], w['dHy']),
+                         (w['fs_mupwind'], w['dEz'])))):
+            np.multiply(terms[0][0], terms[0][1], out=w['flux'])
+            for coeff, d in terms[1:]:
+                np.multiply(coeff, d, out=faces)
+                w['flux'] += faces
+            # Products are taken transposed so that BLAS writes 'F' arrays.
+            np.matmul(matrixView(w['flux']).T, self.lift.T,
+                      out=matrixView(rhs).T)
+
+        for rhs, f, dr, ds in (
+            (out['Hx'], fields['Ez'], w['mry'], w['msy']),
+            (out['Hy'], fields['Ez'], w['rx'], w['sx']),
+            (out['Ez'], fields['Hy'], w['rx'], w['sx']),
+            (out['Ez'], fields['Hx'], w['mry'], w['msy'])):
+            f = f[:, w['columns']]
+            np.matmul(matrixView(f).T, self.Dr.T, out=matrixView(w['dr']).T)
+            np.matmul(matrixView(f).T, self.Ds.T, out=matrixView(w['ds']).T)
+            np.multiply(dr, w['dr'], out=nodes)
+            rhs += nodes
+            np.multiply(ds, w['ds'], out=nodes)
+            rhs += nodes
+
+        return out
 
-        return {'Hx': rhs_Hx, 'Hy': rhs_Hy, 'Ez': rhs_Ez}
-    
     def computeRHSStiffness(self, fields):
         Hx = fields['Hx']
         Hy = fields['Hy']
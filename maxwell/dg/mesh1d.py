@@ -46,12 +46,7 @@ def mesh_generator(xmin,xmax,k_elem):
     n_v = k_elem+1
     vx = np.linspace(xmin, xmax, num=n_v)
     
-    #np.zeros creates a float array. etov should be an integer array
-    EToV = np.full((k_elem,2),0)
-    #etov = np.zeros([K,2])
-    for i in range(k_elem):
-        EToV[i,0] = i
-        EToV[i,1] = i+1
+    EToV = np.arange(k_elem).reshape(k_elem,1) + np.arange(2)
 
     return [n_v,vx,k_elem,EToV]
     
\ No newline at end of file
@@ -1,3 +1,5 @@
+import hashlib
+import os
 import numpy as np
 import matplotlib.tri as mtri
 
@@ -5,7 +7,8 @@ N_FACES = 3
 
 
 class Mesh2D:
-    def __init__(self, vx, vy, EToV, boundary_label="PEC"):
+    def __init__(self, vx, vy, EToV, boundary_label="PEC",
+                 boundary_faces=None, element_groups=None):
         assert vx.shape == vy.shape
         assert np.max(np.max(EToV))+1  == vx.shape[0]
         
@@ -16,6 +19,11 @@ class Mesh2D:
         
         self.boundary_label = boundary_label
 
+        # Named sets of boundary faces, as (element, face) rows, and of
+        # elements, as read from the mesh file.
+        self.boundary_faces = dict() if boundary_faces is None else boundary_faces
+        self.element_groups = dict() if element_groups is None else element_groups
+
     def number_of_vertices(self):
         return self.vx.shape[0]
 
@@ -73,33 +81,340 @@ class Mesh2D:
 
     
 
-def readFromGambitFile(filename: str):
-    DIMENSIONS_SECTION = 6
-    COORDINATES_SECTION = 9
+def gambitSections(text):
+    '''
+    Splits the contents of a Gambit neutral file in (header, body) pairs,
+    one for each section closed by ENDOFSECTION.
+    '''
+    sections = []
+    ini = 0
+    while True:
+        end = text.find('ENDOFSECTION', ini)
+        if end < 0:
+            return sections
+        headerEnd = text.find('\n', ini)
+        sections.append((text[ini:headerEnd].strip(), text[headerEnd+1:end]))
+        ini = text.find('\n', end) + 1
+        if ini == 0:
+            return sections
+
+
+def parseNumbers(text, dtype=float):
+    # Bulk conversion of whitespace separated numbers, without tokenizing
+    # in Python.
+    return np.fromstring(text, dtype=dtype, sep=' ')
+
+
+def parseGambitGroup(body):
+    lines = body.split('\n', 2)
+    header = lines[0].split()
+    n_elements = int(header[3])
+    n_flags = int(header[7])
+    name = lines[1].strip()
+    values = parseNumbers(lines[2], dtype=np.int64)
+    return name, values[n_flags:n_flags+n_elements] - 1
+
+
+def parseGambitBoundary(header, body):
+    tokens = header.split()
+    name = ' '.join(tokens[:-4])
+    data_type, n_entries, n_values = (int(t) for t in tokens[-4:-1])
+    if data_type != 1:
+        raise ValueError("Only element face boundary conditions are supported.")
+    values = parseNumbers(body).reshape(n_entries, 3+n_values)
+    faces = values[:, [0, 2]].astype(int) - 1
+    return name, faces
 
+
+def parseGambitFile(filename):
     with open(filename, 'r') as f:
-        lines = f.readlines()
-    
-    # Find number of nodes and number of elements
-    dims = lines[DIMENSIONS_SECTION].split()
-    Nv = int(dims[0])
-    Nk =  int(dims[1])
-        
-    # read node coordinates
-    vx = np.zeros(Nv, dtype=float)
-    vy = np.zeros(Nv, dtype=float)
-    for i in range(Nv):
-        splitted_line = lines[i + COORDINATES_SECTION].split()
-        vx[i] = float(splitted_line[1])
-        vy[i] = float(splitted_line[2])   
-    
-    # read element to node connectivity
-    EToV = np.zeros((Nk, N_FACES), dtype=int)
-    for k in range(Nk):
-        elements_section_begin = COORDINATES_SECTION + Nv + 2
-        splitted_line = lines[k + elements_section_begin].split()
-        EToV[k,0] = int(splitted_line[3]) - 1
-        EToV[k,1] = int(splitted_line[4]) - 1
-        EToV[k,2] = int(splitted_line[5]) - 1
-
-    return Mesh2D(vx, vy, EToV)
+        sections = gambitSections(f.read())
+
+    boundary_faces = dict()
+    element_groups = dict()
+    for title, body in sections:
+        if title.startswith('CONTROL INFO'):
+            dims = body.split('\n')[5].split()
+            Nv = int(dims[0])
+            Nk = int(dims[1])
+        elif title.startswith('NODAL COORDINATES'):
+            coords = parseNumbers(body).reshape(Nv, -1)
+            vx = coords[:, 1].copy()
+            vy = coords[:, 2].copy()
+        elif title.startswith('ELEMENTS/CELLS'):
+            cells = parseNumbers(body, dtype=np.int64)
+            if cells.size != Nk*(3+N_FACES):
+                raise ValueError("Only triangular elements are supported.")
+            EToV = cells.reshape(Nk, 3+N_FACES)[:, 3:] - 1
+        elif title.startswith('ELEMENT GROUP'):
+            name, elements = parseGambitGroup(body)
+            element_groups[name] = elements
+        elif title.startswith('BOUNDARY CONDITIONS'):
+            header, body = body.split('\n', 1)
+            name, faces = parseGambitBoundary(header, body)
+            boundary_faces[name] = faces
+
+    return vx, vy, EToV, boundary_faces, element_groups
+
+
+def fileHash(filename):
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 24), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def readFromGambitFile(filename: str, cache=False):
+    '''
+    Reads a triangular mesh with its boundary conditions and element groups
+    from a Gambit neutral file. Sections are parsed in bulk. With cache,
+    the parsed arrays are stored next to the file, in filename + '.npz',
+    and reused while the hash of the file does not change.
+    '''
+    cacheFile = filename + '.npz'
+    if cache:
+        key = fileHash(filename)
+        if os.path.exists(cacheFile):
+            with np.load(cacheFile) as data:
+                if str(data['hash']) == key:
+                    return Mesh2D(
+                        data['vx'], data['vy'], data['EToV'],
+                        boundary_faces={
+                            l[3:]: data[l] for l in data.files if l.startswith('bc:')},
+                        element_groups={
+                            l[6:]: data[l] for l in data.files if l.startswith('group:')})
+
+    vx, vy, EToV, boundary_faces, element_groups = parseGambitFile(filename)
+
+    if cache:
+        arrays = {'hash': np.array(key), 'vx': vx, 'vy': vy, 'EToV': EToV}
+        arrays.update({'bc:' + l: f for l, f in boundary_faces.items()})
+        arrays.update({'group:' + l: e for l, e in element_groups.items()})
+        tmpFile = cacheFile + '.tmp'
+        with open(tmpFile, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmpFile, cacheFile)
+
+    return Mesh2D(vx, vy, EToV,
+                  boundary_faces=boundary_faces, element_groups=element_groups)
+
+
+GMSH_LINE = 1
+GMSH_TRIANGLE = 2
+GMSH_NODES_PER_ELEMENT = {
+    1: 2, 2: 3, 3: 4, 4: 4, 5: 8, 6: 6, 7: 5, 8: 3, 9: 6, 10: 9, 11: 10, 15: 1
+}
+
+
+class GmshBuffer:
+    '''
+    Sequential reader of the numbers stored in the body of a section of a
+    Gmsh 4 file, either as ASCII text or as binary data.
+    '''
+
+    def __init__(self, body, binary, dataSize=8, dtype=float):
+        self.binary = binary
+        self.position = 0
+        self.sizeType = '<u%d' % dataSize
+        if binary:
+            self.data = body
+        else:
+            self.data = parseNumbers(body.decode('ascii'), dtype=dtype)
+
+    def read(self, n, binaryType):
+        if not self.binary:
+            values = self.data[self.position:self.position+n]
+            self.position += n
+            return values
+        dtype = np.dtype(binaryType)
+        values = np.frombuffer(self.data, dtype=dtype, count=n, offset=self.position)
+        self.position += n * dtype.itemsize
+        return values
+
+    def ints(self, n):
+        return self.read(n, '<i4').astype(np.int64)
+
+    def sizes(self, n):
+        return self.read(n, self.sizeType).astype(np.int64)
+
+    def doubles(self, n):
+        return self.read(n, '<f8').astype(float)
+
+
+def gmshSections(data):
+    '''
+    Bodies, as bytes, of the $Name ... $EndName sections of a Gmsh file.
+    '''
+    sections = dict()
+    ini = data.find(b'$')
+    while ini >= 0:
+        nameEnd = data.find(b'\n', ini)
+        name = data[ini+1:nameEnd].strip().decode('ascii')
+        end = data.find(b'\n$End' + name.encode('ascii'), nameEnd)
+        if end < 0:
+            raise ValueError("Unterminated Gmsh section: " + name)
+        sections[name] = data[nameEnd+1:end+1]
+        ini = data.find(b'$', end + len(name) + 5)
+    return sections
+
+
+def parseGmshPhysicalNames(body):
+    names = dict()
+    for line in body.decode('ascii').splitlines()[1:]:
+        dim, tag, name = line.split(maxsplit=2)
+        names[(int(dim), int(tag))] = name.strip().strip('"')
+    return names
+
+
+def parseGmshEntities(buf):
+    physicals = dict()
+    counts = buf.sizes(4)
+    for dim, n_entities in enumerate(counts):
+        for _ in range(n_entities):
+            tag = int(buf.ints(1)[0])
+            buf.doubles(3 if dim == 0 else 6)
+            physicals[(dim, tag)] = buf.ints(int(buf.sizes(1)[0]))
+            if dim > 0:
+                buf.ints(int(buf.sizes(1)[0]))
+    return physicals
+
+
+def parseGmshNodes(buf):
+    n_blocks, n_nodes, _, max_tag = buf.sizes(4)
+    tags = np.zeros(n_nodes, dtype=np.int64)
+    coords = np.zeros((n_nodes, 3))
+    ini = 0
+    for _ in range(n_blocks):
+        dim, _, parametric = buf.ints(3)
+        n = int(buf.sizes(1)[0])
+        tags[ini:ini+n] = buf.sizes(n)
+        n_coords = 3 + (dim if parametric else 0)
+        coords[ini:ini+n] = buf.doubles(n*n_coords).reshape(n, n_coords)[:, :3]
+        ini += n
+
+    index = np.full(max_tag+1, -1, dtype=np.int64)
+    index[tags] = np.arange(n_nodes)
+    return coords, index
+
+
+def parseGmshElements(buf):
+    blocks = []
+    n_blocks = buf.sizes(4)[0]
+    for _ in range(n_blocks):
+        dim, tag, elementType = (int(v) for v in buf.ints(3))
+        n = int(buf.sizes(1)[0])
+        if elementType not in GMSH_NODES_PER_ELEMENT:
+            raise ValueError("Unsupported Gmsh element type: %d" % elementType)
+        n_nodes = GMSH_NODES_PER_ELEMENT[elementType]
+        nodes = buf.sizes(n*(1+n_nodes)).reshape(n, 1+n_nodes)[:, 1:]
+        blocks.append((dim, tag, elementType, nodes))
+    return blocks
+
+
+def matchFaces(EToV, n_vertices, segments):
+    '''
+    (element, face) rows of the faces of the triangles in EToV whose
+    vertices are those of the segments. Segments shared by two triangles
+    yield both faces.
+    '''
+    def keys(v1, v2):
+        return np.minimum(v1, v2) * n_vertices + np.maximum(v1, v2)
+
+    # Segments are usually much fewer than faces, only them are sorted.
+    segmentKeys = np.unique(keys(segments[:, 0], segments[:, 1]))
+    faceKeys = keys(EToV, np.roll(EToV, -1, axis=1)).ravel()
+    position = np.searchsorted(segmentKeys, faceKeys)
+    position[position == len(segmentKeys)] = 0
+    ids = np.where(segmentKeys[position] == faceKeys)[0]
+
+    found = np.zeros(len(segmentKeys), dtype=bool)
+    found[position[ids]] = True
+    if not np.all(found):
+        raise ValueError("Boundary segments are not faces of the mesh.")
+
+    return np.stack((ids // N_FACES, ids % N_FACES), axis=1)
+
+
+def readFromGmshFile(filename: str):
+    '''
+    Reads a mesh of linear triangles from a Gmsh 4.1 file, ASCII or binary.
+    Triangles are oriented counterclockwise. Physical surfaces give the
+    element_groups and physical curves the boundary_faces of the mesh, both
+    named after the physical names or, if they have none, their tags.
+    '''
+    with open(filename, 'rb') as f:
+        sections = gmshSections(f.read())
+
+    header = sections['MeshFormat'].split(b'\n', 1)
+    version, fileType, dataSize = header[0].split()
+    if version != b'4.1':
+        raise ValueError(
+            "Only Gmsh 4.1 files are supported, not version %s." % version.decode())
+    binary = int(fileType) == 1
+    dataSize = int(dataSize)
+    if binary and np.frombuffer(header[1], dtype='<i4', count=1)[0] != 1:
+        raise ValueError("Only little endian Gmsh files are supported.")
+
+    names = dict()
+    if 'PhysicalNames' in sections:
+        names = parseGmshPhysicalNames(sections['PhysicalNames'])
+    physicals = dict()
+    if 'Entities' in sections:
+        physicals = parseGmshEntities(
+            GmshBuffer(sections['Entities'], binary, dataSize))
+    coords, index = parseGmshNodes(
+        GmshBuffer(sections['Nodes'], binary, dataSize))
+    blocks = parseGmshElements(
+        GmshBuffer(sections['Elements'], binary, dataSize, dtype=np.int64))
+
+    triangles = []
+    segments = []
+    element_groups = dict()
+    segment_groups = dict()
+    n_triangles = 0
+    n_segments = 0
+    for dim, tag, elementType, nodes in blocks:
+        if dim == 2:
+            if elementType != GMSH_TRIANGLE:
+                raise ValueError("Only linear triangles are supported.")
+            triangles.append(nodes)
+            ids = np.arange(n_triangles, n_triangles + len(nodes))
+            n_triangles += len(nodes)
+            groups = element_groups
+        elif dim == 1 and elementType == GMSH_LINE:
+            segments.append(nodes)
+            ids = np.arange(n_segments, n_segments + len(nodes))
+            n_segments += len(nodes)
+            groups = segment_groups
+        else:
+            continue
+        for physical in physicals.get((dim, tag), []):
+            name = names.get((dim, int(physical)), str(physical))
+            groups.setdefault(name, []).append(ids)
+
+    EToV = index[np.concatenate(triangles)]
+
+    # Only nodes of triangles are kept as vertices.
+    used = np.zeros(len(coords), dtype=bool)
+    used[EToV] = True
+    renumber = np.cumsum(used) - 1
+    EToV = renumber[EToV]
+    vx = coords[used, 0].copy()
+    vy = coords[used, 1].copy()
+
+    v1, v2, v3 = (EToV[:, i] for i in range(N_FACES))
+    area = (vx[v2]-vx[v1])*(vy[v3]-vy[v1]) - (vx[v3]-vx[v1])*(vy[v2]-vy[v1])
+    EToV[area < 0] = EToV[area < 0][:, [0, 2, 1]]
+
+    element_groups = {
+        l: np.concatenate(ids) for l, ids in element_groups.items()}
+    boundary_faces = dict()
+    if segments:
+        segments = renumber[index[np.concatenate(segments)]]
+        boundary_faces = {
+            l: matchFaces(EToV, len(vx), segments[np.concatenate(ids)])
+            for l, ids in segment_groups.items()}
+
+    return Mesh2D(vx, vy, EToV,
+                  boundary_faces=boundary_faces, element_groups=element_groups)
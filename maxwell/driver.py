@@ -11,30 +11,108 @@ from .integrators.LSERK134 import *
 from .integrators.LF2 import *
 from .integrators.LF2V import *
 from .integrators.EULER import *
+from .integrators.EXPINT import *
+from .integrators.MRAB3 import *
+from .integrators.DOPRI54 import *
+from .integrators.stepControl import *
+from .integrators.linearSolvers import *
+
+
+def timeStepSize(sp, CFL):
+    '''
+    Time step size of the discretization sp for the Courant number CFL.
+    '''
+    r_min = sp.get_minimum_node_distance()
+    if (sp.isStaggered()):
+        return CFL * r_min / np.sqrt(sp.dimension())
+    if (sp.get_mesh().dimension == 1):
+        return CFL * r_min * 2.0 / 3.0
+    elif (sp.get_mesh().dimension == 2):
+        dtscale = sp.get_dt_scale()
+        return CFL * min(dtscale)*r_min*2.0/3.0
+
+
+def stepCount(time, final_time, dt):
+    '''
+    Number of full steps of dt from time to final_time and the size of the
+    partial step left. Remainders within rounding of a step are taken as
+    full steps.
+    '''
+    remaining = final_time - time
+    nSteps = int(np.floor(remaining / dt))
+    remainder = remaining - nSteps * dt
+    if remainder > (1.0 - 1e-9) * dt:
+        nSteps += 1
+        remainder = 0.0
+    elif remainder < 1e-9 * dt:
+        remainder = 0.0
+    return max(nSteps, 0), max(remainder, 0.0)
+
+
+class StepCallback:
+    '''
+    Function called with the driver every everySteps steps or, at the first
+    step reaching each multiple, every everyTime of simulated time.
+    '''
+
+    def __init__(self, function, everySteps=None, everyTime=None):
+        if (everySteps is None) == (everyTime is None):
+            raise ValueError('Callbacks need one of everySteps or everyTime')
+        self.function = function
+        self.everySteps = everySteps
+        self.everyTime = everyTime
+        self.nextTime = None
+
+    def tolerance(self, driver):
+        return 1e-9 * driver.dt
+
+    def schedule(self, driver):
+        if self.everyTime is not None:
+            time = driver.timeIntegrator.time + self.tolerance(driver)
+            self.nextTime = (np.floor(time / self.everyTime) + 1) * self.everyTime
+
+    def stepsToNext(self, driver):
+        '''
+        Steps of the driver dt until the callback is due.
+        '''
+        if self.everySteps is not None:
+            return self.everySteps - driver.steps % self.everySteps
+        remaining = self.nextTime - driver.timeIntegrator.time
+        return max(1, int(np.ceil(remaining / driver.dt - 1e-9)))
+
+    def isDue(self, driver):
+        if self.everySteps is not None:
+            return driver.steps % self.everySteps == 0
+        return driver.timeIntegrator.time >= self.nextTime - self.tolerance(driver)
+
+    def fire(self, driver):
+        self.function(driver)
+        self.schedule(driver)
 
 
 class MaxwellDriver:
     def __init__(self, 
                  sp: SpatialDiscretization, 
                  timeIntegratorType = 'LSERK4',
-                 CFL = 1.0):
+                 CFL = 1.0,
+                 linearSolver = None,
+                 compiledStep = False,
+                 batchSize = None,
+                 adaptive = False,
+                 rtol = 1e-6,
+                 atol = 1e-8):
 
         self.sp = sp
         
-        # Compute time step size
-        r_min = sp.get_minimum_node_distance()
-        if (sp.isStaggered()):
-            self.dt = CFL * r_min / np.sqrt(sp.dimension())
-        else:
-            if (sp.get_mesh().dimension == 1):
-                self.dt = CFL * r_min * 2.0 / 3.0
-            elif (sp.get_mesh().dimension == 2):
-                dtscale = sp.get_dt_scale()
-                self.dt = CFL * min(dtscale)*r_min*2.0/3.0
-
+        self.dt = timeStepSize(sp, CFL)
         self.sp.dt = self.dt       
 
-        self.fields = sp.buildFields()
+        # An ensemble of batchSize members is stepped at once, with the
+        # members along a trailing axis of the fields.
+        if batchSize is None:
+            self.fields = sp.buildFields()
+        else:
+            self.fields = sp.buildBatchedFields(batchSize)
             
         # Init time integrator
         if timeIntegratorType == 'EULER':
@@ -45,36 +123,165 @@ class MaxwellDriver:
             self.timeIntegrator = LSERK74(self.sp, self.fields)
         elif timeIntegratorType == 'LSERK134':
             self.timeIntegrator = LSERK134(self.sp, self.fields)
+        elif timeIntegratorType == 'DOPRI54':
+            self.timeIntegrator = DOPRI54(self.sp, self.fields)
         elif timeIntegratorType == 'LF2':
             self.timeIntegrator = LF2(self.sp, self.fields)
         elif timeIntegratorType == 'LF2V':
             self.timeIntegrator = LF2V(self.sp, self.fields)
         elif timeIntegratorType == 'IBE':
-            self.timeIntegrator = IBE(self.sp, self.fields)
+            self.timeIntegrator = IBE(self.sp, self.fields, linearSolver)
         elif timeIntegratorType == 'CN':
-            self.timeIntegrator = CN(self.sp, self.fields)
+            self.timeIntegrator = CN(self.sp, self.fields, linearSolver)
         elif timeIntegratorType == 'DIRK2':
-            self.timeIntegrator = DIRK2(self.sp, self.fields)
+            self.timeIntegrator = DIRK2(self.sp, self.fields, linearSolver)
         elif timeIntegratorType == 'IGLRK4':
-            self.timeIntegrator = IGLRK4(self.sp, self.fields)
+            self.timeIntegrator = IGLRK4(self.sp, self.fields, linearSolver)
         elif timeIntegratorType == 'AM2':
-            self.timeIntegrator = AM2(self.sp, self.fields)
+            self.timeIntegrator = AM2(self.sp, self.fields, linearSolver)
+        elif timeIntegratorType == 'EXPINT':
+            self.timeIntegrator = EXPINT(self.sp, self.fields)
+        elif timeIntegratorType == 'MRAB3':
+            # Steps of multirate integrators span all the rate levels.
+            self.timeIntegrator = MRAB3(self.sp, self.fields, self.dt)
+            self.dt = self.timeIntegrator.dt
         else:
             raise ValueError('Invalid time integrator')
 
+        if linearSolver is not None and not hasattr(self.timeIntegrator, 'solver'):
+            raise ValueError('Linear solvers only apply to implicit time integrators')
+        if batchSize is not None and not hasattr(self.timeIntegrator, 'N_STAGES'):
+            raise ValueError('Batched fields only apply to explicit time integrators')
+
+        # Adaptive steps start from the CFL dt and are then chosen to keep
+        # the estimated local error within rtol and atol.
+        self.stepper = None
+        if adaptive:
+            if compiledStep:
+                raise ValueError('Compiled steps have a fixed size')
+            self.stepper = AdaptiveStepper(
+                self.timeIntegrator, self.fields, self.dt, rtol, atol)
+
+        self.propagator = None
+        if compiledStep:
+            self.compileStep()
+
+        self.steps = 0
+        self.callbacks = []
+
+    def addCallback(self, function, everySteps=None, everyTime=None):
+        '''
+        Registers function, called with the driver during run and run_until
+        every everySteps steps or every everyTime of simulated time.
+        '''
+        callback = StepCallback(function, everySteps, everyTime)
+        callback.schedule(self)
+        self.callbacks.append(callback)
+        return callback
+
+    def fireCallbacks(self):
+        for callback in self.callbacks:
+            if callback.isDue(self):
+                callback.fire(self)
+
     def step(self, dt = 0.0):
+        self.steps += 1
+        if self.stepper is not None:
+            # An explicit dt bounds the adaptive step.
+            self.stepper.step(self.fields, np.inf if dt == 0.0 else dt)
+            return
         if dt == 0.0:
             dt = self.dt
-        self.timeIntegrator.step(self.fields, dt)
+        if self.propagator is not None and dt == self.dt:
+            q = self.sp.convertToVector(self.fields)
+            self.sp.copyVectorToFields(self.propagator.dot(q), self.fields)
+            self.timeIntegrator.time += dt
+        else:
+            self.timeIntegrator.step(self.fields, dt)
+
+    def compileStep(self):
+        '''
+        Builds the sparse one-step propagator of low-storage RK integrators
+        for the driver dt from the evolution operator and the A, B
+        coefficients of the scheme, so that each step is a single SpMV, or
+        a single SpMM over the members of batched fields.
+        Discretizations that are not time invariant, other integrators and
+        propagators with more nonzeros than twice those of N_STAGES evolution
+        operators, where fill-in makes the SpMV slower than the stages, keep
+        stepping through the time integrator. Returns whether the step was compiled.
+        '''
+        self.propagator = None
+        ti = self.timeIntegrator
+        if not self.sp.isTimeInvariant() or \
+           not isinstance(ti, (LSERK4, LSERK74, LSERK134)):
+            return False
+
+        L = self.dt * self.sp.buildSparseEvolutionOperator()
+        N = L.shape[0]
+        Q = sparse.identity(N, format='csr')
+        R = sparse.csr_matrix((N, N))
+        for s in range(ti.N_STAGES):
+            R = ti.A[s]*R + L @ Q
+            Q = Q + ti.B[s]*R
+            if Q.nnz > 2 * ti.N_STAGES * L.nnz:
+                return False
+        Q.eliminate_zeros()
+
+        self.propagator = Q.tocsr()
+        return True
+
+    def stepCount(self, final_time):
+        return stepCount(self.timeIntegrator.time, final_time, self.dt)
+
+    def runSteps(self, nSteps):
+        '''
+        Takes nSteps steps of dt, firing the callbacks when they are due.
+        Steps between callbacks run without checking them.
+        '''
+        while nSteps > 0:
+            chunk = nSteps
+            for callback in self.callbacks:
+                chunk = min(chunk, callback.stepsToNext(self))
+            for _ in range(chunk):
+                self.step()
+            nSteps -= chunk
+            self.fireCallbacks()
+
+    def runAdaptive(self, final_time):
+        while self.timeIntegrator.time < final_time:
+            self.steps += 1
+            self.stepper.step(
+                self.fields, final_time - self.timeIntegrator.time)
+            self.fireCallbacks()
 
     def run(self, final_time):
-        for t_step in range(1, np.ceil(final_time/self.dt)):
-            self.step()
+        '''
+        Advances to exactly final_time, with full steps of dt and a last
+        partial step for the remainder. Integrators with a fixed step size
+        raise a ValueError, before stepping, when a partial step is needed.
+        '''
+        if self.stepper is not None:
+            self.runAdaptive(final_time)
+            return
+        nSteps, remainder = self.stepCount(final_time)
+        if remainder > 0.0 and getattr(self.timeIntegrator, 'FIXED_STEP', False):
+            raise ValueError('Final time is not a whole number of fixed steps')
+        self.runSteps(nSteps)
+        if remainder > 0.0:
+            self.step(remainder)
+            self.fireCallbacks()
 
     def run_until(self, final_time):
-        timeRange = np.arange(0.0, final_time, self.dt)
-        for t in timeRange:
-            self.step()
+        '''
+        Takes the full steps of dt from the current time that reach or pass
+        final_time, without partial steps. Adaptive steps end exactly at
+        final_time.
+        '''
+        if self.stepper is not None:
+            self.runAdaptive(final_time)
+            return
+        nSteps, remainder = self.stepCount(final_time)
+        self.runSteps(nSteps + (remainder > 0.0))
 
     def __getitem__(self, key):
         return self.fields[key]
@@ -91,4 +298,40 @@ class MaxwellDriver:
         
         self.fields = self.sp.buildFields()
         
-        return A
\ No newline at end of file
+        return A
+    
+    def buildSparseDrivedEvolutionOperator(self):
+        '''
+        Sparse counterpart of buildDrivedEvolutionOperator, probed with one
+        step per column color. The pattern of the one-step propagator is the
+        pattern of the spatial operator raised to the number of stages of
+        the time integrator; implicit integrators give a full pattern.
+        '''
+        P = self.sp.buildSparsityPattern()
+        N = P.shape[0]
+        if hasattr(self.timeIntegrator, 'N_STAGES'):
+            stage = (P + sparse.identity(N)).tocsr().astype(float)
+            pattern = sparse.identity(N, format='csr')
+            for _ in range(self.timeIntegrator.N_STAGES):
+                pattern = pattern @ stage
+                pattern.data[:] = 1.0
+        else:
+            pattern = np.ones((N, N))
+
+        # Probes step private fields, with as many colors as batch members,
+        # and the state of the driver is restored afterwards.
+        saved = self.fields, self.steps, self.timeIntegrator.time
+        fields = zerosLikeFields(self.fields)
+        def apply(Q):
+            self.sp.copyVectorToFields(Q, fields)
+            self.fields = fields
+            self.timeIntegrator.time = saved[2]
+            self.step()
+            return self.sp.convertToVector(fields).reshape(Q.shape)
+
+        try:
+            return probeSparseOperator(
+                apply, pattern, self.sp.columnColors(pattern),
+                getattr(fields, 'batchSize', None))
+        finally:
+            self.fields, self.steps, self.timeIntegrator.time = saved
@@ -17,6 +17,9 @@ class FD1D(SpatialDiscretization):
         self.dx = self.x[1:] - self.x[:-1]
         self.dxH = self.xH[1:] - self.xH[:-1]
 
+        self.rhsCoeffE = - (1.0/self.dxH)
+        self.rhsCoeffH = - (1.0/self.dx)
+
         K = self.mesh.number_of_elements()
 
         self.c0 = 1.0
@@ -33,13 +36,20 @@ class FD1D(SpatialDiscretization):
             raise ValueError('Missing TFSF setup variables')
 
     def buildFields(self):
-        E = np.zeros(self.x.shape)
-        H = np.zeros(self.xH.shape)
-    
         if (self.source != None and self.tfsf):
             self.buildIncidentFields()
 
-        return {"E": E, "H": H}
+        return Fields({"E": self.x.shape, "H": self.xH.shape})
+
+    def buildInterpolationRows(self, label, points):
+        '''
+        Linear interpolation between the grid nodes of E or H.
+        '''
+        points = np.asarray(points, dtype=float).ravel()
+        if np.any(points < self.x[0]) or np.any(points > self.x[-1]):
+            raise ValueError("Probe points outside the mesh.")
+        grid = self.x if label == "E" else self.xH
+        return gridInterpolationMatrix([grid], [points])
 
     def buildIncidentFields(self):
         self.Einc = np.ndarray(self.x.shape)
@@ -56,12 +66,15 @@ class FD1D(SpatialDiscretization):
 
 
 
-    def computeRHSE(self, fields):
+    def computeRHSE(self, fields, out=None):
         H = fields['H']
         E = fields['E']
-        rhsE = np.zeros(fields['E'].shape)
+        rhsE = np.zeros(fields['E'].shape) if out is None else out
 
-        rhsE[1:-1] = - (1.0/self.dxH) * (H[1:] - H[:-1])
+        np.subtract(H[1:], H[:-1], out=rhsE[1:-1])
+        rhsE[1:-1] *= withBatchAxes(self.rhsCoeffE, rhsE)
+        rhsE[0] = 0.0
+        rhsE[-1] = 0.0
 
         if self.tfsf == True:
 
@@ -131,9 +144,12 @@ class FD1D(SpatialDiscretization):
 
 
 
-    def computeRHSH(self, fields):
+    def computeRHSH(self, fields, out=None):
         E = fields['E']
-        rhsH = - (1.0/self.dx) * (E[1:] - E[:-1])
+        rhsH = np.zeros(fields['H'].shape) if out is None else out
+
+        np.subtract(E[1:], E[:-1], out=rhsH)
+        rhsH *= withBatchAxes(self.rhsCoeffH, rhsH)
 
         if self.tfsf == True:
             self.updateIncidentFieldH()
@@ -142,11 +158,13 @@ class FD1D(SpatialDiscretization):
 
         return rhsH
 
-    def computeRHS(self, fields):
-        rhsE = self.computeRHSE(fields)
-        rhsH = self.computeRHSH(fields)
+    def computeRHS(self, fields, out=None):
+        if out is None:
+            out = zerosLikeFields(fields)
+        self.computeRHSE(fields, out=out['E'])
+        self.computeRHSH(fields, out=out['H'])
 
-        return {'E': rhsE, 'H': rhsH}
+        return out
 
     def updateIncidentFieldE(self):
         self.Einc[1:-1] = self.Einc[1:-1] - self.dt*(1.0/self.dxH) * (self.Hinc[1:] - self.Hinc[:-1])
@@ -173,8 +191,15 @@ class FD1D(SpatialDiscretization):
     def isStaggered(self):
         return True
 
+    def isTimeInvariant(self):
+        # TFSF sources and Mur conditions update state on each computeRHS.
+        return not self.tfsf and "Mur" not in self.mesh.boundary_label.values()
+
     def number_of_nodes_per_element(self):
         return 1   
+
+    def elementBlocks(self):
+        return None
     
     def setFieldWithIndex(self, fields, i, val):
         NE = fields['E'].size
@@ -184,6 +209,24 @@ class FD1D(SpatialDiscretization):
             fields['H'][i - NE] = val
         return fields
 
+    def buildSparsityPattern(self):
+        # E and H nodes interleaved in a grid. Periodic and Mur conditions
+        # couple nodes up to two and three positions apart, respectively.
+        NE = self.x.size
+        NH = self.xH.size
+        ids = np.full(NE + NH, -1)
+        ids[0::2] = np.arange(NE)
+        ids[1::2] = NE + np.arange(NH)
+        labels = self.mesh.boundary_label.values()
+        periodic = "Periodic" in labels
+        if "Mur" in labels:
+            radius = 3
+        elif periodic:
+            radius = 2
+        else:
+            radius = 1
+        return gridStencilPattern(ids, radius, periodic)
+
     def buildEvolutionOperator(self):
         NE = self.buildFields()['E'].size
         N = self.number_of_unknowns()
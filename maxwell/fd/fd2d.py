@@ -38,6 +38,9 @@ class FD2D(SpatialDiscretization):  # TE mode
         self.tfsf = False
         self.source = None
 
+        self.rhsWorkspace = None
+        self.differenceWorkspaces = None
+
     def TFSF_conditions(self, setup):
 
         self.tfsf =  True
@@ -51,18 +54,32 @@ class FD2D(SpatialDiscretization):  # TE mode
             raise ValueError('Missing TFSF setup variables')
 
     def buildFields(self):
-        H = np.zeros((len(self.dy), len(self.dx)))
-        Ex = np.zeros((len(self.y),  len(self.dx)))
-        Ey = np.zeros((len(self.dy), len(self.x)))
-
         if (self.source != None and self.tfsf):
             self.buildIncidentFields()
 
-        return {
-            "E": {"x": Ex, "y": Ey},
-            "H": H
-        }
+        return Fields({
+            "E": {"x": (len(self.y),  len(self.dx)),
+                  "y": (len(self.dy), len(self.x))},
+            "H": (len(self.dy), len(self.dx))
+        })
     
+    def buildInterpolationRows(self, label, points):
+        '''
+        Bilinear interpolation between the grid nodes of each field, whose
+        first axis is along y.
+        '''
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        x, y = points[:, 0], points[:, 1]
+        if np.any(x < self.x[0]) or np.any(x > self.x[-1]) or \
+           np.any(y < self.y[0]) or np.any(y > self.y[-1]):
+            raise ValueError("Probe points outside the mesh.")
+        grids = {
+            ("E", "x"): [self.y, self.xH],
+            ("E", "y"): [self.yH, self.x],
+            "H": [self.yH, self.xH],
+        }
+        return gridInterpolationMatrix(grids[label], [y, x])
+
     def buildIncidentFields(self):
         
         self.xH_inc, self.yH_inc = np.meshgrid(self.xH, self.yH)
@@ -84,25 +101,65 @@ class FD2D(SpatialDiscretization):  # TE mode
         return np.min(self.dx)
     
 
-    def computeRHSE(self, fields):
+    def buildSparsityPattern(self):
+        # Ex, Ey and H nodes placed in a doubled grid. Mur conditions couple
+        # nodes up to three positions apart, otherwise only neighbours are.
+        nx = len(self.dx)
+        ny = len(self.dy)
+        NEx = (ny+1)*nx
+        NEy = ny*(nx+1)
+        ids = np.full((2*ny+1, 2*nx+1), -1)
+        ids[0::2, 1::2] = np.arange(NEx).reshape((ny+1, nx), order='F')
+        ids[1::2, 0::2] = NEx + np.arange(NEy).reshape((ny, nx+1), order='F')
+        ids[1::2, 1::2] = NEx + NEy + \
+            np.arange(ny*nx).reshape((ny, nx), order='F')
+        radius = 3 if "Mur" in self.boundary_labels.values() else 1
+        return gridStencilPattern(ids, radius)
+
+    def differenceAlongY(self, f, c):
+        '''
+        View of c*(f[1:] - f[:-1]) along the first axis, computed in a
+        workspace from the contiguous buffer of f, as ufuncs on views
+        sliced along the first axis buffer their operands.
+        '''
+        if self.differenceWorkspaces is None:
+            self.differenceWorkspaces = dict()
+        w = self.differenceWorkspaces.get(f.shape)
+        if w is None:
+            w = np.zeros(f.shape, order='F')
+            self.differenceWorkspaces[f.shape] = w
+        flat = flatView(f)
+        d = flatView(w)[:-1]
+        np.subtract(flat[1:], flat[:-1], out=d)
+        d *= c
+        return w[:-1]
+
+    def computeRHSE(self, fields, out=None):
         H = fields['H']
         Ex = fields['E']['x']
         Ey = fields['E']['y']
 
-        rhsEx = np.zeros(Ex.shape)
-        rhsEy = np.zeros(Ey.shape)
+        if out is None:
+            out = {'x': np.zeros(Ex.shape), 'y': np.zeros(Ey.shape)}
+        rhsEx = out['x']
+        rhsEy = out['y']
 
-        rhsEx[1:-1, :] =   self.cEy * ( H[1:, :] - H[:-1, :])
-        rhsEy[:, 1:-1] = - self.cEx * ( H[:, 1:] - H[:, :-1])
+        np.copyto(rhsEx[1:-1, :], self.differenceAlongY(H, self.cEy))
+        rhsEx[0, :] = 0.0
+        rhsEx[-1, :] = 0.0
+        np.subtract(H[:, 1:], H[:, :-1], out=rhsEy[:, 1:-1])
+        rhsEy[:, 1:-1] *= - self.cEx
+        rhsEy[:, 0] = 0.0
+        rhsEy[:, -1] = 0.0
 
         if self.tfsf == True:
 
             self.updateIncidentFieldE() 
-            rhsEy[self.XL_TF_limit,:]  +=  (1.0/self.dxH[0]) * self.Hinc[self.XL_TF_limit-1,:] #outside left face (signos cambiados por sullivan)
-            rhsEy[self.XU_TF_limit,:]  -=  (1.0/self.dxH[0]) * self.Hinc[self.XU_TF_limit,:] #outside right face
+            rhsEy[self.XL_TF_limit,:]  +=  (1.0/self.dxH[0]) * withBatchAxes(self.Hinc[self.XL_TF_limit-1,:], rhsEy) #outside left face (signos cambiados por sullivan)
+            rhsEy[self.XU_TF_limit,:]  -=  (1.0/self.dxH[0]) * withBatchAxes(self.Hinc[self.XU_TF_limit,:], rhsEy) #outside right face
 
-            rhsEx[:,self.YL_TF_limit]  -=  (1.0/self.dxH[0]) * self.Hinc[:,self.YL_TF_limit-1] #outside front face
-            rhsEx[:,self.YU_TF_limit]  +=  (1.0/self.dxH[0]) * self.Hinc[:,self.YU_TF_limit] #outside back face
+            rhsEx[:,self.YL_TF_limit]  -=  (1.0/self.dxH[0]) * withBatchAxes(self.Hinc[:,self.YL_TF_limit-1], rhsEx) #outside front face
+            rhsEx[:,self.YU_TF_limit]  +=  (1.0/self.dxH[0]) * withBatchAxes(self.Hinc[:,self.YU_TF_limit], rhsEx) #outside back face
 
 
 
@@ -169,30 +226,38 @@ class FD2D(SpatialDiscretization):  # TE mode
             else:
                 raise ValueError("Invalid boundary tag.")       
 
-        return {'x': rhsEx, 'y': rhsEy}
+        return out
 
-    def computeRHSH(self, fields):
+    def computeRHSH(self, fields, out=None):
         Ex = fields['E']['x']
         Ey = fields['E']['y']
 
-        rhsH = + self.cEy*(Ex[1:, :] - Ex[:-1, :]) \
-               - self.cEx*(Ey[:, 1:] - Ey[:, :-1])
+        rhsH = np.zeros(fields['H'].shape) if out is None else out
+        if self.rhsWorkspace is None or self.rhsWorkspace.shape != rhsH.shape:
+            self.rhsWorkspace = np.zeros_like(rhsH)
+
+        np.copyto(rhsH, self.differenceAlongY(Ex, self.cEy))
+        np.subtract(Ey[:, 1:], Ey[:, :-1], out=self.rhsWorkspace)
+        self.rhsWorkspace *= self.cEx
+        rhsH -= self.rhsWorkspace
         
         if self.tfsf == True:  
             self.updateIncidentFieldH()
 
-            rhsH[self.XL_TF_limit - 1, :] +=  (1.0/self.dx[0]) * self.Einc_y[self.XL_TF_limit, :] #left face  
-            rhsH[self.XU_TF_limit, :]     -=  (1.0/self.dx[0]) * self.Einc_y[self.XU_TF_limit, :] #right face         
-            rhsH[: ,self.YL_TF_limit - 1] -=  (1.0/self.dx[0]) * self.Einc_x[:,self.YL_TF_limit] #front face
-            rhsH[: ,self.YU_TF_limit]     +=  (1.0/self.dx[0]) * self.Einc_x[:,self.YU_TF_limit] #back face
+            rhsH[self.XL_TF_limit - 1, :] +=  (1.0/self.dx[0]) * withBatchAxes(self.Einc_y[self.XL_TF_limit, :], rhsH) #left face  
+            rhsH[self.XU_TF_limit, :]     -=  (1.0/self.dx[0]) * withBatchAxes(self.Einc_y[self.XU_TF_limit, :], rhsH) #right face         
+            rhsH[: ,self.YL_TF_limit - 1] -=  (1.0/self.dx[0]) * withBatchAxes(self.Einc_x[:,self.YL_TF_limit], rhsH) #front face
+            rhsH[: ,self.YU_TF_limit]     +=  (1.0/self.dx[0]) * withBatchAxes(self.Einc_x[:,self.YU_TF_limit], rhsH) #back face
 
         return rhsH
 
-    def computeRHS(self, fields):
-        rhsE = self.computeRHSE(fields)
-        rhsH = self.computeRHSH(fields)
+    def computeRHS(self, fields, out=None):
+        if out is None:
+            out = zerosLikeFields(fields)
+        self.computeRHSE(fields, out=out['E'])
+        self.computeRHSH(fields, out=out['H'])
 
-        return {'E': rhsE, 'H': rhsH}
+        return out
     
     def updateIncidentFieldE(self):
         self.Einc_x[1:-1,:] = self.Einc_x[1:-1,:] - self.dt*(1.0/self.dxH[0])\
@@ -240,5 +305,12 @@ class FD2D(SpatialDiscretization):  # TE mode
     def isStaggered(self):
         return True
 
+    def elementBlocks(self):
+        return None
+
+    def isTimeInvariant(self):
+        # TFSF sources and Mur conditions update state on each computeRHS.
+        return not self.tfsf and "Mur" not in self.boundary_labels.values()
+
     def dimension(self):
         return 2
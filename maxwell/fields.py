@@ -0,0 +1,114 @@
+import numpy as np
+
+
+def flatView(f):
+    '''
+    Contiguous one-dimensional view of a field array or of Fields.
+    '''
+    if isinstance(f, Fields):
+        return f.data
+    return f.reshape(-1, order='F')
+
+
+def matrixView(f):
+    '''
+    Two-dimensional view of a field array with its rows as first axis and
+    all other axes, elements and batch members, merged in the columns.
+    '''
+    if f.ndim > 2 and not f.flags.f_contiguous:
+        raise ValueError("Batched fields must be stored in 'F' order.")
+    return f.reshape(f.shape[0], -1, order='F')
+
+
+def withBatchAxes(c, f):
+    '''
+    View of the coefficient array c with trailing unit axes, so that it
+    broadcasts along the batch axes of the field array f.
+    '''
+    return c.reshape(c.shape + (1,)*(f.ndim - c.ndim))
+
+
+class Fields(dict):
+    '''
+    Dictionary of named field arrays stored in one contiguous buffer, data.
+    Each field is a zero-copy view, in 'F' order, of a consecutive segment
+    of data, laid out in the order of shapes. Nested dictionaries of shapes
+    give nested Fields viewing their segment of the same buffer.
+
+    With a batchSize, the fields of an ensemble of batchSize members are
+    stored, appending to the shape of each field a trailing batch axis.
+    '''
+
+    def __init__(self, shapes, data=None, batchSize=None):
+        dict.__init__(self)
+        self.batchSize = batchSize
+        size = Fields.sizeOf(shapes, batchSize)
+        if data is None:
+            data = np.zeros(size)
+        if data.ndim != 1 or data.size != size:
+            raise ValueError("Buffer does not match the field shapes.")
+        self.data = data
+
+        batch = () if batchSize is None else (batchSize,)
+        ini = 0
+        for l, shape in shapes.items():
+            if isinstance(shape, dict):
+                size = Fields.sizeOf(shape, batchSize)
+                dict.__setitem__(
+                    self, l, Fields(shape, data[ini:ini+size], batchSize))
+            else:
+                size = int(np.prod(shape + batch))
+                dict.__setitem__(
+                    self, l, data[ini:ini+size].reshape(shape + batch, order='F'))
+            ini += size
+
+    @staticmethod
+    def sizeOf(shapes, batchSize=None):
+        members = 1 if batchSize is None else batchSize
+        return sum(
+            Fields.sizeOf(s, batchSize) if isinstance(s, dict)
+            else int(np.prod(s)) * members
+            for s in shapes.values())
+
+    def shapes(self):
+        '''
+        Shapes of the fields of one member, without the batch axis.
+        '''
+        n = 0 if self.batchSize is None else 1
+        return {
+            l: f.shapes() if isinstance(f, Fields) else f.shape[:f.ndim-n]
+            for l, f in self.items()
+        }
+
+    def __setitem__(self, key, value):
+        # Assignments copy into the existing views to keep them in data.
+        if key not in self:
+            raise KeyError("Fields can not be extended: " + str(key))
+        if isinstance(self[key], Fields):
+            for l in self[key]:
+                self[key][l] = value[l]
+        else:
+            self[key][...] = value
+
+    def update(self, other=(), **kwargs):
+        # Updates assign each field, as __setitem__, so views stay in data.
+        items = other.items() if hasattr(other, 'keys') else other
+        for key, value in items:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            raise KeyError("Fields can not be extended: " + str(key))
+        return self[key]
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def copy(self):
+        return Fields(self.shapes(), self.data.copy(), self.batchSize)
+
+    def __reduce__(self):
+        return (Fields, (self.shapes(), self.data, self.batchSize))
@@ -1,27 +1,31 @@
 import numpy as np
-from scipy.optimize import fsolve
 
 from ..spatialDiscretization import *
+from .linearSolvers import SparseLUSolver
 #Adams Moulton order 2 method
 
 class AM2:
-    def __init__(self, sp: SpatialDiscretization, fields):
+    ORDER = 1
+
+    def __init__(self, sp: SpatialDiscretization, fields, solver=None):
         self.sp = sp
         self.time = 0.0
 
-        self.A = sp.buildEvolutionOperator()          
-
-    def adams_moulton_2_residual(self, yp, f, dt, yo1, yo2):
-        return yp - yo1 - 1/12*dt*(5*np.matmul(f, yp)+8*np.matmul(f, yo1)-np.matmul(f, yo2))
-
+        if solver is None:
+            solver = SparseLUSolver(sp.buildSparseEvolutionOperator())
+        self.solver = solver
+        self.A = solver.A
 
     def step(self, fields, dt):
         yo1 = self.sp.convertToVector(fields)
         
         yo2 = self.sp.convertToVector(fields)
-        
-        yp = yo1 + dt/2 * (3*self.A.dot(yo1)-self.A.dot(yo2))
-        yp = fsolve(self.adams_moulton_2_residual, yp, args = (self.A, dt, yo1, yo2 )) 
+
+        # (I - 5/12*dt*A) yp = yo1 + 1/12*dt*(8*A*yo1 - A*yo2)
+        b = yo1 + 1/12*dt*(8*self.A.dot(yo1) - self.A.dot(yo2))
+        yp = self.solver.solve(5/12*dt, b)
+
+        self.time += dt
 
         self.sp.copyVectorToFields(yp, fields)
         
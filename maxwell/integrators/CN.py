@@ -1,26 +1,27 @@
 import numpy as np
-from scipy.optimize import fsolve
 
 from ..spatialDiscretization import *
+from .linearSolvers import SparseLUSolver
 #Crank Nicolson method
 
 class CN:
-    def __init__(self, sp: SpatialDiscretization, fields):
+    ORDER = 2
+
+    def __init__(self, sp: SpatialDiscretization, fields, solver=None):
         self.sp = sp
         self.time = 0.0
 
-        self.A = sp.buildEvolutionOperator()          
-
-    def crank_nicolson_residual(self, yp, f, dt, yo):
-        return yp - yo - 0.5*dt*(np.matmul(f, yp) + np.matmul(f, yo))
-
+        if solver is None:
+            solver = SparseLUSolver(sp.buildSparseEvolutionOperator())
+        self.solver = solver
+        self.A = solver.A
 
     def step(self, fields, dt):
         
         yo = self.sp.convertToVector(fields)
-        
-        yp = yo + dt * self.A.dot(yo)
-        yp = fsolve(self.crank_nicolson_residual, yp, args = (self.A, dt, yo )) 
+
+        # (I - dt/2*A) yp = (I + dt/2*A) yo
+        yp = self.solver.solve(0.5*dt, yo + 0.5*dt*self.A.dot(yo))
         
         self.time += dt
 
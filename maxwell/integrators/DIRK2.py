@@ -1,8 +1,8 @@
 import numpy as np
-from scipy.optimize import fsolve
 
 from ..spatialDiscretization import *
-#RK4
+from .linearSolvers import SparseLUSolver
+#DIRK2
 
 
 # A = np.array([1/4,              1/4-np.sqrt(3)/6,   1/4+np.sqrt(3)/6,   1/4])
@@ -10,26 +10,27 @@ from ..spatialDiscretization import *
 # c = np.array([1/2-np.sqrt(3)/6, 1/2+np.sqrt(3)/6])
 
 class DIRK2:
-    def __init__(self, sp: SpatialDiscretization, fields):
+    ORDER = 2
+
+    def __init__(self, sp: SpatialDiscretization, fields, solver=None):
         self.sp = sp
         self.time = 0.0
 
-        self.A = sp.buildEvolutionOperator()          
-
-    def k1_residual(self, k1, f, dt, yo):
-        return k1 - np.matmul(f, yo + dt/4 *k1)
-    
-    def k2_residual(self, k2, f, dt, y1):
-        return k2-np.matmul(f, y1 + dt/4*k2)
+        if solver is None:
+            solver = SparseLUSolver(sp.buildSparseEvolutionOperator())
+        self.solver = solver
+        self.A = solver.A
 
     def step(self, fields, dt):
         yo = self.sp.convertToVector(fields)
-        k1 = np.ones(yo.shape)
-        k2 = np.ones(yo.shape)
-        k1 = fsolve(self.k1_residual, k1, args = (self.A, dt, yo ))
+
+        # k = A (y + dt/4*k)  =>  (I - dt/4*A) k = A y
+        k1 = self.solver.solve(dt/4, self.A.dot(yo))
         y1 = yo + dt/2*k1
-        k2 = fsolve(self.k2_residual, k2, args = (self.A, dt, y1 ))
+        k2 = self.solver.solve(dt/4, self.A.dot(y1))
         yp = yo + dt/2 * (k1 + k2)
+
+        self.time += dt
         
         self.sp.copyVectorToFields(yp, fields)
         
@@ -0,0 +1,67 @@
+import numpy as np
+
+from ..spatialDiscretization import *
+
+
+class DOPRI54:
+    '''
+    Dormand-Prince explicit Runge-Kutta pair of orders 5(4). Steps advance
+    with the fifth order solution and leave in error the difference with
+    the embedded fourth order one, used by AdaptiveStepper. The last stage
+    is the right hand side of the new fields, which is reused as the first
+    stage of the next step when the fields have not changed in between.
+    '''
+    A = [
+        [],
+        [1/5],
+        [3/40, 9/40],
+        [44/45, -56/15, 32/9],
+        [19372/6561, -25360/2187, 64448/6561, -212/729],
+        [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+        [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84],
+    ]
+    E = [71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40]
+
+    N_STAGES = 7
+    ORDER = 5
+    EMBEDDED_ORDER = 4
+
+    def __init__(self, sp: SpatialDiscretization, fields):
+        self.sp = sp
+        self.time = 0.0
+
+        self.stages = [zerosLikeFields(fields) for _ in range(self.N_STAGES)]
+        self.start = zerosLikeFields(fields)
+        self.error = zerosLikeFields(fields)
+        self.scratch = zerosLikeFields(fields)
+        self.fsal = False
+
+    def step(self, fields, dt):
+        q = fields.data
+        k = [s.data for s in self.stages]
+        scratch = self.scratch.data
+
+        if not (self.fsal and np.array_equal(self.start.data, q)):
+            self.sp.computeRHS(fields, out=self.stages[0])
+        else:
+            k[0][:] = k[-1]
+        self.start.data[:] = q
+
+        for s in range(1, self.N_STAGES):
+            q[:] = self.start.data
+            for a, kj in zip(self.A[s], k):
+                if a != 0.0:
+                    np.multiply(kj, dt*a, out=scratch)
+                    q += scratch
+            self.sp.computeRHS(fields, out=self.stages[s])
+
+        self.error.data[:] = 0.0
+        for e, kj in zip(self.E, k):
+            if e != 0.0:
+                np.multiply(kj, dt*e, out=scratch)
+                self.error.data += scratch
+
+        # The last stage was evaluated at the new fields.
+        self.start.data[:] = q
+        self.fsal = True
+        self.time += dt
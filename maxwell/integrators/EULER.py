@@ -3,20 +3,19 @@ import numpy as np
 from ..spatialDiscretization import *
 
 class EULER:
+    N_STAGES = 1
+    ORDER = 1
 
     def __init__(self, sp: SpatialDiscretization, fields):
         self.sp = sp
         self.time = 0.0
 
+        self.fieldsRHS = zerosLikeFields(fields)
+
     def step(self, fields, dt):
-        Eold = fields['E'].copy()
-        Hold = fields['H'].copy()
-        
-        Eold += dt*self.sp.computeRHSE(fields)
-        Hold += dt*self.sp.computeRHSH(fields)
-        
-        fields['E'] = Eold.copy()
-        fields['H'] = Hold.copy()
+        rhs = self.sp.computeRHS(fields, out=self.fieldsRHS).data
+        rhs *= dt
+        fields.data += rhs
         
         self.time += dt
    
\ No newline at end of file
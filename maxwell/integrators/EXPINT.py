@@ -0,0 +1,157 @@
+import numpy as np
+from scipy.linalg import expm
+from scipy.sparse.linalg import expm_multiply, LinearOperator
+
+from ..spatialDiscretization import *
+#Exponential integrator, yp = exp(dt*A) yo
+
+
+class EXPINT:
+    '''
+    Exact propagator of the linear semi-discrete system. With method
+    'krylov' each step is split in substeps whose size is controlled by the
+    a posteriori error estimate of a Krylov (Arnoldi) approximation of
+    dimension krylovDim, as in Expokit's expv. With method 'expm_multiply'
+    the step is delegated to scipy, which chooses the number of Taylor
+    substeps from norm estimates of A.
+
+    stats accumulates steps, substeps, rejected substeps, operator
+    applications (matvecs) and the sum of the local error estimates. Only
+    the krylov method updates substeps, rejected and errorEstimate.
+    '''
+    SAFETY = 0.9
+    MAX_GROWTH = 10.0
+
+    def __init__(self, sp: SpatialDiscretization, fields,
+                 method='krylov', rtol=1e-8, krylovDim=30):
+        if method not in ('krylov', 'expm_multiply'):
+            raise ValueError("Invalid exponential method.")
+
+        self.sp = sp
+        self.time = 0.0
+
+        self.A = sp.buildSparseEvolutionOperator()
+        self.method = method
+        self.rtol = rtol
+        self.krylovDim = min(krylovDim, self.A.shape[0] - 1)
+        self.normA = np.abs(self.A).sum(axis=1).max()
+        self.substep = None
+
+        self.stats = {
+            'steps': 0,
+            'substeps': 0,
+            'rejected': 0,
+            'matvecs': 0,
+            'errorEstimate': 0.0,
+        }
+
+    def step(self, fields, dt):
+        yo = self.sp.convertToVector(fields)
+
+        if self.method == 'krylov':
+            yp = self.expv(dt, yo)
+        else:
+            yp = expm_multiply(self.countingOperator(dt), yo,
+                               traceA=dt*self.A.diagonal().sum())
+
+        self.stats['steps'] += 1
+        self.time += dt
+
+        self.sp.copyVectorToFields(yp, fields)
+
+    def countingOperator(self, dt):
+        def matvec(x):
+            self.stats['matvecs'] += 1
+            return dt*self.A.dot(x)
+
+        def matmat(X):
+            self.stats['matvecs'] += X.shape[1]
+            return dt*self.A.dot(X)
+
+        def rmatvec(x):
+            self.stats['matvecs'] += 1
+            return dt*self.A.T.dot(x)
+
+        def rmatmat(X):
+            self.stats['matvecs'] += X.shape[1]
+            return dt*self.A.T.dot(X)
+
+        return LinearOperator(self.A.shape, matvec=matvec, matmat=matmat,
+                              rmatvec=rmatvec, rmatmat=rmatmat, dtype=float)
+
+    def arnoldi(self, v, beta):
+        m = self.krylovDim
+        V = np.zeros((v.size, m+1))
+        H = np.zeros((m+2, m+2))
+        V[:, 0] = v / beta
+        for j in range(m):
+            w = self.A.dot(V[:, j])
+            for i in range(j+1):
+                H[i, j] = np.dot(V[:, i], w)
+                w -= H[i, j] * V[:, i]
+            H[j+1, j] = np.linalg.norm(w)
+            self.stats['matvecs'] += 1
+            if H[j+1, j] <= self.normA * np.finfo(float).eps * 10:
+                # Happy breakdown, the Krylov space is invariant.
+                return V[:, :j+1], H[:j+1, :j+1], None
+            V[:, j+1] = w / H[j+1, j]
+
+        H[m+1, m] = 1.0
+        vNorm = np.linalg.norm(self.A.dot(V[:, m]))
+        self.stats['matvecs'] += 1
+        return V, H, vNorm
+
+    def expv(self, t, v):
+        m = self.krylovDim
+        w = np.array(v, dtype=float)
+        tolRate = self.rtol / t
+        if self.substep is None:
+            fact = ((m+1)/np.e)**(m+1) * np.sqrt(2*np.pi*(m+1))
+            self.substep = (fact*self.rtol/(4*self.normA))**(1.0/m) / self.normA
+
+        tNow = 0.0
+        while tNow < t:
+            beta = np.linalg.norm(w)
+            if beta == 0.0:
+                break
+
+            V, H, vNorm = self.arnoldi(w, beta)
+            proposed = self.substep
+            tau = min(proposed, t - tNow)
+            while True:
+                if vNorm is None:
+                    tau = t - tNow
+                    F = expm(tau*H)
+                    error = 0.0
+                    break
+
+                F = expm(tau*H)
+                phi1 = beta * np.abs(F[m, 0])
+                phi2 = beta * np.abs(F[m+1, 0]) * vNorm
+                if phi1 > 10*phi2:
+                    error = phi2
+                elif phi1 > phi2:
+                    error = phi1*phi2 / (phi1 - phi2)
+                else:
+                    error = phi1
+
+                if error <= self.SAFETY * tau * tolRate * beta:
+                    break
+                self.stats['rejected'] += 1
+                tau *= self.SAFETY * (tau*tolRate*beta / error)**(1.0/m)
+
+            w = beta * V.dot(F[:V.shape[1], 0])
+            tNow = t if tau == t - tNow else tNow + tau
+            self.stats['substeps'] += 1
+            self.stats['errorEstimate'] += float(error)
+
+            if vNorm is None or error == 0.0:
+                estimate = self.MAX_GROWTH * tau
+            else:
+                estimate = min(
+                    self.MAX_GROWTH * tau,
+                    self.SAFETY * tau * (tau*tolRate*beta / error)**(1.0/m))
+            # Substeps shortened to end the window do not limit the next one.
+            self.substep = max(estimate, proposed) if tau < proposed else estimate
+
+        return w
@@ -1,24 +1,25 @@
 import numpy as np
-from scipy.optimize import fsolve
 
 from ..spatialDiscretization import *
+from .linearSolvers import SparseLUSolver
 #Backward Euler method
 class IBE:
-    def __init__(self, sp: SpatialDiscretization, fields):
+    ORDER = 1
+
+    def __init__(self, sp: SpatialDiscretization, fields, solver=None):
         self.sp = sp
         self.time = 0.0
 
-        self.A = sp.buildEvolutionOperator()          
-
-    def backward_euler(self, yp, f, dt, yo):
-        return yp - yo - dt * np.matmul(f, yp)
-
+        if solver is None:
+            solver = SparseLUSolver(sp.buildSparseEvolutionOperator())
+        self.solver = solver
+        self.A = solver.A
 
     def step(self, fields, dt):
         yo = self.sp.convertToVector(fields)
-        
-        yp = yo + dt/2 * self.A.dot(yo)
-        yp = fsolve(self.backward_euler, yp, args = (self.A, dt, yo )) 
+
+        # (I - dt*A) yp = yo
+        yp = self.solver.solve(dt, yo)
 
         self.time += dt
         
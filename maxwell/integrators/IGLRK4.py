@@ -1,8 +1,8 @@
 import numpy as np
-from scipy.optimize import fsolve
 
 from ..spatialDiscretization import *
-#RK4
+from .linearSolvers import SparseLUSolver
+#Implicit Gauss-Legendre RK4
 
 
 # A = np.array([1/4,              1/4-np.sqrt(3)/6,   1/4+np.sqrt(3)/6,   1/4])
@@ -10,24 +10,32 @@ from ..spatialDiscretization import *
 # c = np.array([1/2-np.sqrt(3)/6, 1/2+np.sqrt(3)/6])
 
 class IGLRK4:
-    def __init__(self, sp: SpatialDiscretization, fields):
+    ORDER = 4
+
+    BUTCHER_A = np.array([
+        [1/4,              1/4-np.sqrt(3)/6],
+        [1/4+np.sqrt(3)/6, 1/4             ]
+    ])
+
+    def __init__(self, sp: SpatialDiscretization, fields, solver=None):
         self.sp = sp
         self.time = 0.0
 
-        self.A = sp.buildEvolutionOperator()          
-
-    def k_residual(self, k, f, dt, yo):
-        #k = k.reshape(2, len(yo), order='F')
-        # k1 = k[:len(yo)]
-        # k2 = k[len(yo):]
-        # k = np.vstack((k1, k2))
-        k1, k2 = k
-        return np.array([k1 - np.matmul(f, yo + dt/4 *k1 + (1/4 - np.sqrt(3)/6)*dt*k2), k2 - np.matmul(f, yo + (1/4 + np.sqrt(3)/6)*dt*k1 + 1/4*dt*k2) ])
+        if solver is None:
+            solver = SparseLUSolver(sp.buildSparseEvolutionOperator())
+        self.solver = solver
+        self.A = solver.A
 
     def step(self, fields, dt):
         yo = self.sp.convertToVector(fields)
-        k1, k2 = fsolve(self.k_residual, (np.ones(yo), np.ones(yo)), args = (self.A, dt, yo ))
+
+        # k_i = A (yo + dt * sum_j a_ij k_j), both stages solved together.
+        Ayo = self.A.dot(yo)
+        k = self.solver.solve(dt*self.BUTCHER_A, np.concatenate((Ayo, Ayo)))
+        k1, k2 = k[:yo.size], k[yo.size:]
         yp = yo + dt/2 * (k1 + k2)
+
+        self.time += dt
         
         self.sp.copyVectorToFields(yp, fields)
         
@@ -3,28 +3,25 @@ import numpy as np
 from ..spatialDiscretization import *
 
 class LF2:
+    N_STAGES = 2
 
     def __init__(self, sp: SpatialDiscretization, fields):
         self.sp = sp
         self.time = 0.0
 
+        self.fieldsRHS = zerosLikeFields(fields)
+
     def step(self, fields, dt):
-        E = fields['E']
-        H = fields['H'] 
-        
-        if self.sp.dimension() == 1:
-            self.time += dt/2
-            E += dt * self.sp.computeRHSE(fields)
-            self.time += dt/2
-            H += dt * self.sp.computeRHSH(fields)
-        elif self.sp.dimension() == 2:
-            self.time += dt/2
-            rhsE = self.sp.computeRHSE(fields)
-            E['x'][:,:] += dt * rhsE['x'][:,:]
-            E['y'][:,:] += dt * rhsE['y'][:,:]
-            self.time += dt/2
-            H += dt * self.sp.computeRHSH(fields)
-        else:
-            raise ValueError("Invalid dimension")        
-        
-        
\ No newline at end of file
+        E = flatView(fields['E'])
+        H = flatView(fields['H'])
+        rhsE = flatView(self.fieldsRHS['E'])
+        rhsH = flatView(self.fieldsRHS['H'])
+
+        self.time += dt/2
+        self.sp.computeRHSE(fields, out=self.fieldsRHS['E'])
+        rhsE *= dt
+        E += rhsE
+        self.time += dt/2
+        self.sp.computeRHSH(fields, out=self.fieldsRHS['H'])
+        rhsH *= dt
+        H += rhsH
@@ -3,14 +3,25 @@ import numpy as np
 from ..spatialDiscretization import *
 
 class LF2V:
+    N_STAGES = 3
 
     def __init__(self, sp: SpatialDiscretization, fields):
         self.sp = sp
         self.time = 0.0
 
+        self.fieldsRHS = zerosLikeFields(fields)
+
+    def addRHSE(self, fields, dt):
+        rhsE = flatView(self.sp.computeRHSE(fields, out=self.fieldsRHS['E']))
+        rhsE *= dt
+        flatView(fields['E'])[:] += rhsE
+
+    def addRHSH(self, fields, dt):
+        rhsH = flatView(self.sp.computeRHSH(fields, out=self.fieldsRHS['H']))
+        rhsH *= dt
+        flatView(fields['H'])[:] += rhsH
+
     def step(self, fields, dt):
-        E = fields['E']
-        H = fields['H']
         
         # #Velocity Verlet
         # self.time += dt
@@ -23,11 +34,11 @@ class LF2V:
         
         #Position Verlet
         
-        E += 0.5*dt*self.sp.computeRHSE(fields)
+        self.addRHSE(fields, 0.5*dt)
         
         self.time += dt
-        H += 0.5*dt*self.sp.computeRHSH(fields)
-        E += 0.5*dt*self.sp.computeRHSE(fields)
+        self.addRHSH(fields, 0.5*dt)
+        self.addRHSE(fields, 0.5*dt)
         
         
         # #Verlet Algorithm
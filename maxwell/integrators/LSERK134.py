@@ -20,22 +20,26 @@ class LSERK134:
 
 
     N_STAGES = 13
+    ORDER = 4
 
     def __init__(self, sp: SpatialDiscretization, fields):
         self.sp = sp
         self.time = 0.0
 
-        self.fieldsRes = dict()
-        for l, f in fields.items():
-            self.fieldsRes[l] = np.zeros(f.shape)
+        self.fieldsRes = zerosLikeFields(fields)
+        self.fieldsRHS = zerosLikeFields(fields)
     
     def step(self, fields, dt):
+        q = fields.data
+        res = self.fieldsRes.data
+        rhs = self.fieldsRHS.data
         for s in range(0, self.N_STAGES):
-            fieldsRHS = self.sp.computeRHS(fields)
-            for l, f in fieldsRHS.items():
-                self.fieldsRes[l] = self.A[s]*self.fieldsRes[l] + dt*f
-            
-            for l, f in fields.items():
-                fields[l] += self.B[s] * self.fieldsRes[l]
+            self.sp.computeRHS(fields, out=self.fieldsRHS)
+            # res = A*res + dt*rhs and q += B*res, without temporaries.
+            res *= self.A[s]
+            rhs *= dt
+            res += rhs
+            np.multiply(res, self.B[s], out=rhs)
+            q += rhs
 
         self.time += dt
\ No newline at end of file
@@ -0,0 +1,164 @@
+import numpy as np
+
+from ..spatialDiscretization import *
+from .LSERK4 import LSERK4
+
+
+def adamsBashforthWeights(theta):
+    '''
+    Integrals from 0 to theta, in units of the step, of the Lagrange basis
+    of the third order Adams-Bashforth polynomial through the right hand
+    sides at 0, -1 and -2 steps. For theta = 1 these are 23/12, -16/12
+    and 5/12.
+    '''
+    return np.array([
+        theta**3/6 + 3*theta**2/4 + theta,
+        -theta**3/3 - theta**2,
+        theta**3/6 + theta**2/4,
+    ])
+
+
+class MRAB3:
+    '''
+    Multirate third order Adams-Bashforth local time stepping for Maxwell2D.
+    Elements are grouped in levels from get_dt_scale, level l being stable
+    with 2**l times the step dt of the smallest elements and neighbours
+    differing at most in one level. Each step advances 2**(levels-1)
+    substeps of dt, evaluating at each substep only the levels whose steps
+    start there, so the work is proportional to the number of steps of each
+    element. Faces between levels see the coarser neighbours within their
+    step through their Adams-Bashforth polynomial. The history needed by
+    the first step is obtained integrating backwards in time with LSERK4.
+    '''
+    FIXED_STEP = True
+
+    def __init__(self, sp, fields, dt, maxLevels=4):
+        self.sp = sp
+        self.time = 0.0
+
+        self.levels = self.buildLevels(maxLevels)
+        self.nLevels = self.levels.max() + 1
+        self.substep = dt
+        self.dt = dt * 2**(self.nLevels - 1)
+
+        Np = sp.number_of_nodes_per_element()
+        K = sp.mesh.number_of_elements()
+        self.labels = list(fields.keys())
+        self.elements = [np.where(self.levels == l)[0]
+                         for l in range(self.nLevels)]
+        local = np.zeros(K, dtype=int)
+        for e in self.elements:
+            local[e] = np.arange(len(e))
+
+        self.workspaces = []
+        self.haloSources = []
+        for e in self.elements:
+            w = sp.buildSubdomainWorkspace(e)
+            nodes = w['haloNodes']
+            sources = []
+            for m in np.unique(self.levels[nodes // Np]):
+                positions = np.where(self.levels[nodes // Np] == m)[0]
+                n = nodes[positions]
+                sources.append((m, positions, Np*local[n // Np] + n % Np))
+            self.workspaces.append(w)
+            self.haloSources.append(sources)
+
+        self.fields = []
+        self.history = []
+        self.halo = []
+        for e in self.elements:
+            shapes = {l: (Np, len(e)) for l in self.labels}
+            self.fields.append(Fields(shapes))
+            self.history.append([Fields(shapes) for _ in range(3)])
+            self.halo.append(
+                {l: np.zeros(len(self.workspaces[-1]['haloNodes']))
+                 for l in self.labels})
+        self.started = False
+
+    def buildLevels(self, maxLevels):
+        '''
+        Level of each element from the ratio of its dt scale to the
+        smallest one, lowered until neighbours differ at most in one level.
+        '''
+        dtscale = self.sp.get_dt_scale()
+        levels = np.floor(np.log2(dtscale / dtscale.min()) + 1e-12).astype(int)
+        levels = np.minimum(levels, maxLevels - 1)
+
+        EToE, _ = self.sp.mesh.connectivityMatrices()
+        while True:
+            smoothed = np.minimum(levels, levels[EToE].min(axis=1) + 1)
+            if np.array_equal(smoothed, levels):
+                return levels
+            levels = smoothed
+
+    def restart(self):
+        '''
+        Discards the history, to be used after fields are modified outside
+        the integrator.
+        '''
+        self.started = False
+
+    def startHistory(self, fields):
+        # Right hand sides at one and two steps of each level before now.
+        backward = fields.copy()
+        rk = LSERK4(self.sp, backward)
+        rhs = zerosLikeFields(fields)
+        for j in range(1, 2**self.nLevels + 1):
+            rk.step(backward, -self.substep)
+            levels = [l for l in range(self.nLevels)
+                      if j % 2**l == 0 and j // 2**l <= 2]
+            if levels:
+                self.sp.computeRHS(backward, out=rhs)
+            for l in levels:
+                for f in self.labels:
+                    self.history[l][j // 2**l - 1][f] = rhs[f][:, self.elements[l]]
+        self.started = True
+
+    def computeHalo(self, l, n):
+        '''
+        Neighbour face values of level l at substep n. Levels within a step
+        are taken back from the end of the step with their polynomial.
+        '''
+        for m, positions, nodes in self.haloSources[l]:
+            steps = 2**m
+            weights = None
+            if n % steps != 0:
+                theta = (n % steps) / steps
+                weights = self.substep * steps * (
+                    adamsBashforthWeights(1.0) - adamsBashforthWeights(theta))
+            for f in self.labels:
+                values = flatView(self.fields[m][f])[nodes]
+                if weights is not None:
+                    for c, h in zip(weights, self.history[m]):
+                        values -= c * flatView(h[f])[nodes]
+                self.halo[l][f][positions] = values
+
+    def step(self, fields, dt):
+        if not np.isclose(dt, self.dt):
+            raise ValueError("Multirate steps have a fixed size.")
+        if not self.started:
+            self.startHistory(fields)
+
+        for e, f in zip(self.elements, self.fields):
+            for l in self.labels:
+                f[l] = fields[l][:, e]
+
+        weights = adamsBashforthWeights(1.0)
+        for n in range(2**(self.nLevels - 1)):
+            active = [l for l in range(self.nLevels) if n % 2**l == 0]
+            for l in active:
+                self.computeHalo(l, n)
+            for l in active:
+                h = self.history[l]
+                h.insert(0, h.pop())
+                self.sp.computeRHSOnWorkspace(
+                    self.fields[l], h[0], self.workspaces[l], self.halo[l])
+            for l in active:
+                step = self.substep * 2**l
+                for c, h in zip(weights, self.history[l]):
+                    self.fields[l].data += (step * c) * h.data
+
+        for e, f in zip(self.elements, self.fields):
+            for l in self.labels:
+                fields[l][:, e] = f[l]
+        self.time += dt
@@ -0,0 +1,132 @@
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu, gmres, bicgstab, LinearOperator
+
+
+class SparseLUSolver:
+    '''
+    Solves the stage systems (I - kron(M, A)) x = b of implicit integrators,
+    where M holds dt times the implicit coefficients of the method. One
+    sparse LU factorization is kept for each of the last used M.
+    '''
+    MAX_FACTORIZATIONS = 4
+
+    def __init__(self, A):
+        self.A = sparse.csr_matrix(A)
+        self.factorizations = dict()
+
+    def factorize(self, M):
+        key = (M.shape, M.tobytes())
+        if key in self.factorizations:
+            return self.factorizations[key]
+
+        if len(self.factorizations) == self.MAX_FACTORIZATIONS:
+            del self.factorizations[next(iter(self.factorizations))]
+
+        N = M.shape[0] * self.A.shape[0]
+        S = sparse.identity(N, format='csc') - sparse.kron(M, self.A, format='csc')
+        self.factorizations[key] = splu(S)
+        return self.factorizations[key]
+
+    def solve(self, M, b):
+        M = np.atleast_2d(np.asarray(M, dtype=float))
+        return self.factorize(M).solve(b)
+
+
+class KrylovSolver:
+    '''
+    Matrix-free solver for the same stage systems as SparseLUSolver. The
+    evolution operator is applied through computeRHS inside GMRES or
+    BiCGStab, each solve is warm started from the previous solution with
+    the same M and, when the discretization has element blocks, it is
+    preconditioned with the element block-Jacobi of the stage matrix.
+    The number of iterations of every solve is stored in iterations.
+    '''
+    MAX_PRECONDITIONERS = 4
+
+    def __init__(self, sp, method='gmres', rtol=1e-8, atol=0.0,
+                 restart=None, maxiter=None, preconditioner='blockJacobi'):
+        if method not in ('gmres', 'bicgstab'):
+            raise ValueError("Invalid Krylov method.")
+        if preconditioner not in ('blockJacobi', None):
+            raise ValueError("Invalid preconditioner.")
+
+        self.A = sp.asLinearOperator()
+        self.method = method
+        self.rtol = rtol
+        self.atol = atol
+        self.restart = restart
+        self.maxiter = maxiter
+
+        self.blocks = None
+        if preconditioner == 'blockJacobi':
+            self.blocks = sp.elementBlocks()
+        if self.blocks is not None:
+            self.Akk = sp.buildElementBlockDiagonal()
+
+        self.preconditioners = dict()
+        self.previous = dict()
+        self.iterations = []
+
+    def stageOperator(self, M):
+        N = self.A.shape[0]
+        s = M.shape[0]
+
+        def matvec(x):
+            x = np.ravel(x)
+            Ax = np.concatenate([self.A.matvec(x[i*N:(i+1)*N]) for i in range(s)])
+            return x - M.dot(Ax.reshape(s, N)).ravel()
+
+        return LinearOperator((s*N, s*N), matvec=matvec, dtype=float)
+
+    def buildPreconditioner(self, M):
+        key = (M.shape, M.tobytes())
+        if key in self.preconditioners:
+            return self.preconditioners[key]
+
+        if len(self.preconditioners) == self.MAX_PRECONDITIONERS:
+            del self.preconditioners[next(iter(self.preconditioners))]
+
+        N = self.A.shape[0]
+        s = M.shape[0]
+        K, nb = self.blocks.shape
+
+        # Stage block of each element ordered by (stage, local unknown).
+        ids = (np.arange(s).reshape(1, s, 1)*N + self.blocks.reshape(K, 1, nb))
+        ids = ids.reshape(K, s*nb)
+        Bkk = np.eye(s*nb) - np.einsum('ij,kab->kiajb', M, self.Akk).reshape(K, s*nb, s*nb)
+        invBkk = np.linalg.inv(Bkk)
+
+        def matvec(x):
+            y = np.array(np.ravel(x), dtype=float)
+            y[ids] = np.einsum('kab,kb->ka', invBkk, y[ids])
+            return y
+
+        self.preconditioners[key] = LinearOperator((s*N, s*N), matvec=matvec, dtype=float)
+        return self.preconditioners[key]
+
+    def solve(self, M, b):
+        M = np.atleast_2d(np.asarray(M, dtype=float))
+        key = (M.shape, M.tobytes())
+
+        S = self.stageOperator(M)
+        P = self.buildPreconditioner(M) if self.blocks is not None else None
+        x0 = self.previous.get(key)
+
+        iterations = [0]
+        def count(_):
+            iterations[0] += 1
+
+        if self.method == 'gmres':
+            x, info = gmres(S, b, x0, rtol=self.rtol, atol=self.atol,
+                            restart=self.restart, maxiter=self.maxiter, M=P,
+                            callback=count, callback_type='pr_norm')
+        else:
+            x, info = bicgstab(S, b, x0, rtol=self.rtol, atol=self.atol,
+                               maxiter=self.maxiter, M=P, callback=count)
+        if info != 0:
+            raise RuntimeError("Krylov solver did not converge.")
+
+        self.previous[key] = x
+        self.iterations.append(iterations[0])
+        return x
@@ -0,0 +1,136 @@
+import numpy as np
+
+from ..spatialDiscretization import *
+
+
+class PIController:
+    '''
+    Proportional-integral step size controller. With k the order of the
+    local error estimate plus one, accepted steps propose
+    dt * safety * err**(-0.7/k) * errPrevious**(0.4/k), and rejected ones
+    dt * safety * err**(-1/k). Changes are limited to [minFactor, maxFactor]
+    and steps do not grow right after a rejection.
+    '''
+
+    def __init__(self, k, safety=0.9, minFactor=0.2, maxFactor=5.0):
+        self.alpha = 0.7 / k
+        self.beta = 0.4 / k
+        self.k = k
+        self.safety = safety
+        self.minFactor = minFactor
+        self.maxFactor = maxFactor
+        self.errPrevious = 1.0
+        self.rejected = False
+
+    def accept(self, dt, err):
+        err = max(err, 1e-10)
+        factor = self.safety * err**(-self.alpha) * self.errPrevious**self.beta
+        factor = min(self.maxFactor, max(self.minFactor, factor))
+        if self.rejected:
+            factor = min(factor, 1.0)
+        self.errPrevious = err
+        self.rejected = False
+        return dt * factor
+
+    def reject(self, dt, err):
+        self.rejected = True
+        return dt * max(self.minFactor, self.safety * err**(-1.0/self.k))
+
+
+class AdaptiveStepper:
+    '''
+    Advances fields with the steps of timeIntegrator controlled so that
+    the root mean square of the local error estimate, weighted with
+    atol + rtol*max(|y|, |y_new|), is at most one. Integrators with an
+    embedded pair, as DOPRI54, leave the estimate in their error fields.
+    Other one-step integrators, of order ORDER, are estimated by step
+    doubling: two steps of dt/2, which are kept, against one of dt, their
+    difference divided by 2**ORDER - 1. Steps of implicit integrators are
+    rounded down to the initial dt times a power of two, so that their
+    factorizations are reused.
+
+    stats holds the accepted and rejected steps and the smallest and
+    largest accepted step sizes.
+    '''
+
+    def __init__(self, timeIntegrator, fields, dt, rtol=1e-6, atol=1e-8):
+        if not hasattr(timeIntegrator, 'ORDER'):
+            raise ValueError("Adaptive steps need one-step integrators of known order.")
+
+        self.timeIntegrator = timeIntegrator
+        self.embedded = hasattr(timeIntegrator, 'EMBEDDED_ORDER')
+        if self.embedded:
+            self.controller = PIController(timeIntegrator.EMBEDDED_ORDER + 1)
+        else:
+            self.controller = PIController(timeIntegrator.ORDER + 1)
+        self.quantized = hasattr(timeIntegrator, 'solver')
+        self.rtol = rtol
+        self.atol = atol
+        self.dt0 = dt
+        self.dt = dt
+
+        self.start = zerosLikeFields(fields)
+        self.doubled = zerosLikeFields(fields)
+
+        self.stats = {
+            'accepted': 0,
+            'rejected': 0,
+            'dtMin': np.inf,
+            'dtMax': 0.0,
+        }
+
+    def quantize(self, dt):
+        if not self.quantized:
+            return dt
+        return self.dt0 * 2.0**np.floor(np.log2(dt / self.dt0))
+
+    def errorNorm(self, error, fields):
+        scale = np.maximum(np.abs(self.start.data), np.abs(fields.data))
+        scale *= self.rtol
+        scale += self.atol
+        return np.sqrt(np.mean((error / scale)**2))
+
+    def attempt(self, fields, dt):
+        ti = self.timeIntegrator
+        if self.embedded:
+            ti.step(fields, dt)
+            return self.errorNorm(ti.error.data, fields)
+
+        self.doubled.data[:] = self.start.data
+        ti.step(self.doubled, dt)
+        ti.step(fields, dt/2)
+        ti.step(fields, dt/2)
+        error = self.doubled.data
+        error -= fields.data
+        error /= 2**ti.ORDER - 1
+        return self.errorNorm(error, fields)
+
+    def step(self, fields, dtMax=np.inf):
+        '''
+        Takes one accepted step, not longer than dtMax, and returns its size.
+        '''
+        time = self.timeIntegrator.time
+        self.start.data[:] = fields.data
+        while True:
+            dt = min(self.dt, dtMax)
+            err = self.attempt(fields, dt)
+            if err <= 1.0:
+                break
+            self.stats['rejected'] += 1
+            fields.data[:] = self.start.data
+            self.timeIntegrator.time = time
+            self.dt = self.quantize(self.controller.reject(dt, err))
+            if self.dt < 1e-10 * self.dt0:
+                raise RuntimeError("Adaptive step size underflow.")
+
+        self.timeIntegrator.time = time + dt
+        self.stats['accepted'] += 1
+        self.stats['dtMin'] = min(self.stats['dtMin'], dt)
+        self.stats['dtMax'] = max(self.stats['dtMax'], dt)
+
+        # Steps shortened to end at dtMax do not limit the next one.
+        proposed = self.controller.accept(dt, err)
+        if dt < self.dt:
+            proposed = max(proposed, self.dt)
+        self.dt = self.quantize(proposed)
+        return dt
@@ -0,0 +1,74 @@
+import numpy as np
+
+from .spatialDiscretization import *
+
+
+class DFTMonitor:
+    '''
+    Running discrete Fourier transform of the fields of sp at frequencies,
+    accumulated, one frequency at a time in a scratch buffer, at each call
+    of update as the phasors
+        sum_n f(t_n) exp(-2j*pi*frequency*t_n) (t_n - t_{n-1}),
+    so that memory does not grow with the number of steps. With points the
+    fields are transformed at those points, through the interpolation of
+    Probes, and otherwise over the whole state vector.
+
+    monitor[label] returns the phasors of the field label, with the
+    frequencies as first axis followed by the points or the field shape.
+    '''
+
+    def __init__(self, sp: SpatialDiscretization, frequencies, points=None,
+                 batchSize=None, time=0.0):
+        self.sp = sp
+        self.frequencies = np.atleast_1d(np.asarray(frequencies, dtype=float))
+        self.omega = 2.0 * np.pi * self.frequencies
+        self.time = time
+
+        fields = sp.buildFields()
+        self.labels = list(fieldLabels(fields))
+        if points is None:
+            self.matrix = None
+            self.shapes = [f.shape for f in fieldArrays(fields)]
+        else:
+            _, self.matrix = sp.buildInterpolationMatrix(points)
+            nPoints = self.matrix.shape[0] // len(self.labels)
+            self.shapes = [(nPoints,)] * len(self.labels)
+
+        batch = () if batchSize is None else (batchSize,)
+        size = sum(int(np.prod(s)) for s in self.shapes)
+        self.phasors = np.zeros(
+            (len(self.frequencies), size) + batch, dtype=complex)
+        self.scratch = np.zeros((size,) + batch, dtype=complex)
+
+    def update(self, fields, time):
+        '''
+        Adds the fields at time, weighted with the time since the previous
+        update.
+        '''
+        values = self.sp.convertToVector(fields)
+        if self.matrix is not None:
+            values = self.matrix @ values
+        weights = np.exp(-1j * self.omega * time) * (time - self.time)
+        for phasor, w in zip(self.phasors, weights):
+            # Real products, as mixed real and complex ones are buffered.
+            np.multiply(values, w.real, out=self.scratch.real)
+            np.multiply(values, w.imag, out=self.scratch.imag)
+            phasor += self.scratch
+        self.time = time
+
+    def attach(self, driver):
+        '''
+        Updates the monitor at every step of the runs of driver.
+        '''
+        self.time = driver.timeIntegrator.time
+        return driver.addCallback(
+            lambda d: self.update(d.fields, d.timeIntegrator.time),
+            everySteps=1)
+
+    def __getitem__(self, label):
+        i = self.labels.index(label)
+        ini = sum(int(np.prod(s)) for s in self.shapes[:i])
+        shape = self.shapes[i]
+        phasors = self.phasors[:, ini:ini + int(np.prod(shape))]
+        return phasors.reshape(
+            phasors.shape[:1] + shape + phasors.shape[2:], order='F')
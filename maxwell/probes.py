@@ -0,0 +1,77 @@
+import numpy as np
+from scipy import sparse
+
+from .spatialDiscretization import *
+
+
+class Probes:
+    '''
+    Values of the fields of sp at points, recorded at each call of sample in
+    a ring buffer keeping the last capacity samples. The elements or cells
+    containing the points and their interpolation rows are found once, so
+    that sampling all fields at all points is a single sparse product with
+    the buffer of the fields, written into the ring buffer. With a
+    batchSize, samples have a trailing batch axis.
+
+    probes[label] returns the times and the values of the field label at
+    the points for the samples kept, in the order they were taken.
+    '''
+
+    def __init__(self, sp: SpatialDiscretization, points, capacity=1024,
+                 batchSize=None):
+        self.sp = sp
+        self.labels, self.matrix = sp.buildInterpolationMatrix(points)
+        self.nPoints = self.matrix.shape[0] // len(self.labels)
+        self.capacity = capacity
+
+        # Batched samples are stored by member, each with its rows
+        # gathered from the segments of the member in the buffer.
+        members = 1 if batchSize is None else batchSize
+        self.gather = self.batchedMatrix(members)
+        self.times = np.zeros(capacity)
+        self.values = np.zeros((capacity, members, self.matrix.shape[0]))
+        self.batched = batchSize is not None
+        self.count = 0
+
+    def batchedMatrix(self, members):
+        sizes = [f.size for f in fieldArrays(self.sp.buildFields())]
+        offsets = np.cumsum([0] + sizes[:-1])
+        blocks = []
+        for b in range(members):
+            columns = np.concatenate([
+                o*members + b*n + np.arange(n) for o, n in zip(offsets, sizes)])
+            M = self.matrix.tocoo()
+            blocks.append(sparse.csr_matrix(
+                (M.data, (M.row, columns[M.col])),
+                shape=(M.shape[0], members*sum(sizes))))
+        return sparse.vstack(blocks, format='csr')
+
+    def sample(self, fields, time):
+        i = self.count % self.capacity
+        self.values[i].reshape(-1)[:] = self.gather @ flatView(fields)
+        self.times[i] = time
+        self.count += 1
+
+    def attach(self, driver, everySteps=1):
+        '''
+        Samples the fields of driver every everySteps steps of its runs.
+        '''
+        return driver.addCallback(
+            lambda d: self.sample(d.fields, d.timeIntegrator.time),
+            everySteps=everySteps)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def order(self):
+        # Positions of the samples kept, from the oldest.
+        return (np.arange(len(self)) + self.count - len(self)) % self.capacity
+
+    def __getitem__(self, label):
+        i = self.labels.index(label)
+        order = self.order()
+        rows = slice(i*self.nPoints, (i+1)*self.nPoints)
+        values = self.values[order][:, :, rows].transpose(0, 2, 1)
+        if not self.batched:
+            values = values[:, :, 0]
+        return self.times[order], values
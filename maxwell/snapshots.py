@@ -0,0 +1,202 @@
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+from .spatialDiscretization import *
+
+
+def chunkFile(path, c, compressed):
+    return os.path.join(
+        path, 'chunk%06d' % c + ('.npz' if compressed else '.npy'))
+
+
+class SnapshotWriter:
+    '''
+    Appends snapshots of the fields to the directory path as chunks of
+    chunkSize snapshots, each chunk an array with a row per snapshot saved
+    by a background thread, compressed in a '.npz' file or in a '.npy' file
+    that can be memory mapped. Only the labels selected, and within each
+    field only the entries indexed by region, are stored.
+
+    Snapshots are copied into one of maxChunks preallocated chunks. The
+    solver only waits for the disk when all of them are queued for writing.
+    close() writes the last chunk, the times and the layout in
+    'snapshots.json', and stops the thread.
+    '''
+
+    def __init__(self, path, fields, labels=None, region=None,
+                 chunkSize=64, maxChunks=4, compressed=True):
+        self.path = path
+        self.labels = list(fieldLabels(fields)) if labels is None else labels
+        self.region = Ellipsis if region is None else region
+        self.chunkSize = chunkSize
+        self.compressed = compressed
+
+        values = [self.select(fields, l) for l in self.labels]
+        self.shapes = [v.shape for v in values]
+        self.size = sum(v.size for v in values)
+
+        os.makedirs(path, exist_ok=True)
+        self.free = queue.Queue()
+        for _ in range(maxChunks):
+            self.free.put(np.zeros((chunkSize, self.size)))
+        self.pending = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self.writeChunks, daemon=True)
+        self.thread.start()
+
+        self.times = []
+        self.chunks = 0
+        self.buffer = None
+        self.row = 0
+
+    def select(self, fields, label):
+        f = fields
+        for key in (label if isinstance(label, tuple) else (label,)):
+            f = f[key]
+        return f[self.region]
+
+    def writeChunks(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            c, buffer, rows = item
+            try:
+                if self.error is None:
+                    self.save(c, buffer[:rows])
+            except Exception as e:
+                self.error = e
+            self.free.put(buffer)
+
+    def save(self, c, data):
+        fileName = chunkFile(self.path, c, self.compressed)
+        tmpFile = fileName + '.tmp'
+        with open(tmpFile, 'wb') as f:
+            if self.compressed:
+                np.savez_compressed(f, data=data)
+            else:
+                np.save(f, data)
+        os.replace(tmpFile, fileName)
+
+    def checkError(self):
+        if self.error is not None:
+            raise self.error
+
+    def append(self, fields, time):
+        self.checkError()
+        if self.buffer is None:
+            self.buffer = self.free.get()
+            self.row = 0
+        ini = 0
+        for l, shape in zip(self.labels, self.shapes):
+            n = int(np.prod(shape))
+            self.buffer[self.row, ini:ini+n] = \
+                self.select(fields, l).ravel(order='F')
+            ini += n
+        self.times.append(time)
+        self.row += 1
+        if self.row == self.chunkSize:
+            self.flush()
+
+    def flush(self):
+        if self.buffer is not None:
+            self.pending.put((self.chunks, self.buffer, self.row))
+            self.chunks += 1
+            self.buffer = None
+
+    def attach(self, driver, everySteps=1):
+        '''
+        Appends the fields of driver every everySteps steps of its runs.
+        '''
+        return driver.addCallback(
+            lambda d: self.append(d.fields, d.timeIntegrator.time),
+            everySteps=everySteps)
+
+    def close(self):
+        if self.thread is None:
+            return
+        self.flush()
+        self.pending.put(None)
+        self.thread.join()
+        self.thread = None
+        self.checkError()
+
+        np.save(os.path.join(self.path, 'times.npy'), np.array(self.times))
+        layout = {
+            'labels': [list(l) if isinstance(l, tuple) else l
+                       for l in self.labels],
+            'shapes': [list(s) for s in self.shapes],
+            'chunkSize': self.chunkSize,
+            'chunks': self.chunks,
+            'compressed': self.compressed,
+        }
+        with open(os.path.join(self.path, 'snapshots.json'), 'w') as f:
+            json.dump(layout, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SnapshotReader:
+    '''
+    Snapshots written by SnapshotWriter in the directory path. Chunks are
+    loaded when first needed, memory mapped if they were not compressed.
+    reader[i] returns the fields of snapshot i as a dictionary of the
+    labels stored and reader.series(label) the snapshots of a field, with
+    the snapshots as first axis.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'snapshots.json')) as f:
+            layout = json.load(f)
+        self.labels = [tuple(l) if isinstance(l, list) else l
+                       for l in layout['labels']]
+        self.shapes = [tuple(s) for s in layout['shapes']]
+        self.chunkSize = layout['chunkSize']
+        self.chunks = layout['chunks']
+        self.compressed = layout['compressed']
+        self.times = np.load(os.path.join(path, 'times.npy'))
+
+        self.offsets = np.cumsum(
+            [0] + [int(np.prod(s)) for s in self.shapes])
+        self.loaded = dict()
+
+    def __len__(self):
+        return len(self.times)
+
+    def chunk(self, c):
+        '''
+        Array of chunk c with a row per snapshot.
+        '''
+        if c not in self.loaded:
+            fileName = chunkFile(self.path, c, self.compressed)
+            if self.compressed:
+                with np.load(fileName) as data:
+                    self.loaded[c] = data['data']
+            else:
+                self.loaded[c] = np.load(fileName, mmap_mode='r')
+        return self.loaded[c]
+
+    def field(self, rows, label):
+        i = self.labels.index(label)
+        values = rows[..., self.offsets[i]:self.offsets[i+1]]
+        return values.reshape(
+            values.shape[:-1] + self.shapes[i], order='F')
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        row = self.chunk(i // self.chunkSize)[i % self.chunkSize]
+        return {l: self.field(row, l) for l in self.labels}
+
+    def series(self, label):
+        rows = np.concatenate([self.chunk(c) for c in range(self.chunks)])
+        return self.field(rows, label)
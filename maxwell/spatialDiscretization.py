@@ -1,38 +1,545 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+
 import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import LinearOperator
+
+from .fields import *
+
+
+def fieldArrays(fields):
+    '''
+    Yields the arrays stored in a, possibly nested, fields dictionary.
+    '''
+    for f in fields.values():
+        if isinstance(f, dict):
+            yield from fieldArrays(f)
+        else:
+            yield f
+
+
+def fieldLabels(fields, prefix=()):
+    '''
+    Yields the labels of the arrays of fields in the order of fieldArrays,
+    as tuples of keys for nested dictionaries.
+    '''
+    for l, f in fields.items():
+        if isinstance(f, dict):
+            yield from fieldLabels(f, prefix + (l,))
+        else:
+            yield prefix + (l,) if prefix else l
+
+
+def zerosLikeFields(fields):
+    '''
+    Fields dictionary with the same structure, shapes and memory layout as
+    fields, filled with zeros.
+    '''
+    if isinstance(fields, Fields):
+        return Fields(fields.shapes(), batchSize=fields.batchSize)
+    return {
+        l: zerosLikeFields(f) if isinstance(f, dict) else np.zeros_like(f)
+        for l, f in fields.items()
+    }
+
+
+def segmentMax(values, indptr):
+    '''
+    Maximum of values over each segment indptr[i]:indptr[i+1], zero for
+    empty segments.
+    '''
+    out = np.zeros(len(indptr) - 1, dtype=values.dtype)
+    nonempty = indptr[:-1] < indptr[1:]
+    if values.size > 0:
+        out[nonempty] = np.maximum.reduceat(values, indptr[:-1][nonempty])
+    return out
+
+
+def segmentEntries(indptr, segments):
+    '''
+    Positions of the entries of segments, in the arrays indexed by indptr,
+    and the index in segments that each one belongs to.
+    '''
+    starts = indptr[segments]
+    counts = indptr[segments + 1] - starts
+    owners = np.repeat(np.arange(len(segments)), counts)
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return np.arange(counts.sum()) + offsets, owners
+
+
+def colorColumns(pattern):
+    '''
+    Coloring of the columns of a sparsity pattern such that no two columns
+    with the same color have a nonzero in the same row. Columns are colored
+    in rounds: the uncolored columns with the largest random priority among
+    those sharing rows with them take the smallest color not used by their
+    colored neighbours. Rounds are vectorized over the pattern, which is
+    never squared, and restricted to the uncolored columns.
+    '''
+    rows = sparse.csr_matrix(pattern, dtype=bool)
+    rows.sum_duplicates()
+    N = rows.shape[1]
+    if N == 0:
+        return np.zeros(0, dtype=int)
+    if np.diff(rows.indptr).max() == N:
+        # A full row forces a color per column.
+        return np.arange(N)
+    cols = rows.tocsc()
+
+    # Columns without nonzeros take color 0.
+    colors = np.where(np.diff(cols.indptr) > 0, -1, 0)
+    priority = (np.random.default_rng(0).permutation(N) + 1).astype(np.int32)
+    active = None
+    while True:
+        uncolored = np.flatnonzero(colors < 0)
+        if uncolored.size == 0:
+            return colors
+        if active is None or 2*uncolored.size < active.size:
+            # Rows of the uncolored columns, rebuilt as they halve.
+            active = uncolored
+            S = rows[:, active]
+            S = S[np.diff(S.indptr) > 0]
+            St = S.tocsc()
+        p = np.where(colors[active] < 0, priority[active], 0)
+        rowMax = segmentMax(p[S.indices], S.indptr)
+        colMax = segmentMax(rowMax[St.indices], St.indptr)
+        chosen = active[(p > 0) & (colMax == p)]
+
+        entries, owners = segmentEntries(cols.indptr, chosen)
+        entries, neighbours = segmentEntries(
+            rows.indptr, cols.indices[entries])
+        used = colors[rows.indices[entries]]
+        colored = used >= 0
+        taken = np.zeros((len(chosen), used.max() + 2), dtype=bool)
+        taken[owners[neighbours[colored]], used[colored]] = True
+        colors[chosen] = np.argmin(taken, axis=1)
+
+
+def probeSparseOperator(apply, pattern, colors=None, batchSize=None):
+    '''
+    Recovers the sparse matrix of the linear map apply, whose nonzeros are
+    contained in pattern, with one evaluation per column color. With a
+    batchSize, apply maps matrices of batchSize columns and each evaluation
+    probes batchSize colors.
+    '''
+    P = sparse.coo_matrix(pattern)
+    if colors is None:
+        colors = colorColumns(P)
+    n_colors = colors.max() + 1 if colors.size > 0 else 0
+
+    Y = np.zeros((P.shape[0], n_colors))
+    if batchSize is None:
+        for c in range(n_colors):
+            Y[:, c] = apply((colors == c).astype(float))
+    else:
+        for c in range(0, n_colors, batchSize):
+            seeds = colors[:, None] == np.arange(c, c + batchSize)
+            Y[:, c:c+batchSize] = apply(seeds.astype(float))[:, :n_colors-c]
+
+    A = sparse.csr_matrix(
+        (Y[P.row, colors[P.col]], (P.row, P.col)), shape=P.shape)
+    A.eliminate_zeros()
+    return A
+
+
+def workspaceCoefficient(c, batch=()):
+    '''
+    Copy of the coefficient array c in 'F' order with trailing unit axes,
+    so that it broadcasts along batch axes of shape batch.
+    '''
+    return np.asfortranarray(c).reshape(c.shape + (1,)*len(batch), order='F')
+
+
+def gridStencilPattern(ids, radius, periodic=False):
+    '''
+    Sparsity pattern coupling all unknowns placed in the grid ids that are
+    at a Chebyshev distance of at most radius. Empty positions in ids are
+    marked with -1.
+    '''
+    N = ids.max() + 1
+    rows = []
+    cols = []
+    for shift in np.ndindex(*((2*radius+1,)*ids.ndim)):
+        shift = np.array(shift) - radius
+        if periodic:
+            shifted = np.roll(ids, tuple(shift), axis=tuple(range(ids.ndim)))
+        else:
+            padded = np.pad(ids, radius, constant_values=-1)
+            window = tuple(
+                slice(radius - s, radius - s + n) for s, n in zip(shift, ids.shape))
+            shifted = padded[window]
+        valid = (ids >= 0) & (shifted >= 0)
+        rows.append(ids[valid])
+        cols.append(shifted[valid])
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    return sparse.csr_matrix(
+        (np.ones(rows.size), (rows, cols)), shape=(N, N), dtype=bool)
+
+
+def gridInterpolationMatrix(grids, coordinates):
+    '''
+    Sparse matrix of the multilinear interpolation, at points with
+    coordinates[d] along axis d, of a field on the tensor grid of the
+    sorted grids, stored in 'F' order. Points beyond a grid take the value
+    of its closest end.
+    '''
+    n = len(coordinates[0])
+    shape = [len(g) for g in grids]
+    indices = []
+    weights = []
+    for g, c in zip(grids, coordinates):
+        i = np.clip(np.searchsorted(g, c, side='right') - 1, 0, len(g) - 2)
+        indices.append(i)
+        weights.append(np.clip((c - g[i]) / (g[i+1] - g[i]), 0.0, 1.0))
+
+    rows = []
+    cols = []
+    vals = []
+    for corner in product((0, 1), repeat=len(grids)):
+        col = np.zeros(n, dtype=int)
+        val = np.ones(n)
+        stride = 1
+        for i, w, c, size in zip(indices, weights, corner, shape):
+            col += (i + c) * stride
+            val *= w if c else 1.0 - w
+            stride *= size
+        rows.append(np.arange(n))
+        cols.append(col)
+        vals.append(val)
+
+    A = sparse.csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n, int(np.prod(shape))))
+    A.eliminate_zeros()
+    return A
+
 
 class SpatialDiscretization():
+    # Cache budget of the element chunks evaluated by each thread.
+    CHUNK_BYTES = 2**18
+
+    threadPool = None
+    chunkElements = None
+    chunkWorkspaces = None
+
     def __init__(self, mesh):
         self.mesh = mesh
 
         return
-    
+
     def get_mesh(self):
         return self.mesh
-    
+
     def isStaggered(self):
         return False
-    
+
     def dimension(self):
         return 1
 
+    def isTimeInvariant(self):
+        '''
+        True when computeRHS is the same linear map at every call, so that
+        a step of a fixed size can be precompiled into a matrix.
+        '''
+        return True
+
     def fieldsAsStateVector(self, fields):
-        q = np.array([])
-        for f in fields.values():
-            q = np.append(q, f.reshape(f.size,1, order='F')) 
-        return q
-    
+        return np.concatenate(
+            [f.ravel(order='F') for f in fieldArrays(fields)])
+
     def buildStateVector(self):
-        fields = self.buildFields()
-        q0 = np.array([])
-        for f in fields.values():
-            q0 = np.append(q0, f)
-        return q0
-        
+        return np.zeros(sum(f.size for f in fieldArrays(self.buildFields())))
+
     def buildImpulseStateVector(self, i):
         q = self.buildStateVector()
         q[i] = 1.0
         return q
-    
+
     def number_of_unknowns(self):
         return len(self.buildStateVector())
 
+    def setThreads(self, workers, chunkElements=None):
+        '''
+        Evaluates computeRHS in chunks of chunkElements element columns
+        shared by a pool of workers threads. Without chunkElements, chunks
+        are sized to fit in CHUNK_BYTES. Chunks do not depend on the number
+        of workers and each one is computed with the same operations, so
+        results are deterministic. None evaluates serially. Only
+        discretizations with element chunks, and fields without batch axes,
+        use the pool.
+        '''
+        if self.threadPool is not None:
+            self.threadPool.shutdown()
+        self.threadPool = None
+        if workers is not None:
+            self.threadPool = ThreadPoolExecutor(workers)
+        self.chunkElements = chunkElements
+        self.chunkWorkspaces = None
+
+    def elementChunks(self, bytesPerElement):
+        K = self.mesh.number_of_elements()
+        size = self.chunkElements
+        if size is None:
+            size = self.CHUNK_BYTES // int(bytesPerElement)
+        # Single columns would turn the matrix products into GEMV calls.
+        size = max(2, size)
+        starts = list(range(0, K, size))
+        if len(starts) > 1 and K - starts[-1] == 1:
+            starts.pop()
+        return [slice(a, b) for a, b in zip(starts, starts[1:] + [K])]
+
+    def evaluateChunks(self, evaluate):
+        '''
+        Calls evaluate with each chunk workspace in the thread pool.
+        '''
+        for _ in self.threadPool.map(evaluate, self.chunkWorkspaces):
+            pass
+
+    def computeRHSOnChunks(self, fields, out):
+        '''
+        Evaluates computeRHSOnWorkspace into the arrays of out, skipping
+        those that are None, building the workspace for the batch axes of
+        fields. With a thread pool, fields without batch axes are evaluated
+        by element chunks, each one with its own workspace.
+        '''
+        batch = next(fieldArrays(fields)).shape[2:]
+        if self.rhsWorkspace is None or self.rhsWorkspace['batch'] != batch:
+            self.buildRHSWorkspace(batch)
+        if self.threadPool is None or batch != ():
+            self.computeRHSOnWorkspace(fields, out, self.rhsWorkspace)
+            return
+
+        if self.chunkWorkspaces is None:
+            W = self.rhsWorkspace
+            K = self.mesh.number_of_elements()
+            bytesPerElement = sum(
+                a.nbytes for a in W.values()
+                if isinstance(a, np.ndarray) and a.ndim == 2) / K
+            self.chunkWorkspaces = [
+                self.buildChunkWorkspace(c)
+                for c in self.elementChunks(bytesPerElement)]
+
+        def chunk(rhs, columns):
+            return None if rhs is None else rhs[:, columns]
+        self.evaluateChunks(lambda w: self.computeRHSOnWorkspace(
+            fields, {l: chunk(a, w['columns']) for l, a in out.items()}, w))
+
+    def buildChunkWorkspace(self, columns):
+        '''
+        Workspace of computeRHSOnWorkspace for the element columns of the
+        slice columns, gathering face values from the complete fields.
+        '''
+        K = self.mesh.number_of_elements()
+        w = {'batch': (), 'columns': columns}
+        for l, a in self.rhsWorkspace.items():
+            if l in self.rhsWorkspace['maps']:
+                w[l] = a.reshape(-1, K, order='F')[:, columns].ravel(order='F')
+            elif isinstance(a, np.ndarray) and a.ndim == 2:
+                w[l] = np.asfortranarray(a[:, columns])
+        return w
+
+    def buildRHSWorkspace(self, batch=()):
+        '''
+        Precomputes the maps, coefficients and buffers of the workspace of
+        computeRHSOnWorkspace, given by rhsWorkspaceArrays, all in 'F'
+        order, so that evaluations do not allocate memory. For fields with
+        trailing batch axes of shape batch the maps gather every member and
+        the coefficients broadcast along the batch axes.
+        '''
+        Np = self.number_of_nodes_per_element()
+        K = self.mesh.number_of_elements()
+        members = Np*K*np.arange(int(np.prod(batch)))
+        maps, coefficients, buffers = self.rhsWorkspaceArrays()
+
+        self.chunkWorkspaces = None
+        self.rhsWorkspace = {
+            'batch': batch, 'columns': slice(None), 'maps': tuple(maps)}
+        for l, vmap in maps.items():
+            self.rhsWorkspace[l] = \
+                (vmap.reshape(-1, 1) + members).ravel(order='F')
+        for l, c in coefficients.items():
+            self.rhsWorkspace[l] = workspaceCoefficient(c, batch)
+        for l, shape in buffers.items():
+            self.rhsWorkspace[l] = np.zeros(shape + batch, order='F')
+
+    def buildBatchedFields(self, batchSize):
+        '''
+        Fields of an ensemble of batchSize members sharing this
+        discretization, with a trailing batch axis in every field.
+        '''
+        return Fields(self.buildFields().shapes(), batchSize=batchSize)
+
+    def convertToVector(self, fields):
+        '''
+        State vector of fields. For Fields built by buildFields this is the
+        buffer itself, without copies, so it changes with the fields. For
+        batched Fields it is a matrix with the state of each member as a
+        column.
+        '''
+        if isinstance(fields, Fields) and fields.batchSize is not None:
+            return np.concatenate([
+                f.reshape(-1, fields.batchSize, order='F')
+                for f in fieldArrays(fields)])
+        if isinstance(fields, Fields):
+            return fields.data
+        return np.concatenate(
+            [f.ravel(order='F') for f in fieldArrays(fields)])
+
+    def copyVectorToFields(self, vec, fields):
+        if isinstance(fields, Fields) and fields.batchSize is not None:
+            ini = 0
+            for f in fieldArrays(fields):
+                n = f.size // fields.batchSize
+                f.reshape(-1, fields.batchSize, order='F')[...] = vec[ini:ini+n]
+                ini += n
+            return
+        if isinstance(fields, Fields):
+            fields.data[:] = vec
+            return
+        ini = 0
+        for f in fieldArrays(fields):
+            f[...] = vec[ini:ini+f.size].reshape(f.shape, order='F')
+            ini += f.size
+
+    def buildInterpolationRows(self, label, points):
+        '''
+        Sparse matrix of the values at points of the field label, with a
+        column per entry of the field in 'F' order. Discretizations that
+        can locate points override it; others can not be probed.
+        '''
+        raise ValueError(
+            type(self).__name__ + ' does not interpolate fields at points')
+
+    def buildInterpolationMatrix(self, points):
+        '''
+        Labels of the fields and the sparse matrix of their values at points
+        from the state vector, with a block of rows per field in the order
+        of the labels.
+        '''
+        labels = list(fieldLabels(self.buildFields()))
+        blocks = [self.buildInterpolationRows(l, points) for l in labels]
+        return labels, sparse.block_diag(blocks, format='csr')
+
+    def buildSparsityPattern(self):
+        '''
+        Boolean sparse matrix containing the nonzeros of the evolution
+        operator, derived from the connectivity of the discretization.
+        Without connectivity every unknown is taken as coupled to all
+        others, so that probing needs one evaluation per unknown.
+        '''
+        N = self.number_of_unknowns()
+        indices = np.tile(np.arange(N, dtype=np.int32), N)
+        indptr = N * np.arange(N + 1, dtype=np.int64)
+        return sparse.csr_matrix(
+            (np.ones(N*N, dtype=bool), indices, indptr), shape=(N, N))
+
+    def elementBlocks(self):
+        '''
+        Indices in the state vector of the unknowns of each element, as an
+        array of shape (K, unknowns per element), for fields storing the
+        nodes of element k in their column k. Discretizations without
+        element-local structure return None.
+        '''
+        Np = self.number_of_nodes_per_element()
+        K = self.mesh.number_of_elements()
+        n_fields = len(list(fieldArrays(self.buildFields())))
+        ids = np.arange(n_fields*Np*K).reshape(n_fields, K, Np)
+        return ids.transpose(1, 0, 2).reshape(K, n_fields*Np)
+
+    def columnColors(self, pattern):
+        '''
+        Coloring of the columns of pattern, over the unknowns, for probing.
+        Discretizations with element blocks color the elements sharing rows
+        of pattern and give each unknown the color of its element times the
+        block size plus its position in the block.
+        '''
+        blocks = self.elementBlocks()
+        if blocks is None:
+            return colorColumns(pattern)
+        K, nb = blocks.shape
+        N = blocks.size
+        B = sparse.csr_matrix(
+            (np.ones(N), (blocks.ravel(), np.repeat(np.arange(K), nb))),
+            shape=(N, K))
+        elementColors = colorColumns(sparse.csr_matrix(pattern, dtype=float) @ B)
+        colors = np.empty(N, dtype=int)
+        colors[blocks] = elementColors[:, None] * nb + np.arange(nb)
+        return colors
+
+    def buildElementBlockDiagonal(self):
+        '''
+        Element diagonal blocks of the evolution operator, with shape
+        (K, unknowns per element, unknowns per element). Blocks are probed
+        matrix-free, all elements of a color at once.
+        '''
+        blocks = self.elementBlocks()
+        K, nb = blocks.shape
+        N = blocks.size
+
+        B = sparse.csr_matrix(
+            (np.ones(N), (blocks.ravel(), np.repeat(np.arange(K), nb))),
+            shape=(N, K))
+        P = sparse.csr_matrix(self.buildSparsityPattern(), dtype=float)
+        colors = colorColumns(B.T @ P @ B)
+
+        A = self.asLinearOperator()
+        Akk = np.zeros((K, nb, nb))
+        for c in range(colors.max() + 1):
+            elems = np.where(colors == c)[0]
+            for l in range(nb):
+                q = np.zeros(N)
+                q[blocks[elems, l]] = 1.0
+                Akk[elems, :, l] = A.matvec(q)[blocks[elems]]
+        return Akk
+
+    def buildSparseEvolutionOperator(self):
+        '''
+        Evolution operator as a sparse CSR matrix. Discretizations without
+        an analytic assembly obtain it by probing.
+        '''
+        return self.buildProbedEvolutionOperator()
+
+    def asLinearOperator(self):
+        '''
+        Matrix-free view of the evolution operator as a scipy LinearOperator
+        acting on state vectors ordered as in convertToVector. The columns
+        of a matmat are evaluated together as the members of batched fields.
+        '''
+        fields = self.buildFields()
+        N = self.convertToVector(fields).size
+        batched = dict()
+
+        def matvec(q):
+            q = np.ravel(q)
+            if np.iscomplexobj(q):
+                return matvec(q.real) + 1j*matvec(q.imag)
+            self.copyVectorToFields(q, fields)
+            # The result is the buffer of new fields, owned by the caller.
+            rhs = self.computeRHS(fields, out=zerosLikeFields(fields))
+            return self.convertToVector(rhs)
+
+        def matmat(Q):
+            if np.iscomplexobj(Q):
+                return matmat(Q.real) + 1j*matmat(Q.imag)
+            # Only the fields of the last number of columns are kept.
+            if Q.shape[1] not in batched:
+                batched.clear()
+                members = self.buildBatchedFields(Q.shape[1])
+                batched[Q.shape[1]] = members, zerosLikeFields(members)
+            members, rhs = batched[Q.shape[1]]
+            self.copyVectorToFields(Q, members)
+            return self.convertToVector(self.computeRHS(members, out=rhs))
+
+        return LinearOperator(
+            (N, N), matvec=matvec, matmat=matmat, dtype=float)
+
+    def buildProbedEvolutionOperator(self):
+        '''
+        Builds the evolution operator as a sparse CSR matrix by probing
+        computeRHS with one state vector per color of the sparsity pattern.
+        '''
+        P = self.buildSparsityPattern()
+        return probeSparseOperator(
+            self.asLinearOperator().matvec, P, self.columnColors(P))
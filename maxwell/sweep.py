@@ -0,0 +1,137 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy import sparse
+
+from .driver import *
+
+
+# Arrays attached by each worker of a sweep, kept alive with their blocks.
+sharedArrays = dict()
+sharedBlocks = []
+
+
+def parameterGrid(axes):
+    '''
+    List of parameter dictionaries with all combinations of the values of
+    each axis in the dictionary axes.
+    '''
+    labels = list(axes.keys())
+    return [dict(zip(labels, values))
+            for values in itertools.product(*axes.values())]
+
+
+def shareArray(a, blocks):
+    '''
+    Copies the array a to a new shared memory block, appended to blocks,
+    and returns the specification to attach it.
+    '''
+    a = np.ascontiguousarray(a)
+    block = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+    np.ndarray(a.shape, dtype=a.dtype, buffer=block.buf)[...] = a
+    blocks.append(block)
+    return (block.name, a.shape, a.dtype.str)
+
+
+def shareArrays(arrays):
+    '''
+    Places the numpy arrays and scipy sparse matrices of the dictionary
+    arrays in shared memory. Returns the blocks, owned by the caller, and
+    the specifications used by attachArrays.
+    '''
+    blocks = []
+    specs = dict()
+    for l, a in arrays.items():
+        if sparse.issparse(a):
+            A = sparse.csr_matrix(a)
+            specs[l] = ('csr', A.shape, shareArray(A.data, blocks),
+                        shareArray(A.indices, blocks),
+                        shareArray(A.indptr, blocks))
+        else:
+            specs[l] = ('array', shareArray(a, blocks))
+    return blocks, specs
+
+
+def attachArray(spec, blocks):
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    blocks.append(block)
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def attachArrays(specs, blocks):
+    '''
+    Views of the arrays and sparse matrices placed in shared memory by
+    shareArrays. The attached blocks are appended to blocks and must be
+    kept while the views are used.
+    '''
+    arrays = dict()
+    for l, spec in specs.items():
+        if spec[0] == 'csr':
+            _, shape, data, indices, indptr = spec
+            arrays[l] = sparse.csr_matrix(
+                (attachArray(data, blocks), attachArray(indices, blocks),
+                 attachArray(indptr, blocks)), shape=shape, copy=False)
+        else:
+            arrays[l] = attachArray(spec[1], blocks)
+    return arrays
+
+
+def initializeSweepWorker(specs):
+    sharedArrays.clear()
+    sharedArrays.update(attachArrays(specs, sharedBlocks))
+
+
+def runSweepTask(factory, params, finalTime, observe):
+    '''
+    Builds the case of params with factory and runs it until finalTime.
+    Returns observe(driver, params, shared) or, without observe, the final
+    fields.
+    '''
+    sp, fields, timeIntegratorType, CFL = factory(params, sharedArrays)
+    driver = MaxwellDriver(sp, timeIntegratorType, CFL)
+    if fields is not None:
+        sp.copyVectorToFields(sp.convertToVector(fields), driver.fields)
+
+    driver.run_until(finalTime)
+
+    if observe is None:
+        return driver.fields
+    return observe(driver, params, sharedArrays)
+
+
+def sweep(factory, grid, finalTime, shared=None, observe=None,
+          maxWorkers=None):
+    '''
+    Runs a MaxwellDriver for each parameter dictionary of grid, a list or
+    a dictionary of axes as in parameterGrid, in a pool of processes.
+
+    factory(params, shared) returns (sp, fields, timeIntegratorType, CFL),
+    with fields the initial fields or None. shared is a dictionary of numpy
+    arrays and sparse matrices, like meshes or reference operators, placed
+    once in shared memory and seen by the workers as views that must not be
+    modified. factory and observe must be picklable, e.g. module functions.
+
+    Yields (params, result) pairs in the order in which runs finish.
+    '''
+    if isinstance(grid, dict):
+        grid = parameterGrid(grid)
+
+    blocks, specs = shareArrays(shared if shared is not None else dict())
+    executor = ProcessPoolExecutor(
+        max_workers=maxWorkers,
+        initializer=initializeSweepWorker, initargs=(specs,))
+    try:
+        tasks = {
+            executor.submit(runSweepTask, factory, params, finalTime, observe): params
+            for params in grid
+        }
+        for task in as_completed(tasks):
+            yield tasks[task], task.result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+        for block in blocks:
+            block.close()
+            block.unlink()
@@ -202,6 +202,16 @@ def test_connect_7_nodes():
     assert np.allclose(etoe, etoe_test)
     assert np.allclose(etof,etof_test)
     
+def test_connect_unordered_elements():
+    [Nv,vx,K,etov] = ms.mesh_generator(0,10,6)
+    perm = np.array([3, 0, 5, 1, 4, 2])
+    [etoe, etof] = dg.connect(etov[perm])
+
+    inv = np.argsort(perm)
+    [etoe_test, etof_test] = dg.connect(etov)
+    assert np.all(etoe - 1 == inv[etoe_test[perm] - 1])
+    assert np.all(etof == etof_test[perm])
+
 def test_build_maps():
     [Nv,vx,K,etov] = ms.mesh_generator(0,10,4)
     x = dg.nodes_coordinates(4,etov,vx)
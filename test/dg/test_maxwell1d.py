@@ -69,3 +69,146 @@ def test_build_global_mass_matrix():
 
     N = 2 * sp.mesh.number_of_elements() * sp.number_of_nodes_per_element()
     assert M.shape == (N, N)
+
+
+def test_buildSparseEvolutionOperator_equals_dense():
+    for fluxType in ["Upwind", "Centered"]:
+        for label in ["PEC", "PMC", "SMA", "Periodic"]:
+            m = Mesh1D(0, 1, 5, boundary_label=label)
+            sp = DG1D(3, m, fluxType)
+            sp.epsilon = np.linspace(1.0, 3.0, m.number_of_elements())
+
+            A = sp.buildEvolutionOperator()
+            A_sparse = sp.buildSparseEvolutionOperator()
+
+            assert A_sparse.format == 'csr'
+            assert np.allclose(A, A_sparse.toarray())
+
+
+def test_buildProbedEvolutionOperator_equals_dense():
+    for label in ["PEC", "Periodic"]:
+        sp = DG1D(3, Mesh1D(0, 1, 10, boundary_label=label), "Upwind")
+
+        A = sp.buildEvolutionOperator()
+        A_probed = sp.buildProbedEvolutionOperator()
+
+        assert np.allclose(A, A_probed.toarray())
+
+
+def test_default_sparsity_pattern_probes_dense_operator():
+    sp = DG1D(2, Mesh1D(0, 1, 4, boundary_label="PEC"), "Upwind")
+    P = SpatialDiscretization.buildSparsityPattern(sp)
+    A = probeSparseOperator(sp.asLinearOperator().matvec, P)
+
+    assert P.shape == (sp.number_of_unknowns(),)*2
+    assert np.allclose(A.toarray(), sp.buildEvolutionOperator())
+
+
+def test_colorColumns_separates_columns_sharing_rows():
+    rng = np.random.default_rng(1)
+    P = sparse.random(300, 200, density=0.02, random_state=rng, format='csr')
+    P = (P + sparse.identity(300, format='csr')[:, :200]).astype(bool)
+    colors = colorColumns(P)
+
+    C = (P.T.astype(int) @ P.astype(int)).tocoo()
+    assert np.all((colors >= 0) & (colors < 200))
+    assert np.all((colors[C.row] != colors[C.col]) | (C.row == C.col))
+    assert np.array_equal(colorColumns(np.ones((5, 5))), np.arange(5))
+
+
+def test_columnColors_by_element_blocks():
+    sp = DG1D(2, Mesh1D(0, 1, 12, boundary_label="Periodic"), "Upwind")
+    P = sp.buildSparsityPattern()
+    colors = sp.columnColors(P)
+
+    C = (P.T.astype(int) @ P.astype(int)).tocoo()
+    offDiagonal = C.row != C.col
+    assert np.all(colors[C.row[offDiagonal]] != colors[C.col[offDiagonal]])
+
+
+def test_asLinearOperator_matmat_evaluates_columns_at_once():
+    sp = DG1D(2, Mesh1D(0, 1, 6, boundary_label="PEC"), "Upwind")
+    A_op = sp.asLinearOperator()
+    Q = np.random.default_rng(0).random((sp.number_of_unknowns(), 4))
+
+    R = A_op.matmat(Q)
+    r = A_op.matvec(Q[:, 0])
+
+    A = sp.buildEvolutionOperator()
+    assert np.allclose(R, A @ Q)
+    assert np.allclose(A_op.matmat(Q[:, :3]), A @ Q[:, :3])
+    assert not np.shares_memory(r, A_op.matvec(Q[:, 1]))
+    assert np.allclose(r, A @ Q[:, 0])
+
+
+def test_asLinearOperator_spectral_radius():
+    from scipy.sparse.linalg import eigs
+
+    sp = DG1D(3, Mesh1D(-1, 1, 10), "Upwind")
+    A = sp.buildEvolutionOperator()
+    A_op = sp.asLinearOperator()
+
+    q = np.random.rand(A.shape[0], 3)
+    assert np.allclose(A.dot(q), A_op.matmat(q))
+
+    radius = np.abs(eigs(A_op, k=1, which='LM', return_eigenvectors=False))
+    assert np.isclose(radius[0], np.max(np.abs(np.linalg.eigvals(A))))
+
+
+def test_buildElementBlockDiagonal_equals_dense_blocks():
+    sp = DG1D(3, Mesh1D(-1.0, 1.0, 6, boundary_label="Periodic"), "Upwind")
+    A = sp.buildEvolutionOperator()
+    blocks = sp.elementBlocks()
+    Akk = sp.buildElementBlockDiagonal()
+    for k in range(blocks.shape[0]):
+        assert np.allclose(Akk[k], A[np.ix_(blocks[k], blocks[k])])
+
+
+def test_computeRHS_in_place_equals_split_rhs():
+    for label in ["PEC", "PMC", "SMA", "Periodic"]:
+        for fluxType in ["Upwind", "Centered"]:
+            sp = DG1D(3, Mesh1D(-1.0, 1.0, 8, boundary_label=label), fluxType)
+            fields = sp.buildFields()
+            fields['E'][:] = np.random.rand(*fields['E'].shape)
+            fields['H'][:] = np.random.rand(*fields['H'].shape)
+
+            out = sp.buildFields()
+            out['E'].fill(1.0)
+            rhs = sp.computeRHS(fields, out=out)
+
+            assert rhs is out
+            expected = sp.buildSparseEvolutionOperator() @ sp.convertToVector(fields)
+            assert np.allclose(sp.convertToVector(out), expected)
+            assert np.allclose(out['E'], sp.computeRHSE(fields))
+            assert np.allclose(out['H'], sp.computeRHSH(fields))
+
+
+def test_computeRHS_in_place_does_not_allocate():
+    import tracemalloc
+    sp = DG1D(2, Mesh1D(-1.0, 1.0, 2000, boundary_label="PEC"))
+    fields = sp.buildFields()
+    out = sp.computeRHS(fields)
+
+    tracemalloc.start()
+    sp.computeRHS(fields, out=out)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert peak < fields['E'].nbytes
+
+
+def test_threaded_computeRHS():
+    sp = DG1D(3, Mesh1D(-1.0, 1.0, 50, boundary_label="Periodic"))
+    sp.epsilon[:] = np.linspace(1.0, 2.0, 50)
+    fields = sp.buildFields()
+    fields.data[:] = np.random.rand(fields.data.size)
+    expected = sp.computeRHS(fields)
+
+    for workers, chunkElements in [(1, None), (2, 7), (3, 1)]:
+        sp.setThreads(workers, chunkElements)
+        rhs = sp.computeRHS(fields)
+        assert np.allclose(rhs.data, expected.data, rtol=1e-13, atol=1e-13)
+        sp.setThreads(1, chunkElements)
+        assert np.array_equal(sp.computeRHS(fields).data, rhs.data)
+        assert np.array_equal(sp.computeRHSE(fields), rhs['E'])
+    sp.setThreads(None)
@@ -1,6 +1,8 @@
+import pytest
 
 from maxwell.dg.dg2d import *
 from maxwell.dg.mesh2d import *
+from maxwell.driver import *
 
 TEST_DATA_FOLDER = 'testData/'
 
@@ -417,4 +419,169 @@ def test_full_evolution_operator():
     # These commands allow for a proper representation of the matrix without new lines
     np.set_printoptions(threshold=np.inf)
     np.set_printoptions(linewidth=np.inf)
-    print(evolOp)
\ No newline at end of file
+    print(evolOp)
+
+def test_sparse_evolution_operators_equal_dense():
+    for fluxType in ["Upwind", "Centered"]:
+        for label in ["PEC", "PMC", "SMA", "Periodic"]:
+            msh = readFromGambitFile(TEST_DATA_FOLDER+'Maxwell2D_K8.neu')
+            msh.boundary_label = label
+            sp = Maxwell2D(2, msh, fluxType)
+
+            assert np.allclose(sp.buildEvolutionOperator(),
+                               sp.buildSparseEvolutionOperator().toarray())
+            assert np.allclose(sp.buildStiffnessEvolutionOperator(),
+                               sp.buildSparseStiffnessEvolutionOperator().toarray())
+            assert np.allclose(sp.buildZeroNormalEvolutionOperator(),
+                               sp.buildSparseZeroNormalEvolutionOperator().toarray())
+            assert np.allclose(sp.buildOneNormalEvolutionOperator(),
+                               sp.buildSparseOneNormalEvolutionOperator().toarray())
+            assert np.allclose(sp.buildTwoNormalEvolutionOperator(),
+                               sp.buildSparseTwoNormalEvolutionOperator().toarray())
+
+
+def test_probed_evolution_operator_equals_sparse():
+    sp = Maxwell2D(2, readFromGambitFile(TEST_DATA_FOLDER+'Maxwell2D_K146.neu'))
+
+    A = sp.buildSparseEvolutionOperator()
+    A_probed = sp.buildProbedEvolutionOperator()
+
+    assert np.allclose(A.toarray(), A_probed.toarray())
+
+
+def test_as_linear_operator_equals_sparse():
+    sp = Maxwell2D(2, readFromGambitFile(TEST_DATA_FOLDER+'Maxwell2D_K146.neu'))
+
+    A = sp.buildSparseEvolutionOperator()
+    A_op = sp.asLinearOperator()
+
+    q = np.random.rand(A.shape[0], 2)
+    assert np.allclose(A.dot(q), A_op.matmat(q))
+    assert np.allclose(A.dot(q[:, 0]), A_op.matvec(q[:, 0]))
+
+
+def test_element_block_diagonal_equals_sparse_blocks():
+    sp = Maxwell2D(2, readFromGambitFile(TEST_DATA_FOLDER+'Maxwell2D_K146.neu'))
+
+    A = sp.buildSparseEvolutionOperator().toarray()
+    blocks = sp.elementBlocks()
+    Akk = sp.buildElementBlockDiagonal()
+    for k in range(blocks.shape[0]):
+        assert np.allclose(Akk[k], A[np.ix_(blocks[k], blocks[k])])
+
+
+def test_computeRHS_in_place_equals_sparse():
+    sp = Maxwell2D(2, readFromGambitFile(TEST_DATA_FOLDER+'Maxwell2D_K146.neu'))
+    A = sp.buildSparseEvolutionOperator()
+
+    fields = sp.buildFields()
+    q = np.random.rand(A.shape[0])
+    sp.copyVectorToFields(q, fields)
+    out = sp.buildFields()
+    for f in out.values():
+        f.fill(1.0)
+
+    rhs = sp.computeRHS(fields, out=out)
+    assert rhs is out
+    assert np.allclose(A.dot(q), sp.convertToVector(out))
+
+
+def test_computeRHS_in_place_does_not_allocate():
+    import tracemalloc
+    sp = Maxwell2D(3, readFromGambitFile(TEST_DATA_FOLDER+'Maxwell2D_K146.neu'))
+    fields = sp.buildFields()
+    out = sp.computeRHS(fields)
+
+    tracemalloc.start()
+    sp.computeRHS(fields, out=out)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert peak < fields['Ez'].nbytes
+
+
+def test_build_maps_match_face_node_coordinates():
+    sp = Maxwell2D(4, readFromGambitFile(TEST_DATA_FOLDER+'Maxwell2D_K146.neu'))
+
+    x = sp.x.ravel('F')
+    y = sp.y.ravel('F')
+    assert np.allclose(x[sp.vmapM], x[sp.vmapP])
+    assert np.allclose(y[sp.vmapM], y[sp.vmapP])
+    assert np.all(sp.vmapM[sp.mapB] == sp.vmapB)
+    assert np.all(sp.vmapM[sp.mapB] == sp.vmapP[sp.mapB])
+
+
+def label_square_sides(msh):
+    EToE, _ = msh.connectivityMatrices()
+    k, f = np.where(EToE == np.arange(len(EToE)).reshape(-1, 1))
+    v1 = msh.EToV[k, f]
+    v2 = msh.EToV[k, (f+1) % 3]
+    xm = (msh.vx[v1] + msh.vx[v2])/2
+    ym = (msh.vy[v1] + msh.vy[v2])/2
+    faces = np.stack((k, f), axis=1)
+    msh.boundary_faces = {
+        'left': faces[np.isclose(xm, msh.vx.min())],
+        'right': faces[np.isclose(xm, msh.vx.max())],
+        'bottom': faces[np.isclose(ym, msh.vy.min())],
+        'top': faces[np.isclose(ym, msh.vy.max())],
+    }
+    return msh
+
+
+def test_boundary_labels_per_face_equal_global_label():
+    for label in ["PEC", "PMC", "SMA", "Periodic"]:
+        msh = readFromGambitFile(TEST_DATA_FOLDER+'Maxwell2D_K8.neu')
+        msh.boundary_label = label
+        A = Maxwell2D(2, msh).buildSparseEvolutionOperator()
+
+        msh = label_square_sides(msh)
+        msh.boundary_label = {side: label for side in msh.boundary_faces}
+        A_faces = Maxwell2D(2, msh).buildSparseEvolutionOperator()
+
+        assert np.allclose(A.toarray(), A_faces.toarray())
+
+
+def test_mixed_boundary_labels():
+    msh = label_square_sides(
+        readFromGambitFile(TEST_DATA_FOLDER+'Maxwell2D_K8.neu'))
+    msh.boundary_label = {
+        'left': 'Periodic', 'right': 'Periodic', 'bottom': 'PEC', 'top': 'PMC'}
+    sp = Maxwell2D(2, msh, 'Centered')
+
+    A = sp.buildSparseEvolutionOperator()
+    assert np.allclose(A.toarray(), sp.buildEvolutionOperator())
+    assert np.allclose(A.toarray(), sp.buildProbedEvolutionOperator().toarray())
+
+    # Centered fluxes with these conditions conserve energy.
+    assert np.max(np.linalg.eigvals(A.toarray()).real) < 1e-10
+
+    msh.boundary_label = {'left': 'Periodic', 'right': 'Periodic'}
+    with pytest.raises(ValueError):
+        Maxwell2D(2, msh)
+
+
+def test_threaded_computeRHS():
+    msh = readFromGambitFile(TEST_DATA_FOLDER + 'Maxwell2D_K146.neu')
+    msh.boundary_label = "Periodic"
+    sp = Maxwell2D(3, msh, "Centered")
+    fields = sp.buildFields()
+    fields.data[:] = np.random.rand(fields.data.size)
+    expected = sp.computeRHS(fields)
+
+    for workers, chunkElements in [(1, None), (2, 13), (4, 1)]:
+        sp.setThreads(workers, chunkElements)
+        rhs = sp.computeRHS(fields)
+        assert np.allclose(rhs.data, expected.data, rtol=1e-13, atol=1e-13)
+        sp.setThreads(1, chunkElements)
+        assert np.array_equal(sp.computeRHS(fields).data, rhs.data)
+
+    driver = MaxwellDriver(sp)
+    driver.fields.data[:] = fields.data
+    serial = MaxwellDriver(Maxwell2D(3, msh, "Centered"))
+    serial.fields.data[:] = fields.data
+    for _ in range(3):
+        driver.step()
+        serial.step()
+    assert np.allclose(driver.fields.data, serial.fields.data,
+                       rtol=1e-12, atol=1e-12)
+    sp.setThreads(None)
@@ -1,4 +1,5 @@
 import numpy as np
+import pytest
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 from matplotlib import cm
@@ -36,4 +37,97 @@ def test_plot_mesh():
     # plt.triplot(tri, c='k', lw=1.0)
     # plt.gca().set_aspect('equal')
     # plt.show()
-    assert True
\ No newline at end of file
+    assert True
+
+def write_K2_with_boundaries(filename):
+    with open(TEST_DATA_FOLDER + 'Maxwell2D_K2.neu', 'r') as f:
+        text = f.read()
+    text += (
+        " BOUNDARY CONDITIONS 2.2.30\n"
+        "                              In       1       2       0       6\n"
+        "       1        3       1\n"
+        "       2        3       2\n"
+        "ENDOFSECTION\n"
+        " BOUNDARY CONDITIONS 2.2.30\n"
+        "                            Wall       1       2       0       6\n"
+        "       1        3       3\n"
+        "       2        3       3\n"
+        "ENDOFSECTION\n")
+    with open(filename, 'w') as f:
+        f.write(text)
+
+
+def test_read_mesh_boundaries_and_groups(tmp_path):
+    filename = str(tmp_path / 'K2.neu')
+    write_K2_with_boundaries(filename)
+    msh = ms.readFromGambitFile(filename)
+
+    assert np.all(msh.element_groups['fluid'] == np.array([0, 1]))
+    assert np.all(msh.boundary_faces['In'] == np.array([[0, 0], [1, 1]]))
+    assert np.all(msh.boundary_faces['Wall'] == np.array([[0, 2], [1, 2]]))
+
+    # Labelled faces are the boundary faces of the connectivity.
+    EToE, _ = msh.connectivityMatrices()
+    for faces in msh.boundary_faces.values():
+        assert np.all(EToE[faces[:, 0], faces[:, 1]] == faces[:, 0])
+
+
+def test_read_mesh_cache(tmp_path):
+    filename = str(tmp_path / 'K2.neu')
+    write_K2_with_boundaries(filename)
+
+    msh = ms.readFromGambitFile(filename, cache=True)
+    cached = ms.readFromGambitFile(filename, cache=True)
+    assert np.all(msh.EToV == cached.EToV)
+    assert np.all(msh.vx == cached.vx)
+    assert np.all(msh.boundary_faces['In'] == cached.boundary_faces['In'])
+    assert np.all(msh.element_groups['fluid'] == cached.element_groups['fluid'])
+
+    # Changes of the file invalidate the cache.
+    with open(filename, 'r') as f:
+        text = f.read()
+    with open(filename, 'w') as f:
+        f.write(text.replace('1.00000000000e+00   1.00000000000e+00',
+                             '2.00000000000e+00   1.00000000000e+00'))
+    changed = ms.readFromGambitFile(filename, cache=True)
+    assert changed.vx[2] == 2.0
+
+
+def test_read_gmsh_ascii_and_binary():
+    msh = ms.readFromGmshFile(TEST_DATA_FOLDER + 'square.msh')
+    binary = ms.readFromGmshFile(TEST_DATA_FOLDER + 'square_binary.msh')
+
+    assert msh.number_of_elements() == 4
+    assert msh.number_of_vertices() == 5
+    for m in (msh, binary):
+        assert np.all(m.vx == np.array([0.0, 1.0, 1.0, 0.0, 0.5]))
+        assert np.all(m.vy == np.array([0.0, 0.0, 1.0, 1.0, 0.5]))
+        assert np.all(m.element_groups['vacuum'] == np.arange(4))
+        assert np.all(m.boundary_faces['PEC'] == np.array([[0, 0], [2, 2]]))
+        assert np.all(m.boundary_faces['SMA'] == np.array([[1, 0], [3, 0]]))
+    assert np.all(msh.EToV == binary.EToV)
+
+
+def test_read_gmsh_orients_triangles():
+    msh = ms.readFromGmshFile(TEST_DATA_FOLDER + 'square.msh')
+
+    v1, v2, v3 = msh.EToV.T
+    area = (msh.vx[v2]-msh.vx[v1])*(msh.vy[v3]-msh.vy[v1]) \
+        - (msh.vx[v3]-msh.vx[v1])*(msh.vy[v2]-msh.vy[v1])
+    assert np.all(area > 0)
+
+    # Labelled faces are the boundary faces of the connectivity.
+    EToE, _ = msh.connectivityMatrices()
+    faces = np.concatenate(list(msh.boundary_faces.values()))
+    assert np.all(EToE[faces[:, 0], faces[:, 1]] == faces[:, 0])
+    assert len(faces) == np.sum(EToE == np.arange(4).reshape(4, 1))
+
+
+def test_read_gmsh_rejects_other_versions(tmp_path):
+    text = open(TEST_DATA_FOLDER + 'square.msh').read()
+    fileName = str(tmp_path / 'square40.msh')
+    with open(fileName, 'w') as f:
+        f.write(text.replace('4.1 0 8', '4.0 0 8', 1))
+
+    with pytest.raises(ValueError):
+        ms.readFromGmshFile(fileName)
@@ -69,4 +69,38 @@ def test_buildEvolutionOperator_sorting():
     assert A.shape == A_by_elem.shape
     assert np.allclose(np.real(eigA_by_elem), 0)
     assert np.allclose(np.sort(np.imag(eigA)),
-                       np.sort(np.imag(eigA_by_elem)))
\ No newline at end of file
+                       np.sort(np.imag(eigA_by_elem)))
+
+def test_buildProbedEvolutionOperator():
+    for label in ['PEC', 'PMC', 'Periodic']:
+        sp = FD1D(Mesh1D(0, 1, 20, boundary_label=label))
+
+        fields = sp.buildFields()
+        N = sp.convertToVector(fields).size
+        A = np.zeros((N, N))
+        for i in range(N):
+            sp.copyVectorToFields(np.eye(N)[i], fields)
+            A[:, i] = sp.convertToVector(sp.computeRHS(fields))
+
+        A_probed = sp.buildProbedEvolutionOperator()
+
+        assert sp.elementBlocks() is None
+        assert np.allclose(A, A_probed.toarray())
+
+
+def test_computeRHS_in_place():
+    for label in ["PEC", "PMC", "Periodic"]:
+        sp = FD1D(Mesh1D(0, 1, 10, boundary_label=label))
+        fields = sp.buildFields()
+        fields['E'][:] = np.random.rand(*fields['E'].shape)
+        fields['H'][:] = np.random.rand(*fields['H'].shape)
+
+        out = sp.buildFields()
+        out['E'].fill(1.0)
+        out['H'].fill(1.0)
+        rhs = sp.computeRHS(fields, out=out)
+
+        assert rhs is out
+        expected = sp.computeRHS(fields)
+        assert np.array_equal(expected['E'], out['E'])
+        assert np.array_equal(expected['H'], out['H'])
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from maxwell.decomposition import *
+from maxwell.dg.mesh2d import *
+from maxwell.dg.dg2d import *
+
+TEST_DATA_FOLDER = 'testData/'
+
+
+def test_partition_elements():
+    sp = Maxwell2D(1, readFromGambitFile(TEST_DATA_FOLDER + 'Maxwell2D_K146.neu'))
+    parts = sp.partitionElements(4)
+
+    sizes = np.bincount(parts)
+    assert len(sizes) == 4
+    assert sizes.max() - sizes.min() <= 1
+
+
+def test_subdomain_workspaces_equal_serial_rhs():
+    sp = Maxwell2D(2, readFromGambitFile(TEST_DATA_FOLDER + 'Maxwell2D_K146.neu'))
+    fields = sp.buildFields()
+    fields.data[:] = np.random.rand(fields.data.size)
+    expected = sp.computeRHS(fields)
+
+    parts = sp.partitionElements(3)
+    for p in range(3):
+        elements = np.where(parts == p)[0]
+        w = sp.buildSubdomainWorkspace(elements)
+        local = Fields({l: (f.shape[0], len(elements)) for l, f in fields.items()})
+        halo = dict()
+        for l in fields:
+            local[l] = fields[l][:, elements]
+            halo[l] = fields[l].ravel(order='F')[w['haloNodes']]
+
+        rhs = sp.computeRHSOnWorkspace(local, zerosLikeFields(local), w, halo)
+        for l in fields:
+            assert np.array_equal(rhs[l], expected[l][:, elements])
+
+
+@pytest.mark.parametrize("label", ["PEC", "Periodic"])
+def test_decomposed_driver_is_bitwise_serial(label):
+    msh = readFromGambitFile(TEST_DATA_FOLDER + 'Maxwell2D_K146.neu')
+    msh.boundary_label = label
+    sp = Maxwell2D(3, msh, "Centered" if label == "Periodic" else "Upwind")
+
+    serial = MaxwellDriver(sp)
+    serial['Ez'][:] = np.exp(-(sp.x**2 + sp.y**2) / 0.1)
+    serial['Hx'][:] = np.random.rand(*sp.x.shape)
+
+    with DecomposedDriver(sp, 3) as driver:
+        driver['Ez'] = serial['Ez']
+        driver['Hx'] = serial['Hx']
+
+        rhs = sp.computeRHS(serial.fields)
+        decomposed = driver.computeRHS()
+        for l in rhs:
+            assert np.array_equal(decomposed[l], rhs[l])
+
+        for _ in range(5):
+            serial.step()
+        driver.step(nSteps=5)
+        for l in ['Ez', 'Hx', 'Hy']:
+            assert np.array_equal(driver[l], serial[l])
+
+
+def test_decomposed_driver_requires_explicit_integrator():
+    sp = Maxwell2D(1, readFromGambitFile(TEST_DATA_FOLDER + 'Maxwell2D_K8.neu'))
+    with pytest.raises(ValueError):
+        DecomposedDriver(sp, 2, 'IBE')
+
+
+def test_decomposed_run_until_is_absolute():
+    sp = Maxwell2D(1, readFromGambitFile(TEST_DATA_FOLDER + 'Maxwell2D_K8.neu'))
+    with DecomposedDriver(sp, 2) as driver:
+        driver.step(nSteps=3)
+        driver.run_until(10.5 * driver.dt)
+        assert np.isclose(driver.time, 11 * driver.dt)
@@ -12,6 +12,7 @@ from maxwell.fd.fd1d import *
 
 
 from nodepy import runge_kutta_method as rk
+from scipy.linalg import expm
 
 
 def sinusoidal_wave_function(x, t):
@@ -153,6 +154,9 @@ def test_pec_centered_lserk134():
     #     plt.cla()
 
 
+@pytest.mark.xfail(strict=True, reason="Forward Euler is unstable for this "
+                   "setup. The test only passed while EULER rebound driver['E'], "
+                   "which left finalFieldE holding the initial field.")
 def test_pec_centered_euler():
     sp = DG1D(
         n_order=3,
@@ -952,4 +956,347 @@ def test_buildDrivedEvolutionOperator():
     
     q = A.dot(q0)
 
-    assert np.allclose(qExpected, q)
\ No newline at end of file
+    assert np.allclose(qExpected, q)
+
+
+def test_buildSparseDrivedEvolutionOperator():
+    sp = DG1D(
+        n_order=2,
+        mesh=Mesh1D(-1.0, 1.0, 20, boundary_label="Periodic"),
+        fluxType="Centered"
+    )
+    driver = MaxwellDriver(sp)
+
+    A = driver.buildDrivedEvolutionOperator()
+    A_sparse = driver.buildSparseDrivedEvolutionOperator()
+
+    assert np.allclose(A, A_sparse.toarray())
+
+
+def test_buildSparseDrivedEvolutionOperator_keeps_driver_state():
+    sp = DG1D(
+        n_order=2,
+        mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="Periodic"),
+        fluxType="Upwind"
+    )
+    driver = MaxwellDriver(sp, batchSize=3)
+    driver['E'][:] = np.random.default_rng(0).random(driver['E'].shape)
+    driver.run_until(0.1)
+    fields = driver.fields
+    E = driver['E'].copy()
+    steps, time = driver.steps, driver.timeIntegrator.time
+
+    A_sparse = driver.buildSparseDrivedEvolutionOperator()
+
+    assert driver.fields is fields
+    assert np.array_equal(driver['E'], E)
+    assert (driver.steps, driver.timeIntegrator.time) == (steps, time)
+    A = MaxwellDriver(sp).buildDrivedEvolutionOperator()
+    assert np.allclose(A, A_sparse.toarray())
+
+
+def test_periodic_iglrk4():
+    sp = DG1D(
+        n_order=3,
+        mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="Periodic"),
+        fluxType="Upwind"
+    )
+    driver = MaxwellDriver(sp, timeIntegratorType='IGLRK4', CFL=2)
+
+    initialField = np.exp(-(sp.x)**2/(2*0.25**2))
+    driver['E'][:] = initialField[:]
+    driver['H'][:] = initialField[:]
+
+    driver.run_until(2.0)
+
+    t = driver.timeIntegrator.time
+    x = np.mod(sp.x - t + 1.0, 2.0) - 1.0
+    expectedField = np.exp(-x**2/(2*0.25**2))
+    R = np.corrcoef(expectedField.reshape(1, expectedField.size),
+                    driver['E'].reshape(1, expectedField.size))
+    assert R[0, 1] > 0.999
+
+
+def test_cn_step_solves_stage_system():
+    sp = DG1D(
+        n_order=3,
+        mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="PEC"),
+        fluxType="Centered"
+    )
+    driver = MaxwellDriver(sp, timeIntegratorType='CN', CFL=4)
+    driver['E'][:] = np.exp(-(sp.x)**2/(2*0.25**2))
+
+    A = sp.buildEvolutionOperator()
+    I = np.eye(A.shape[0])
+    q0 = sp.convertToVector(driver.fields).copy()
+    driver.step()
+
+    qExpected = np.linalg.solve(I - 0.5*driver.dt*A, q0 + 0.5*driver.dt*A.dot(q0))
+    assert np.allclose(qExpected, sp.convertToVector(driver.fields))
+
+
+@pytest.mark.parametrize("timeIntegratorType", ['IBE', 'CN', 'DIRK2', 'AM2', 'IGLRK4'])
+@pytest.mark.parametrize("method", ['gmres', 'bicgstab'])
+def test_krylov_solver_matches_sparse_lu(timeIntegratorType, method):
+    results = []
+    for solver in [None, method]:
+        sp = DG1D(
+            n_order=3,
+            mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="Periodic"),
+            fluxType="Upwind"
+        )
+        linearSolver = None
+        if solver is not None:
+            linearSolver = KrylovSolver(sp, method=solver, rtol=1e-12)
+        driver = MaxwellDriver(sp, timeIntegratorType=timeIntegratorType,
+                               CFL=4, linearSolver=linearSolver)
+        driver['E'][:] = np.exp(-(sp.x)**2/(2*0.25**2))
+        driver.run_until(0.5)
+        results.append(sp.convertToVector(driver.fields))
+
+    assert np.allclose(results[0], results[1], atol=1e-8)
+    assert len(linearSolver.iterations) > 0
+    assert all(n > 0 for n in linearSolver.iterations)
+
+
+def test_krylov_solver_only_for_implicit_integrators():
+    sp = DG1D(
+        n_order=2,
+        mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="PEC"),
+    )
+    with pytest.raises(ValueError):
+        MaxwellDriver(sp, timeIntegratorType='LSERK4',
+                      linearSolver=KrylovSolver(sp))
+
+
+@pytest.mark.parametrize("method", ['krylov', 'expm_multiply'])
+def test_expint_equals_matrix_exponential(method):
+    sp = DG1D(
+        n_order=3,
+        mesh=Mesh1D(-1.0, 1.0, 20, boundary_label="Periodic"),
+        fluxType="Upwind"
+    )
+    driver = MaxwellDriver(sp, timeIntegratorType='EXPINT', CFL=50)
+    driver.timeIntegrator = EXPINT(sp, driver.fields, method=method)
+    driver['E'][:] = np.exp(-(sp.x)**2/(2*0.25**2))
+
+    q0 = sp.convertToVector(driver.fields).copy()
+    for _ in range(3):
+        driver.step()
+
+    qExpected = expm(3*driver.dt*sp.buildEvolutionOperator()).dot(q0)
+    assert np.allclose(qExpected, sp.convertToVector(driver.fields), atol=1e-8)
+    assert driver.timeIntegrator.stats['steps'] == 3
+    assert driver.timeIntegrator.stats['matvecs'] > 0
+    assert np.isclose(driver.timeIntegrator.time, 3*driver.dt)
+
+
+def test_expint_periodic_long_step():
+    sp = DG1D(
+        n_order=3,
+        mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="Periodic"),
+        fluxType="Upwind"
+    )
+    driver = MaxwellDriver(sp, timeIntegratorType='EXPINT')
+
+    initialField = np.exp(-(sp.x)**2/(2*0.25**2))
+    driver['E'][:] = initialField[:]
+    driver['H'][:] = initialField[:]
+
+    driver.step(0.5)
+
+    x = np.mod(sp.x - 0.5 + 1.0, 2.0) - 1.0
+    expectedField = np.exp(-x**2/(2*0.25**2))
+    R = np.corrcoef(expectedField.reshape(1, expectedField.size),
+                    driver['E'].reshape(1, expectedField.size))
+    assert R[0, 1] > 0.999
+    assert driver.timeIntegrator.stats['substeps'] >= 1
+
+
+@pytest.mark.parametrize("timeIntegratorType", ['LSERK4', 'LSERK74', 'LSERK134'])
+def test_compiled_step_equals_integrator_step(timeIntegratorType):
+    results = []
+    for compiledStep in [False, True]:
+        sp = DG1D(
+            n_order=3,
+            mesh=Mesh1D(-1.0, 1.0, 20, boundary_label="PEC"),
+            fluxType="Upwind"
+        )
+        driver = MaxwellDriver(sp, timeIntegratorType=timeIntegratorType,
+                               compiledStep=compiledStep)
+        assert (driver.propagator is not None) == compiledStep
+        driver['E'][:] = np.exp(-(sp.x)**2/(2*0.25**2))
+        for _ in range(10):
+            driver.step()
+        results.append(sp.convertToVector(driver.fields))
+
+    assert np.allclose(results[0], results[1])
+    assert np.isclose(driver.timeIntegrator.time, 10*driver.dt)
+
+
+def test_compiled_step_falls_back():
+    sp = FD1D(Mesh1D(0.0, 1.0, 50, boundary_label="Mur"))
+    driver = MaxwellDriver(sp, compiledStep=True)
+    assert driver.propagator is None
+
+    sp = DG1D(n_order=2, mesh=Mesh1D(-1.0, 1.0, 10))
+    driver = MaxwellDriver(sp, timeIntegratorType='EULER', compiledStep=True)
+    assert driver.propagator is None
+
+
+def test_dopri54_order():
+    sp = DG1D(
+        n_order=2,
+        mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="Periodic"),
+        fluxType="Upwind"
+    )
+    A = sp.buildEvolutionOperator()
+    final_time = 0.5
+
+    errors = []
+    for nSteps in [50, 100]:
+        driver = MaxwellDriver(sp, timeIntegratorType='DOPRI54')
+        driver['E'][:] = np.sin(np.pi*sp.x)
+        q0 = sp.fieldsAsStateVector(driver.fields).copy()
+        for _ in range(nSteps):
+            driver.step(final_time / nSteps)
+        q = sp.fieldsAsStateVector(driver.fields)
+        errors.append(np.max(np.abs(q - expm(A*final_time) @ q0)))
+
+    assert errors[0] / errors[1] > 2**5 * 0.8
+
+
+def test_adaptive_dopri54_reaches_final_time():
+    sp = DG1D(
+        n_order=2,
+        mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="Periodic"),
+        fluxType="Upwind"
+    )
+    A = sp.buildEvolutionOperator()
+    final_time = 0.5
+
+    driver = MaxwellDriver(sp, timeIntegratorType='DOPRI54',
+                           adaptive=True, rtol=1e-10, atol=1e-12)
+    driver['E'][:] = np.sin(np.pi*sp.x)
+    q0 = sp.fieldsAsStateVector(driver.fields).copy()
+    driver.run_until(final_time)
+
+    q = sp.fieldsAsStateVector(driver.fields)
+    assert driver.timeIntegrator.time == final_time
+    assert driver.stepper.stats['rejected'] > 0
+    assert np.allclose(q, expm(A*final_time) @ q0, atol=1e-10)
+
+
+def test_adaptive_steps_grow_as_fields_leave():
+    sp = DG1D(
+        n_order=2,
+        mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="SMA"),
+        fluxType="Upwind"
+    )
+    final_time = 4.0
+
+    driver = MaxwellDriver(sp, timeIntegratorType='LSERK4', adaptive=True,
+                           rtol=1e-4, atol=1e-6)
+    driver['E'][:] = np.exp(-(sp.x)**2/(2*0.25**2))
+    driver.run_until(final_time)
+
+    assert driver.timeIntegrator.time == final_time
+    assert driver.stepper.stats['accepted'] < final_time / driver.dt
+    assert np.allclose(driver['E'], 0.0, atol=1e-6)
+
+
+def test_adaptive_implicit_steps_are_quantized():
+    sp = DG1D(
+        n_order=2,
+        mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="SMA"),
+        fluxType="Upwind"
+    )
+    driver = MaxwellDriver(sp, timeIntegratorType='CN', adaptive=True,
+                           rtol=1e-4, atol=1e-6)
+    driver['E'][:] = np.exp(-(sp.x)**2/(2*0.25**2))
+    while driver.timeIntegrator.time < 4.0:
+        driver.step()
+
+    stats = driver.stepper.stats
+    for dt in [stats['dtMin'], stats['dtMax']]:
+        exponent = np.log2(dt / driver.dt)
+        assert np.isclose(exponent, np.round(exponent))
+    assert stats['dtMax'] > driver.dt
+
+
+def test_adaptive_needs_one_step_integrators():
+    sp = DG1D(
+        n_order=2,
+        mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="Periodic"),
+        fluxType="Upwind"
+    )
+    # Leapfrog schemes lose their order when dt changes between steps.
+    for timeIntegratorType in ['EXPINT', 'LF2', 'LF2V']:
+        with pytest.raises(ValueError):
+            MaxwellDriver(sp, timeIntegratorType=timeIntegratorType,
+                          adaptive=True)
+
+
+def test_adaptive_step_is_bounded_by_dt():
+    sp = DG1D(
+        n_order=2,
+        mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="Periodic"),
+        fluxType="Upwind"
+    )
+    driver = MaxwellDriver(sp, timeIntegratorType='DOPRI54', adaptive=True)
+    driver['E'][:] = np.sin(np.pi*sp.x)
+    driver.step(1e-5)
+
+    assert driver.timeIntegrator.time == 1e-5
+
+
+def test_run_ends_at_final_time_with_partial_step():
+    sp = DG1D(
+        n_order=2,
+        mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="Periodic"),
+        fluxType="Upwind"
+    )
+    driver = MaxwellDriver(sp)
+    driver['E'][:] = np.sin(np.pi*sp.x)
+    final_time = 10.5 * driver.dt
+    driver.run(final_time)
+
+    expected = MaxwellDriver(sp)
+    expected['E'][:] = np.sin(np.pi*sp.x)
+    for _ in range(10):
+        expected.step()
+    expected.step(0.5 * expected.dt)
+
+    assert driver.steps == 11
+    assert np.isclose(driver.timeIntegrator.time, final_time)
+    assert np.array_equal(driver['E'], expected['E'])
+
+    # Final times are absolute, also when steps were already taken.
+    driver.run_until(2.0)
+    time = driver.timeIntegrator.time
+    assert 2.0 <= time + 1e-12 < 2.0 + driver.dt
+    assert driver.steps == 11 + int(np.ceil((2.0 - final_time) / driver.dt))
+
+
+def test_run_callbacks():
+    sp = DG1D(
+        n_order=2,
+        mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="Periodic"),
+        fluxType="Upwind"
+    )
+    driver = MaxwellDriver(sp)
+    byStep = []
+    byTime = []
+    driver.addCallback(lambda d: byStep.append(d.steps), everySteps=3)
+    driver.addCallback(
+        lambda d: byTime.append(d.timeIntegrator.time), everyTime=0.25)
+
+    driver.run(1.0)
+
+    assert byStep == list(range(3, driver.steps + 1, 3))
+    assert len(byTime) == 4
+    for k, t in enumerate(byTime):
+        assert 0.25*(k+1) <= t + 1e-12 < 0.25*(k+1) + driver.dt
+
+    with pytest.raises(ValueError):
+        driver.addCallback(print)
@@ -39,4 +39,83 @@ def test_pec():
 
     ez_expected = resonant_cavity_ez_field(sp.x, sp.y, driver.timeIntegrator.time)
     R = np.corrcoef(ez_expected, driver['Ez'])
-    assert R[0,1] > 0.9
\ No newline at end of file
+    assert R[0,1] > 0.9
+def test_periodic_plane_wave():
+    msh = readFromGambitFile(TEST_DATA_FOLDER + 'Maxwell2D_K146.neu')
+    msh.boundary_label = "Periodic"
+    sp = Maxwell2D(3, msh, 'Centered')
+
+    driver = MaxwellDriver(sp, CFL=1)
+    driver['Ez'][:] = np.sin(np.pi*sp.x)
+    driver['Hy'][:] = -np.sin(np.pi*sp.x)
+
+    # The wave travels once across the periodic domain.
+    while driver.timeIntegrator.time < 2.0 - 1e-12:
+        driver.step(min(driver.dt, 2.0 - driver.timeIntegrator.time))
+
+    assert np.allclose(driver['Ez'], np.sin(np.pi*sp.x), atol=2e-3)
+
+
+def graded_square_mesh():
+    # Squares split in two triangles, refined geometrically towards x = 0.
+    x = np.geomspace(1/16, 1, 4)
+    x = np.concatenate([-x[::-1], [0.0], x])
+    y = np.linspace(-1, 1, 9)
+    X, Y = np.meshgrid(x, y, indexing='ij')
+    ids = np.arange(X.size).reshape(X.shape)
+    a, b = ids[:-1, :-1].ravel(), ids[1:, :-1].ravel()
+    c, d = ids[1:, 1:].ravel(), ids[:-1, 1:].ravel()
+    EToV = np.concatenate([np.stack([a, b, c], 1), np.stack([a, c, d], 1)])
+    return Mesh2D(X.ravel(), Y.ravel(), EToV)
+
+
+def test_mrab3_levels():
+    sp = Maxwell2D(2, graded_square_mesh(), "Centered")
+    driver = MaxwellDriver(sp, 'MRAB3', CFL=0.1)
+    levels = driver.timeIntegrator.levels
+
+    assert levels.max() == 1
+    assert np.isclose(driver.dt, 2*timeStepSize(sp, 0.1))
+    EToE, _ = sp.mesh.connectivityMatrices()
+    assert np.all(np.abs(levels[EToE] - levels.reshape(-1, 1)) <= 1)
+
+    uniform = Maxwell2D(2, readFromGambitFile(TEST_DATA_FOLDER + 'Maxwell2D_K146.neu'))
+    driver = MaxwellDriver(uniform, 'MRAB3', CFL=0.1)
+    assert np.all(driver.timeIntegrator.levels == 0)
+    assert np.isclose(driver.dt, timeStepSize(uniform, 0.1))
+
+
+def test_mrab3_matches_lserk4():
+    sp = Maxwell2D(2, graded_square_mesh(), "Centered")
+    initialFieldEz = np.exp(-(sp.x**2 + sp.y**2) / 0.1)
+    final_time = 4*timeStepSize(sp, 1.0)
+
+    reference = MaxwellDriver(sp, 'LSERK4')
+    reference['Ez'][:] = initialFieldEz
+    for _ in range(160):
+        reference.step(final_time/160)
+
+    for CFL, tolerance in [(0.1, 2e-4), (0.05, 3e-5)]:
+        driver = MaxwellDriver(sp, 'MRAB3', CFL=CFL)
+        driver['Ez'][:] = initialFieldEz
+        for _ in range(int(round(final_time/driver.dt))):
+            driver.step()
+        assert np.allclose(driver['Ez'], reference['Ez'], atol=tolerance)
+
+    with pytest.raises(ValueError):
+        driver.step(driver.dt/2)
+
+
+def test_run_rejects_partial_mrab3_steps():
+    sp = Maxwell2D(1, readFromGambitFile(TEST_DATA_FOLDER + 'Maxwell2D_K146.neu'))
+    driver = MaxwellDriver(sp, timeIntegratorType='MRAB3')
+    driver['Ez'][:] = np.exp(-(sp.x**2 + sp.y**2) / 0.1)
+    initial = driver['Ez'].copy()
+
+    with pytest.raises(ValueError):
+        driver.run(2.5 * driver.dt)
+    assert driver.steps == 0
+    assert np.array_equal(driver['Ez'], initial)
+
+    driver.run(2.0 * driver.dt)
+    assert driver.steps == 2
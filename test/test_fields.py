@@ -0,0 +1,181 @@
+import numpy as np
+import pickle
+
+from maxwell.fields import *
+from maxwell.driver import *
+from maxwell.dg.mesh1d import *
+from maxwell.dg.dg1d import *
+from maxwell.dg.mesh2d import *
+from maxwell.dg.dg2d import *
+from maxwell.fd.fd1d import *
+from maxwell.fd.fd2d import *
+
+import pytest
+
+TEST_DATA_FOLDER = 'testData/'
+
+
+def batched_discretizations():
+    return [
+        DG1D(3, Mesh1D(-1.0, 1.0, 8, boundary_label="PEC")),
+        DG1D(2, Mesh1D(-1.0, 1.0, 6, boundary_label="Periodic"), "Centered"),
+        Maxwell2D(2, readFromGambitFile(TEST_DATA_FOLDER + 'Maxwell2D_K8.neu')),
+        FD1D(Mesh1D(0.0, 1.0, 10, boundary_label="PMC")),
+        FD2D(x_min=0.0, x_max=1.0, kx_elem=4, boundary_labels="PMC"),
+    ]
+
+
+def test_fields_are_views_of_the_buffer():
+    fields = Fields({'E': {'x': (3, 2), 'y': (2, 3)}, 'H': (2, 2)})
+
+    assert fields.data.size == 16
+    assert fields['E']['x'].flags['F_CONTIGUOUS']
+    assert np.shares_memory(fields['E']['y'], fields.data)
+    assert np.shares_memory(fields['E'].data, fields.data)
+
+    fields['E']['y'][:] = np.arange(6).reshape(2, 3, order='F')
+    assert np.array_equal(fields.data[6:12], np.arange(6))
+
+    fields['H'] = np.ones((2, 2))
+    assert np.array_equal(fields.data[12:], np.ones(4))
+
+
+def test_fields_update_copies_into_the_views():
+    fields = Fields({'E': (4, 3), 'H': (4, 3)})
+    E = fields['E']
+
+    fields.update(E=np.ones((4, 3)))
+    fields.update({'H': 2*np.ones((4, 3))})
+    assert fields['E'] is E
+    assert np.shares_memory(fields['E'], fields.data)
+    assert np.array_equal(fields.data, np.repeat([1.0, 2.0], 12))
+
+    fields |= {'H': np.zeros((4, 3))}
+    assert isinstance(fields, Fields)
+    assert np.array_equal(fields.data[12:], np.zeros(12))
+    assert fields.setdefault('E') is E
+    with pytest.raises(KeyError):
+        fields.update(B=np.ones((4, 3)))
+    with pytest.raises(KeyError):
+        fields.setdefault('B', np.ones((4, 3)))
+
+
+def test_fields_copy_and_pickle():
+    fields = Fields({'E': (4, 3), 'H': (4, 3)})
+    fields.data[:] = np.random.rand(fields.data.size)
+
+    for other in [fields.copy(), pickle.loads(pickle.dumps(fields))]:
+        assert isinstance(other, Fields)
+        assert not np.shares_memory(other.data, fields.data)
+        assert np.array_equal(other['H'], fields['H'])
+        assert np.shares_memory(other['H'], other.data)
+
+
+def test_convertToVector_is_zero_copy():
+    sp = DG1D(2, Mesh1D(-1.0, 1.0, 5))
+    fields = sp.buildFields()
+    fields['E'][:] = np.random.rand(*fields['E'].shape)
+
+    q = sp.convertToVector(fields)
+    assert np.shares_memory(q, fields['E'])
+    assert np.array_equal(q, sp.fieldsAsStateVector(fields))
+
+    sp.copyVectorToFields(np.arange(q.size, dtype=float), fields)
+    assert np.array_equal(
+        fields['H'].ravel(order='F'), np.arange(q.size//2, q.size))
+
+
+def test_fd2d_fields_are_contiguous():
+    sp = FD2D(x_min=0.0, x_max=1.0, kx_elem=4)
+    fields = sp.buildFields()
+
+    assert fields.data.size == sp.number_of_unknowns()
+    assert np.shares_memory(fields['E']['x'], fields.data)
+
+    driver = MaxwellDriver(sp, timeIntegratorType='LF2')
+    driver['H'][:] = 1.0
+    driver.step()
+    assert np.shares_memory(driver['E']['x'], driver.fields.data)
+
+
+def test_batched_fields_layout():
+    fields = Fields({'E': {'x': (3, 2)}, 'H': (2, 2)}, batchSize=4)
+
+    assert fields.data.size == 40
+    assert fields['E']['x'].shape == (3, 2, 4)
+    assert fields['H'].flags['F_CONTIGUOUS']
+    assert fields.shapes() == {'E': {'x': (3, 2)}, 'H': (2, 2)}
+
+    fields.data[:] = np.random.rand(fields.data.size)
+    for other in [fields.copy(), pickle.loads(pickle.dumps(fields)),
+                  zerosLikeFields(fields)]:
+        assert other.batchSize == 4
+        assert other['E']['x'].shape == (3, 2, 4)
+    assert np.array_equal(fields.copy()['H'], fields['H'])
+
+
+def test_batched_convertToVector_has_members_as_columns():
+    sp = DG1D(2, Mesh1D(-1.0, 1.0, 5))
+    fields = sp.buildBatchedFields(3)
+    fields.data[:] = np.random.rand(fields.data.size)
+
+    Q = sp.convertToVector(fields)
+    assert Q.shape == (sp.number_of_unknowns(), 3)
+    for b in range(3):
+        member = sp.buildFields()
+        member['E'][:] = fields['E'][:, :, b]
+        member['H'][:] = fields['H'][:, :, b]
+        assert np.array_equal(Q[:, b], sp.convertToVector(member))
+
+    other = sp.buildBatchedFields(3)
+    sp.copyVectorToFields(Q, other)
+    assert np.array_equal(other.data, fields.data)
+
+
+def test_batched_computeRHS_equals_members():
+    for sp in batched_discretizations():
+        fields = sp.buildBatchedFields(3)
+        fields.data[:] = np.random.rand(fields.data.size)
+        Q = sp.convertToVector(fields)
+
+        R = sp.convertToVector(sp.computeRHS(fields))
+
+        for b in range(3):
+            member = sp.buildFields()
+            sp.copyVectorToFields(Q[:, b], member)
+            r = sp.convertToVector(sp.computeRHS(member))
+            assert np.allclose(R[:, b], r, rtol=1e-12, atol=1e-12)
+
+
+def test_batched_driver_steps_all_members():
+    for timeIntegratorType, compiledStep in [('LSERK4', False),
+                                             ('LSERK4', True),
+                                             ('LF2', False)]:
+        sp = DG1D(3, Mesh1D(-1.0, 1.0, 8, boundary_label="PEC"))
+        driver = MaxwellDriver(sp, timeIntegratorType,
+                               compiledStep=compiledStep, batchSize=3)
+        x = sp.x
+        for b in range(3):
+            driver['E'][:, :, b] = np.exp(-(x - 0.2*b)**2 / 0.1)
+
+        members = []
+        for b in range(3):
+            member = MaxwellDriver(sp, timeIntegratorType,
+                                   compiledStep=compiledStep)
+            member['E'][:] = driver['E'][:, :, b]
+            members.append(member)
+
+        for _ in range(10):
+            driver.step()
+            for member in members:
+                member.step()
+
+        for b, member in enumerate(members):
+            assert np.allclose(driver['E'][:, :, b], member['E'], atol=1e-12)
+            assert np.allclose(driver['H'][:, :, b], member['H'], atol=1e-12)
+
+
+def test_batched_driver_requires_explicit_integrator():
+    sp = DG1D(2, Mesh1D(-1.0, 1.0, 4))
+    with pytest.raises(ValueError):
+        MaxwellDriver(sp, 'IBE', batchSize=2)
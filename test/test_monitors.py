@@ -0,0 +1,50 @@
+import numpy as np
+
+from maxwell.monitors import *
+from maxwell.driver import *
+from maxwell.dg.mesh1d import *
+from maxwell.dg.dg1d import *
+
+
+def test_dft_monitor_of_standing_wave():
+    sp = DG1D(
+        n_order=3,
+        mesh=Mesh1D(-1.0, 1.0, 10, boundary_label="Periodic"),
+        fluxType="Centered"
+    )
+    driver = MaxwellDriver(sp)
+    driver['E'][:] = np.sin(np.pi*sp.x)
+
+    frequencies = [0.5, 1.0]
+    points = [0.5, -0.5]
+    atPoints = DFTMonitor(sp, frequencies, points)
+    overFields = DFTMonitor(sp, frequencies)
+    atPoints.attach(driver)
+    overFields.attach(driver)
+
+    # E = sin(pi x) cos(pi t) over two periods.
+    final_time = 4.0
+    driver.run(final_time)
+
+    assert atPoints['E'].shape == (2, 2)
+    assert overFields['E'].shape == (2,) + sp.x.shape
+    assert np.allclose(atPoints['E'], [[2.0, -2.0], [0.0, 0.0]], atol=0.05)
+
+    interpolated = overFields.phasors @ atPoints.matrix.T
+    assert np.allclose(interpolated, atPoints.phasors)
+
+
+def test_dft_monitor_update_does_not_allocate():
+    import tracemalloc
+    sp = DG1D(2, Mesh1D(-1.0, 1.0, 200))
+    fields = sp.buildFields()
+    fields.data[:] = np.random.rand(fields.data.size)
+    monitor = DFTMonitor(sp, np.linspace(0.5, 2.0, 4))
+    monitor.update(fields, 0.1)
+
+    tracemalloc.start()
+    monitor.update(fields, 0.2)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert peak < monitor.scratch.nbytes
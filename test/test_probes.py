@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+from maxwell.probes import *
+from maxwell.driver import *
+from maxwell.dg.mesh1d import *
+from maxwell.dg.dg1d import *
+from maxwell.dg.mesh2d import *
+from maxwell.dg.dg2d import *
+from maxwell.fd.fd1d import *
+from maxwell.fd.fd2d import *
+
+TEST_DATA_FOLDER = 'testData/'
+
+
+def test_dg1d_probes_interpolate_polynomials():
+    sp = DG1D(3, Mesh1D(-1.0, 1.0, 7))
+    fields = sp.buildFields()
+    fields['E'][:] = sp.x**3
+    fields['H'][:] = 2*sp.x
+
+    points = np.array([-1.0, -0.33, 0.1, 0.99, 1.0])
+    probes = Probes(sp, points)
+    probes.sample(fields, 0.0)
+
+    assert np.allclose(probes['E'][1], points**3)
+    assert np.allclose(probes['H'][1], 2*points)
+
+
+def test_maxwell2d_probes_interpolate_polynomials():
+    sp = Maxwell2D(2, readFromGambitFile(TEST_DATA_FOLDER + 'Maxwell2D_K146.neu'))
+    fields = sp.buildFields()
+    fields['Ez'][:] = sp.x**2 + sp.x*sp.y
+    fields['Hy'][:] = sp.y
+
+    points = np.array([[0.1, 0.2], [-0.3, 0.5], [0.0, 0.0]])
+    probes = Probes(sp, points)
+    probes.sample(fields, 0.0)
+
+    x, y = points.T
+    assert np.allclose(probes['Ez'][1], x**2 + x*y)
+    assert np.allclose(probes['Hx'][1], 0.0)
+    assert np.allclose(probes['Hy'][1], y)
+
+    with pytest.raises(ValueError):
+        Probes(sp, [[10.0, 0.0]])
+
+
+def test_fd_probes_interpolate_linear_fields():
+    sp = FD1D(Mesh1D(-1.0, 1.0, 10))
+    fields = sp.buildFields()
+    fields['E'][:] = sp.x
+    fields['H'][:] = 3*sp.xH
+
+    probes = Probes(sp, [-0.5, 0.33])
+    probes.sample(fields, 0.0)
+    assert np.allclose(probes['E'][1], [-0.5, 0.33])
+    assert np.allclose(probes['H'][1], [-1.5, 0.99])
+
+    sp = FD2D(-1.0, 1.0, 8)
+    fields = sp.buildFields()
+    x, y = np.meshgrid(sp.xH, sp.y)
+    fields['E']['x'][:] = x + 2*y
+    x, y = np.meshgrid(sp.xH, sp.yH)
+    fields['H'][:] = x - y
+
+    probes = Probes(sp, [[0.3, -0.2], [0.0, 0.5]])
+    probes.sample(fields, 0.0)
+    assert probes.labels == [('E', 'x'), ('E', 'y'), 'H']
+    assert np.allclose(probes[('E', 'x')][1], [-0.1, 1.0])
+    assert np.allclose(probes['H'][1], [0.5, -0.5])
+
+
+def test_probes_ring_buffer_keeps_last_samples():
+    sp = DG1D(2, Mesh1D(-1.0, 1.0, 10, boundary_label="Periodic"))
+    driver = MaxwellDriver(sp)
+    driver['E'][:] = np.sin(np.pi*sp.x)
+
+    probes = Probes(sp, [0.0, 0.5], capacity=4)
+    probes.attach(driver)
+    expected = []
+    for _ in range(6):
+        driver.runSteps(1)
+        expected.append(probes.matrix[:2] @ driver.fields.data)
+
+    times, values = probes['E']
+    assert len(probes) == 4
+    assert np.allclose(times, driver.dt * np.arange(3, 7))
+    assert np.array_equal(values, np.array(expected[2:]))
+
+
+def test_batched_probes_sample_each_member():
+    sp = Maxwell2D(1, readFromGambitFile(TEST_DATA_FOLDER + 'Maxwell2D_K146.neu'))
+    fields = sp.buildBatchedFields(3)
+    fields.data[:] = np.random.rand(fields.data.size)
+    points = [[0.1, 0.2], [-0.3, 0.5]]
+
+    probes = Probes(sp, points, batchSize=3)
+    probes.sample(fields, 0.0)
+
+    single = Probes(sp, points)
+    for b in range(3):
+        member = sp.buildFields()
+        for l in member:
+            member[l] = fields[l][..., b]
+        single.sample(member, 0.0)
+        for l in member:
+            assert np.allclose(probes[l][1][0, :, b], single[l][1][-1])
+
+
+def test_probes_sample_allocates_one_sample():
+    import tracemalloc
+    sp = DG1D(2, Mesh1D(-1.0, 1.0, 100))
+    fields = sp.buildFields()
+    probes = Probes(sp, np.linspace(-1.0, 1.0, 200))
+    probes.sample(fields, 0.0)
+
+    tracemalloc.start()
+    probes.sample(fields, 0.0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Only the product of one sample is a temporary, not the fields.
+    assert peak < 2*probes.values[0].nbytes
+
+
+def test_probes_need_interpolation_rows():
+    sp = DG1D(2, Mesh1D(-1.0, 1.0, 10))
+    with pytest.raises(ValueError):
+        SpatialDiscretization.buildInterpolationRows(sp, 'E', [0.0])
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from maxwell.snapshots import *
+from maxwell.driver import *
+from maxwell.dg.mesh1d import *
+from maxwell.dg.dg1d import *
+from maxwell.fd.fd2d import *
+
+
+@pytest.mark.parametrize("compressed", [True, False])
+def test_snapshots_round_trip(tmp_path, compressed):
+    sp = DG1D(2, Mesh1D(-1.0, 1.0, 10, boundary_label="Periodic"))
+    driver = MaxwellDriver(sp)
+    driver['E'][:] = np.sin(np.pi*sp.x)
+
+    expected = []
+    driver.addCallback(lambda d: expected.append(d['E'].copy()), everySteps=2)
+    with SnapshotWriter(str(tmp_path), driver.fields, chunkSize=3,
+                        maxChunks=2, compressed=compressed) as writer:
+        writer.attach(driver, everySteps=2)
+        driver.runSteps(20)
+
+    reader = SnapshotReader(str(tmp_path))
+    assert len(reader) == 10
+    assert reader.labels == ['E', 'H']
+    assert np.allclose(reader.times, driver.dt * np.arange(2, 21, 2))
+    assert np.array_equal(reader.series('E'), np.array(expected))
+    assert np.array_equal(reader[4]['E'], expected[4])
+    assert np.array_equal(reader[-1]['H'], driver['H'])
+    if not compressed:
+        assert isinstance(reader.chunk(0), np.memmap)
+
+
+def test_snapshots_of_a_region_and_component(tmp_path):
+    sp = FD2D(-1.0, 1.0, 8)
+    fields = sp.buildFields()
+    fields['E']['x'][:] = np.random.rand(*fields['E']['x'].shape)
+
+    region = (slice(2, 5), slice(None, None, 2))
+    with SnapshotWriter(str(tmp_path), fields, labels=[('E', 'x')],
+                        region=region) as writer:
+        writer.append(fields, 0.0)
+
+    reader = SnapshotReader(str(tmp_path))
+    assert reader.labels == [('E', 'x')]
+    assert np.array_equal(reader[0][('E', 'x')], fields['E']['x'][region])
@@ -0,0 +1,77 @@
+import numpy as np
+
+from maxwell.sweep import *
+from maxwell.dg.mesh2d import *
+from maxwell.dg.dg2d import *
+
+TEST_DATA_FOLDER = 'testData/'
+
+
+def gaussian_pulse_case(params, shared):
+    mesh = Mesh2D(shared['vx'], shared['vy'], shared['EToV'])
+    sp = Maxwell2D(params['n_order'], mesh)
+    fields = sp.buildFields()
+    fields['Ez'][:] = np.exp(-(sp.x**2 + sp.y**2) / 0.25)
+    return sp, fields, params['timeIntegratorType'], 0.5
+
+
+def energy_and_operator_check(driver, params, shared):
+    operator = shared['operator']
+    return np.sum(driver['Ez']**2), not operator.data.flags.owndata, \
+        operator @ np.ones(operator.shape[1])
+
+
+def test_parameter_grid():
+    grid = parameterGrid({'n_order': [1, 2], 'CFL': [0.5, 1.0, 2.0]})
+    assert len(grid) == 6
+    assert grid[1] == {'n_order': 1, 'CFL': 1.0}
+
+
+def test_shared_arrays_are_views_of_the_blocks():
+    A = sparse.random(20, 20, density=0.1, format='csr', random_state=0)
+    blocks, specs = shareArrays({'a': np.arange(6.0).reshape(2, 3), 'A': A})
+    attached = []
+    try:
+        arrays = attachArrays(specs, attached)
+        assert np.array_equal(arrays['a'], np.arange(6.0).reshape(2, 3))
+        assert np.array_equal(arrays['A'].toarray(), A.toarray())
+        assert not arrays['A'].data.flags.owndata
+    finally:
+        for block in attached:
+            block.close()
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def test_sweep_equals_serial_runs():
+    mesh = readFromGambitFile(TEST_DATA_FOLDER + 'Maxwell2D_K8.neu')
+    shared = {'vx': mesh.vx, 'vy': mesh.vy, 'EToV': mesh.EToV}
+    grid = {'n_order': [1, 2], 'timeIntegratorType': ['LSERK4', 'EULER']}
+
+    results = list(sweep(gaussian_pulse_case, grid, 0.1,
+                         shared=shared, maxWorkers=2))
+    assert len(results) == 4
+
+    for params, fields in results:
+        sp, initial, timeIntegratorType, CFL = gaussian_pulse_case(params, shared)
+        driver = MaxwellDriver(sp, timeIntegratorType, CFL)
+        driver.fields.data[:] = initial.data
+        driver.run_until(0.1)
+        assert np.array_equal(fields.data, driver.fields.data)
+
+
+def test_sweep_observes_shared_operators():
+    mesh = readFromGambitFile(TEST_DATA_FOLDER + 'Maxwell2D_K8.neu')
+    sp = Maxwell2D(1, mesh)
+    A = sp.buildSparseEvolutionOperator()
+    shared = {'vx': mesh.vx, 'vy': mesh.vy, 'EToV': mesh.EToV, 'operator': A}
+
+    results = list(sweep(gaussian_pulse_case,
+                         [{'n_order': 1, 'timeIntegratorType': 'LSERK4'}],
+                         0.1, shared=shared, observe=energy_and_operator_check))
+
+    (_, (energy, isView, product)), = results
+    assert energy > 0.0
+    assert isView
+    assert np.allclose(product, A @ np.ones(A.shape[1]))
@@ -216,3 +216,45 @@ def test_tfsf2d_null_field():
     #assert np.allclose(finalFieldE, 0.0, atol=1e-3)
 
     #test_comment
+
+
+def test_fd2d_computeRHS_in_place():
+    sp = FD2D(x_min=0.0, x_max=1.0, kx_elem=10, boundary_labels="PMC")
+    fields = sp.buildFields()
+    fields['H'][:] = np.random.rand(*fields['H'].shape)
+    fields['E']['x'][:] = np.random.rand(*fields['E']['x'].shape)
+    fields['E']['y'][:] = np.random.rand(*fields['E']['y'].shape)
+
+    out = sp.buildFields()
+    for f in fieldArrays(out):
+        f.fill(1.0)
+    rhs = sp.computeRHS(fields, out=out)
+
+    expected = sp.computeRHS(fields)
+    assert rhs is out
+    for a, b in zip(fieldArrays(expected), fieldArrays(out)):
+        assert np.array_equal(a, b)
+
+
+def test_fd2d_lserk4_steps():
+    sp = FD2D(x_min=0.0, x_max=1.0, kx_elem=10, boundary_labels="PEC")
+    driver = MaxwellDriver(sp, timeIntegratorType='LSERK4')
+    driver['H'][:] = np.random.rand(*driver['H'].shape)
+    driver.step()
+
+    assert np.isfinite(driver['H']).all()
+
+
+def test_fd2d_computeRHS_in_place_does_not_allocate():
+    import tracemalloc
+    sp = FD2D(x_min=0.0, x_max=1.0, kx_elem=100, boundary_labels="PEC")
+    fields = sp.buildFields()
+    fields.data[:] = np.random.rand(fields.data.size)
+    out = sp.computeRHS(fields)
+
+    tracemalloc.start()
+    sp.computeRHS(fields, out=out)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert peak < fields['H'].nbytes